@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""Aggregator role: merge sensor deltas into one inventory and site.
+
+    NW_SENSOR_TOKEN=... python3 aggregator.py --root /srv/nw [--port 8787]
+
+Serves site/ and /metrics like serve.py and accepts sensor.py deltas on
+POST /api/ingest. Each sensor's inventory lives in state/sensors/<id>.json;
+the combined inventory keys devices by "<sensor>/<render.py device_id>" and
+is rendered through the normal pipeline (render.py --devices-json), so the
+tracker, anomaly baselines, alerts and the SPA work unchanged.
+
+Deltas from a sensor's discovery (ARP-only) cycle, meta.mode "discovery",
+only add and update devices: a single sweep misses sleeping devices, so
+their removals are ignored, and a render triggered only by such deltas runs
+with --discovery-only (no change events or alerts).
+
+A sensor that has not pushed for NW_SENSOR_OFFLINE_MINUTES keeps its last
+known devices, flagged sensor_offline (no flood of "gone" events for a WAN
+outage); after NW_SENSOR_EXPIRE_HOURS its devices are dropped. Sensor status
+is published as site/sensors.json.
+"""
+import argparse
+import functools
+import hmac
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer
+
+from fsutil import atomic_write_json, read_json
+from render import ip_key
+from sensor import INGEST_PATH, VERSION
+from serve import Handler
+
+SENSOR_ID_RE = re.compile(r'^[A-Za-z0-9_.-]{1,64}$')
+MAX_BODY_BYTES = 16 << 20
+MAX_DECODED_BYTES = 128 << 20
+
+
+def sensors_dir(state_dir):
+    return os.path.join(state_dir, 'sensors')
+
+
+def load_sensor(state_dir, sensor_id):
+    obj = read_json(os.path.join(sensors_dir(state_dir), f'{sensor_id}.json'), {})
+    if isinstance(obj, dict) and obj.get('version') == VERSION:
+        return obj
+    return {'version': VERSION, 'sensor': sensor_id, 'ts': '', 'lastSeen': 0, 'meta': {}, 'devices': {}}
+
+
+def save_sensor(state_dir, store):
+    os.makedirs(sensors_dir(state_dir), exist_ok=True)
+    atomic_write_json(os.path.join(sensors_dir(state_dir), f"{store['sensor']}.json"), store, separators=(',', ':'))
+
+
+def load_sensors(state_dir):
+    try:
+        names = sorted(os.listdir(sensors_dir(state_dir)))
+    except OSError:
+        return []
+    return [load_sensor(state_dir, n[:-5]) for n in names if n.endswith('.json') and SENSOR_ID_RE.match(n[:-5])]
+
+
+def apply_delta(store, delta, now):
+    """Fold one delta into a sensor's store -> (HTTP status, reply)."""
+    ts = delta.get('ts') or ''
+    if not ts:
+        return 400, {'ok': False, 'error': 'missing ts'}
+    if store['ts'] and ts <= store['ts']:
+        store['lastSeen'] = now
+        return 200, {'ok': True, 'ts': store['ts'], 'duplicate': True}
+    if not delta.get('full') and delta.get('base') != store['ts']:
+        return 409, {'ok': False, 'error': 'base mismatch', 'ts': store['ts']}
+
+    discovery = (delta.get('meta') or {}).get('mode') == 'discovery'
+    devices = {} if delta.get('full') and not discovery else store['devices']
+    for did in [] if discovery else delta.get('remove') or []:
+        devices.pop(did, None)
+    for d in delta.get('upsert') or []:
+        if isinstance(d, dict) and d.get('id'):
+            devices[d['id']] = d
+    store.update(ts=ts, lastSeen=now, meta=delta.get('meta') or {}, devices=devices)
+    return 200, {'ok': True, 'ts': ts}
+
+
+def merge(stores, now, offline_after, expire_after):
+    """(combined device list, sensor status) across all sensor stores."""
+    devices = []
+    status = {}
+    for st in stores:
+        age = now - (st.get('lastSeen') or 0)
+        offline = age > offline_after
+        status[st['sensor']] = {
+            'ts': st.get('ts', ''),
+            'lastSeen': st.get('lastSeen', 0),
+            'offline': offline,
+            'expired': age > expire_after,
+            'devices': len(st.get('devices') or {}),
+            'subnet': (st.get('meta') or {}).get('subnet', ''),
+        }
+        if age > expire_after:
+            continue
+        for did, d in sorted((st.get('devices') or {}).items(), key=lambda kv: ip_key(kv[1].get('ip', ''))):
+            devices.append(dict(d, id=f"{st['sensor']}/{did}", device_id=did, sensor=st['sensor'], sensor_offline=offline))
+    return devices, status
+
+
+class Aggregator:
+    def __init__(self, root, offline_after, expire_after, render=True):
+        self.root = root
+        self.state = os.path.join(root, 'state')
+        self.offline_after = offline_after
+        self.expire_after = expire_after
+        self.render_enabled = render
+        self.lock = threading.Lock()
+        self.dirty = threading.Event()
+        self.last_ts = ''
+        self.last_offline = None
+        self.pending_modes = set()   # meta.mode of the deltas since the last render
+
+    def ingest(self, delta):
+        sensor_id = str(delta.get('sensor') or '')
+        if delta.get('version') != VERSION or not SENSOR_ID_RE.match(sensor_id):
+            return 400, {'ok': False, 'error': 'bad delta'}
+        with self.lock:
+            store = load_sensor(self.state, sensor_id)
+            status, reply = apply_delta(store, delta, time.time())
+            if status == 200:
+                save_sensor(self.state, store)
+                if not reply.get('duplicate'):
+                    self.pending_modes.add((delta.get('meta') or {}).get('mode') or 'full')
+                    self.dirty.set()
+        return status, reply
+
+    def render(self, now=None):
+        """Write the merged inventory and run render.py on it; returns the ts or ''."""
+        now = time.time() if now is None else now
+        ts = datetime.fromtimestamp(now, timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        if ts <= self.last_ts:
+            return ''
+        with self.lock:
+            self.dirty.clear()
+            discovery_only = self.pending_modes == {'discovery'}
+            self.pending_modes = set()
+            devices, status = merge(load_sensors(self.state), now, self.offline_after, self.expire_after)
+        data = os.path.join(self.root, 'data')
+        os.makedirs(data, exist_ok=True)
+        merged_path = os.path.join(data, f'{ts}_merged.json')
+        atomic_write_json(merged_path, devices)
+        os.makedirs(os.path.join(self.root, 'site'), exist_ok=True)
+        atomic_write_json(os.path.join(self.root, 'site', 'sensors.json'), {'generatedAt': ts, 'sensors': status})
+        self.last_ts = ts
+        self.last_offline = {k: v['offline'] for k, v in status.items()}
+        if not self.render_enabled:
+            return ts
+        subnets = sorted({s['subnet'] for s in status.values() if s['subnet']})
+        rc = subprocess.call([
+            sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'render.py'),
+            '--root', self.root,
+            '--timestamp-utc', ts,
+            '--timestamp-human', datetime.fromtimestamp(now).astimezone().strftime('%Y-%m-%d %H:%M:%S %Z'),
+            '--host-ip', 'aggregator',
+            '--subnet', ', '.join(subnets) or 'multi-site',
+            '--devices-json', merged_path,
+        ] + (['--discovery-only'] if discovery_only else []))
+        if rc != 0:
+            print(f'[aggregator] render failed rc={rc}', file=sys.stderr, flush=True)
+        return ts
+
+    def offline_changed(self, now):
+        stores = load_sensors(self.state)
+        current = {st['sensor']: now - (st.get('lastSeen') or 0) > self.offline_after for st in stores}
+        return bool(current) and current != self.last_offline
+
+    def render_loop(self, min_interval, check_every=30):
+        # Also renders once at startup when sensors are already known
+        while True:
+            self.dirty.wait(timeout=check_every)
+            if self.dirty.is_set() or self.offline_changed(time.time()):
+                self.render()
+                time.sleep(min_interval)
+
+
+class IngestHandler(Handler):
+    aggregator = None
+    token = ''
+
+    def reply(self, status, obj):
+        body = json.dumps(obj).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.split('?', 1)[0] != INGEST_PATH:
+            return self.reply(404, {'ok': False, 'error': 'not found'})
+        if self.token and not hmac.compare_digest(self.headers.get('Authorization', ''), f'Bearer {self.token}'):
+            return self.reply(401, {'ok': False, 'error': 'unauthorized'})
+        try:
+            length = int(self.headers.get('Content-Length', '0'))
+        except ValueError:
+            length = -1
+        if length < 0 or length > MAX_BODY_BYTES:
+            return self.reply(413, {'ok': False, 'error': 'body too large'})
+        raw = self.rfile.read(length)
+        try:
+            if self.headers.get('Content-Encoding', '') == 'gzip':
+                dec = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                raw = dec.decompress(raw, MAX_DECODED_BYTES)
+                if dec.unconsumed_tail:
+                    return self.reply(413, {'ok': False, 'error': 'body too large'})
+            delta = json.loads(raw)
+        except (zlib.error, ValueError):
+            return self.reply(400, {'ok': False, 'error': 'bad body'})
+        if not isinstance(delta, dict):
+            return self.reply(400, {'ok': False, 'error': 'bad delta'})
+        self.reply(*self.aggregator.ingest(delta))
+
+
+def make_server(root, bind, port, token='', offline_after=9000, expire_after=72 * 3600, render=True):
+    agg = Aggregator(root, offline_after, expire_after, render=render)
+    handler_cls = type('BoundIngestHandler', (IngestHandler,), {
+        'aggregator': agg, 'token': token, 'state_dir': agg.state,
+    })
+    site = os.path.join(root, 'site')
+    os.makedirs(site, exist_ok=True)
+    httpd = ThreadingHTTPServer((bind, port), functools.partial(handler_cls, directory=site))
+    return httpd, agg
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--root', default=os.path.dirname(os.path.abspath(__file__)))
+    ap.add_argument('--port', type=int, default=int(os.environ.get('NW_HTTP_PORT', '8787') or 8787))
+    ap.add_argument('--bind', default=os.environ.get('NW_HTTP_BIND', '') or '0.0.0.0')
+    args = ap.parse_args()
+
+    offline_after = float(os.environ.get('NW_SENSOR_OFFLINE_MINUTES', '150') or 150) * 60
+    expire_after = float(os.environ.get('NW_SENSOR_EXPIRE_HOURS', '72') or 72) * 3600
+    min_interval = float(os.environ.get('NW_AGG_RENDER_SECONDS', '30') or 30)
+    token = os.environ.get('NW_SENSOR_TOKEN', '')
+    if not token:
+        print('[aggregator] WARN: NW_SENSOR_TOKEN unset; any host can push deltas', file=sys.stderr, flush=True)
+
+    httpd, agg = make_server(args.root, args.bind, args.port, token, offline_after, expire_after)
+    threading.Thread(target=agg.render_loop, args=(min_interval,), name='nw-render', daemon=True).start()
+    print(f'[aggregator] serving {args.root}/site and {INGEST_PATH} on http://{args.bind}:{args.port}/', flush=True)
+    with httpd:
+        httpd.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
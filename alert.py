@@ -1,180 +1,54 @@
 #!/usr/bin/env python3
-import json
+"""Drain queued alert events and deliver them to the configured sinks.
+
+render.py queues events in state/alerts/outbox.jsonl; see alert_engine.py for
+the rules/sinks config in state/alerts.json. scan.sh runs this in the
+background so slow sinks never hold up the scan loop.
+"""
+import argparse
+import fcntl
 import os
-import re
-import subprocess
-from datetime import datetime, timezone
+import sys
+import time
 
-
-def load_json(path):
-    try:
-        with open(path, 'r') as f:
-            return json.load(f)
-    except Exception:
-        return None
-
-
-def run(cmd, timeout=10):
-    try:
-        p = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
-        return p.returncode, p.stdout, p.stderr
-    except Exception as e:
-        return 999, "", str(e)
-
-
-def now_epoch():
-    return int(datetime.now(timezone.utc).timestamp())
-
-
-def format_device(d):
-    name = (d.get('name') or '').strip()
-    vendor = (d.get('vendor') or '').strip()
-    mac = (d.get('mac') or '').strip()
-    ip = (d.get('ip') or '').strip()
-    primary = name or vendor or mac or d.get('id')
-    return f"{primary} ({mac}) @ {ip}" if mac else f"{primary} @ {ip}"
-
-
-def ports_set(d):
-    s = set()
-    for p in d.get('open_ports') or []:
-        port = p.get('port')
-        if port:
-            s.add(port)
-    return s
-
-
-def risk_ports_changed(old, new):
-    risky = {'22/tcp','139/tcp','445/tcp','548/tcp','5000/tcp','5001/tcp','8833/tcp','9100/tcp','515/tcp','2049/tcp','111/tcp'}
-    added = (new - old) & risky
-    removed = (old - new) & risky
-    return added, removed
+from alert_engine import alerts_dir, run_once
+from alert_state import load_alert_state, save_alert_state, snooze, unsnooze
 
 
 def main():
-    root = os.path.dirname(os.path.abspath(__file__))
-    state = os.path.join(root, 'state')
-    site = os.path.join(root, 'site')
-
-    cfg = load_json(os.path.join(state, 'alerts.json')) or {}
-    if not cfg.get('enabled', True):
-        return
-    mode = (cfg.get('mode') or 'all').strip().lower()
-    include_ports = bool(cfg.get('includePortChanges', True))
-
-    latest = load_json(os.path.join(state, 'latest.json'))
-    if not latest:
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--root', default=os.path.dirname(os.path.abspath(__file__)))
+    ap.add_argument('--snooze', metavar='TARGET', help='device id or kind|id|port[|anomaly] key to silence')
+    ap.add_argument('--minutes', type=int, default=24 * 60, help='snooze length (default: 1 day)')
+    ap.add_argument('--unsnooze', metavar='TARGET')
+    args = ap.parse_args()
+
+    state = os.path.join(args.root, 'state')
+
+    lock = open(os.path.join(alerts_dir(state), '.dispatch.lock'), 'w')
+
+    if args.snooze or args.unsnooze:
+        # Wait for a running dispatcher so its save does not undo ours
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        now = int(time.time())
+        st = load_alert_state(state)
+        if args.snooze:
+            snooze(st, args.snooze, now + args.minutes * 60)
+        else:
+            unsnooze(st, args.unsnooze)
+        save_alert_state(state, st, now)
         return
 
-    # Find previous snapshot file by timestamp ordering
-    snaps = sorted([p for p in os.listdir(state) if re.match(r'^\d{8}T\d{6}Z\.json$', p)])
-    prev = None
-    if len(snaps) >= 2:
-        prev = load_json(os.path.join(state, snaps[-2]))
-
-    if not prev:
-        return
-
-    # Rate limit
-    rl_min = int(cfg.get('rateLimitMinutes', 5) or 5)
-    last_alert_path = os.path.join(state, 'last_alert_epoch.txt')
-    last_epoch = 0
+    # One dispatcher at a time; a later run picks up whatever is still queued.
     try:
-        last_epoch = int(open(last_alert_path).read().strip())
-    except Exception:
-        last_epoch = 0
-
-    if now_epoch() - last_epoch < rl_min * 60:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        print('alert dispatcher already running', file=sys.stderr)
         return
 
-    prev_by_id = {d.get('id'): d for d in (prev.get('devices') or []) if d.get('id')}
-    now_by_id = {d.get('id'): d for d in (latest.get('devices') or []) if d.get('id')}
-
-    new_ids = [i for i in now_by_id.keys() if i not in prev_by_id]
-    gone_ids = [i for i in prev_by_id.keys() if i not in now_by_id]
-
-    port_events = []
-    for did, dnow in now_by_id.items():
-        dold = prev_by_id.get(did)
-        if not dold:
-            continue
-        oldp = ports_set(dold)
-        newp = ports_set(dnow)
-        added = newp - oldp
-        removed = oldp - newp
-        r_add, r_rem = risk_ports_changed(oldp, newp)
-        if added or removed:
-            port_events.append((dnow, added, removed, r_add, r_rem))
-
-    # Minimal mode: only delta + link
-    if mode == 'minimal':
-        if not (new_ids or gone_ids):
-            return
-        lines = []
-        lines.append(f"Network Watch ({latest.get('timestamp_human','')})")
-        if new_ids:
-            lines.append(f"+{len(new_ids)} new")
-            for did in new_ids[:10]:
-                lines.append("- " + format_device(now_by_id[did]))
-            if len(new_ids) > 10:
-                lines.append(f"- ... +{len(new_ids)-10} more")
-        if gone_ids:
-            lines.append(f"-{len(gone_ids)} gone")
-            for did in gone_ids[:10]:
-                lines.append("- " + format_device(prev_by_id[did]))
-            if len(gone_ids) > 10:
-                lines.append(f"- ... +{len(gone_ids)-10} more")
-        lines.append("http://192.168.235.175:8787/")
-        msg = "\n".join(lines)
-    else:
-        if not (new_ids or gone_ids or (include_ports and port_events)):
-            return
-
-        lines = []
-        lines.append(f"Network Watch alert @ {latest.get('timestamp_human','')}")
-
-        if new_ids:
-            lines.append(f"New devices ({len(new_ids)}):")
-            for did in new_ids[:15]:
-                lines.append("- " + format_device(now_by_id[did]))
-            if len(new_ids) > 15:
-                lines.append(f"- ... +{len(new_ids)-15} more")
-
-        if gone_ids:
-            lines.append(f"Gone devices ({len(gone_ids)}):")
-            for did in gone_ids[:15]:
-                lines.append("- " + format_device(prev_by_id[did]))
-            if len(gone_ids) > 15:
-                lines.append(f"- ... +{len(gone_ids)-15} more")
-
-        if include_ports:
-            # Highlight risky port changes first
-            risky_lines = []
-            other_lines = []
-            for d, added, removed, r_add, r_rem in port_events:
-                if r_add or r_rem:
-                    risky_lines.append((d, r_add, r_rem))
-                elif added or removed:
-                    other_lines.append((d, added, removed))
-
-            if risky_lines:
-                lines.append("Risky port changes:")
-                for d, a, r in risky_lines[:10]:
-                    lines.append(f"- {format_device(d)} +{sorted(a)} -{sorted(r)}")
-
-            if other_lines:
-                lines.append("Other port changes:")
-                for d, a, r in other_lines[:10]:
-                    lines.append(f"- {format_device(d)} +{len(a)} -{len(r)}")
-
-        lines.append("Dashboard: http://192.168.235.175:8787/")
-        msg = "\n".join(lines)
-
-    # Wake with message
-    run(['openclaw', 'gateway', 'wake', '--text', msg, '--mode', 'now'], timeout=10)
-
-    with open(last_alert_path, 'w') as f:
-        f.write(str(now_epoch()))
+    results = run_once(state, log=lambda m: print(m, file=sys.stderr))
+    for name, err in sorted(results.items()):
+        print(f"{name}: {'sent' if err is None else 'failed'}")
 
 
 if __name__ == '__main__':
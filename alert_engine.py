@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+"""Alert events, rules, batching and pluggable sinks.
+
+render.py appends each scan's change events (change_detect.py) to
+state/alerts/outbox.jsonl (cheap, no network). alert.py drains the outbox in
+the background: events are matched against rules, routed to sinks, collapsed
+into one digest per sink per rate-limit window and delivered through a queue
+with retry/backoff, so a slow webhook or SMTP server never blocks a scan.
+
+state/alerts.json
+{
+  "enabled": true,
+  "mode": "all",                    # all | minimal | off (legacy shorthand for rules)
+  "includePortChanges": true,
+  "rateLimitMinutes": 5,            # min gap between messages per sink
+  "dedupMinutes": 60,               # default per-key cooldown (see alert_state.py)
+  "cooldowns": {"gone": 240},       # per event kind overrides, minutes
+  "dashboardUrl": "http://nw.lan:8787/",
+  "sinks": {
+    "hook": {"type": "webhook", "url": "https://example/hook", "timeout": 10},
+    "mail": {"type": "smtp", "host": "smtp.lan", "port": 587, "starttls": true,
+             "from": "nw@lan", "to": ["me@lan"], "username": "", "passwordEnv": "NW_SMTP_PASSWORD"},
+    "log":  {"type": "file", "path": "alerts/alerts.log"},
+    "wake": {"type": "command", "argv": ["openclaw", "gateway", "wake", "--text", "{text}", "--mode", "now"]}
+  },
+  "rules": [
+    {"kinds": ["new", "gone"], "sinks": ["wake", "log"]},
+    {"kinds": ["port_opened", "port_closed"], "riskyOnly": true, "sinks": ["hook"]}
+  ]
+}
+"""
+import json
+import os
+import queue
+import smtplib
+import subprocess
+import threading
+import time
+import urllib.request
+from email.message import EmailMessage
+
+from alert_state import event_key, load_alert_state, observe, save_alert_state
+from fsutil import atomic_write_text
+
+PORT_KINDS = ('port_opened', 'port_closed')
+
+# Without a "sinks" section we keep the historical behaviour: wake the local
+# OpenClaw gateway with the message text.
+DEFAULT_SINKS = {
+    'openclaw': {'type': 'command', 'argv': ['openclaw', 'gateway', 'wake', '--text', '{text}', '--mode', 'now']},
+}
+
+MAX_OUTBOX_EVENTS = 5000
+RETRY_ATTEMPTS = 3
+RETRY_BASE_SECONDS = 2
+RETRY_MAX_SECONDS = 3600
+
+
+def load_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+def now_epoch():
+    return int(time.time())
+
+
+def alerts_dir(state_dir):
+    d = os.path.join(state_dir, 'alerts')
+    os.makedirs(d, exist_ok=True)
+    return d
+
+
+def load_config(state_dir):
+    cfg = load_json(os.path.join(state_dir, 'alerts.json'))
+    return cfg if isinstance(cfg, dict) else {}
+
+
+def alerts_enabled(cfg):
+    mode = (cfg.get('mode') or 'all').strip().lower()
+    return bool(cfg.get('enabled', True)) and mode != 'off'
+
+
+def enqueue_events(state_dir, events):
+    """Append events to the outbox (one JSON object per line)."""
+    if not events:
+        return 0
+    path = os.path.join(alerts_dir(state_dir), 'outbox.jsonl')
+    blob = ''.join(json.dumps(ev, separators=(',', ':')) + '\n' for ev in events)
+    # Single O_APPEND write so a concurrent drain never sees half a line.
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, blob.encode('utf-8'))
+    finally:
+        os.close(fd)
+    return len(events)
+
+
+def _claim_alive(name):
+    """True if the outbox.<pid>.<ns>.draining file belongs to another running drain."""
+    try:
+        pid = int(name.split('.')[1])
+    except (IndexError, ValueError):
+        return False
+    if pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+def take_outbox(state_dir):
+    """Claim everything queued so far -> (events, claimed files).
+
+    New events go to a fresh outbox.jsonl. The claimed files stay on disk until
+    release_outbox(), so a drain that dies before its events reach pending.json
+    leaves them behind and the next drain picks them up again.
+    """
+    d = alerts_dir(state_dir)
+    path = os.path.join(d, 'outbox.jsonl')
+    claimed = os.path.join(d, f'outbox.{os.getpid()}.{time.time_ns()}.draining')
+    leftovers = sorted(
+        (os.path.join(d, n) for n in os.listdir(d)
+         if n.startswith('outbox.') and n.endswith('.draining') and not _claim_alive(n)),
+        key=lambda p: (os.path.getmtime(p), p))
+    try:
+        os.replace(path, claimed)
+        files = leftovers + [claimed]
+    except FileNotFoundError:
+        files = leftovers
+    events = []
+    for fp in files:
+        with open(fp, 'r', errors='replace') as f:
+            for line in f:
+                try:
+                    ev = json.loads(line)
+                except Exception:
+                    continue
+                if isinstance(ev, dict) and ev.get('kind'):
+                    events.append(ev)
+    return events[-MAX_OUTBOX_EVENTS:], files
+
+
+def release_outbox(claimed):
+    """Drop claimed outbox files once their events are safe in pending.json."""
+    for fp in claimed:
+        try:
+            os.unlink(fp)
+        except FileNotFoundError:
+            pass
+
+
+def effective_sinks(cfg):
+    sinks = cfg.get('sinks')
+    return sinks if isinstance(sinks, dict) and sinks else DEFAULT_SINKS
+
+
+def effective_rules(cfg):
+    rules = cfg.get('rules')
+    if isinstance(rules, list) and rules:
+        return rules
+    # Legacy shorthand: mode + includePortChanges -> one rule to every sink.
+    mode = (cfg.get('mode') or 'all').strip().lower()
+    kinds = ['new', 'returned', 'gone']
+    if mode != 'minimal':
+        kinds += ['ip_change', 'conflict', 'anomaly']
+        if cfg.get('includePortChanges', True):
+            kinds += list(PORT_KINDS) + ['version_change']
+    return [{'kinds': kinds, 'sinks': list(effective_sinks(cfg).keys())}]
+
+
+def rule_matches(rule, ev):
+    kinds = rule.get('kinds')
+    if kinds and ev.get('kind') not in kinds:
+        return False
+    if rule.get('riskyOnly') and ev.get('port') and not ev.get('risky'):
+        return False
+    types = rule.get('types')
+    if types and (ev.get('device') or {}).get('type') not in types:
+        return False
+    return True
+
+
+def route_events(cfg, events):
+    """sink name -> [events], following every matching rule."""
+    sinks = effective_sinks(cfg)
+    routed = {}
+    for ev in events:
+        targets = set()
+        for rule in effective_rules(cfg):
+            if rule_matches(rule, ev):
+                targets.update(s for s in (rule.get('sinks') or []) if s in sinks)
+        for name in sorted(targets):
+            routed.setdefault(name, []).append(ev)
+    return routed
+
+
+def format_device(dev, did='', count=1):
+    name = (dev.get('name') or '').strip()
+    vendor = (dev.get('vendor') or '').strip()
+    mac = (dev.get('mac') or '').strip()
+    ip = (dev.get('ip') or '').strip()
+    primary = name or vendor or mac or did
+    line = f"{primary} ({mac}) @ {ip}" if mac else f"{primary} @ {ip}"
+    return f"{line} x{count}" if count > 1 else line
+
+
+def format_message(events, style='all', dashboard_url=''):
+    """Digest text for a batch of events (possibly spanning several scans)."""
+    def of(*kinds):
+        return [e for e in events if e['kind'] in kinds]
+
+    def device_lines(group, limit, extra=lambda e: ''):
+        out = []
+        for e in group[:limit]:
+            out.append("- " + format_device(e.get('device') or {}, e.get('id'), e.get('count', 1)) + extra(e))
+        if len(group) > limit:
+            out.append(f"- ... +{len(group)-limit} more")
+        return out
+
+    new = of('new', 'returned')
+    gone = of('gone')
+    stamps = sorted({e.get('ts') or '' for e in events if e.get('ts')})
+    when = stamps[-1] if len(stamps) <= 1 else f"{stamps[0]} … {stamps[-1]} ({len(stamps)} scans)"
+
+    def returned(e):
+        return ' (returned)' if e['kind'] == 'returned' else ''
+
+    lines = []
+    if style == 'minimal':
+        lines.append(f"Network Watch ({when})")
+        if new:
+            lines.append(f"+{len(new)} new")
+            lines += device_lines(new, 10, returned)
+        if gone:
+            lines.append(f"-{len(gone)} gone")
+            lines += device_lines(gone, 10)
+    else:
+        lines.append(f"Network Watch alert @ {when}")
+        if new:
+            lines.append(f"New devices ({len(new)}):")
+            lines += device_lines(new, 15, returned)
+        if gone:
+            lines.append(f"Gone devices ({len(gone)}):")
+            lines += device_lines(gone, 15)
+
+        conflicts = of('conflict')
+        if conflicts:
+            lines.append("Address conflicts:")
+            for e in conflicts[:10]:
+                if e.get('ids'):
+                    lines.append(f"- {e.get('ip')} claimed by {', '.join(e['ids'])}")
+                else:
+                    lines.append(f"- {e.get('id')} answers on {', '.join(e.get('ips') or [])}")
+        unusual = of('anomaly')
+        if unusual:
+            lines.append("Anomalies:")
+            lines += device_lines(unusual, 10, lambda e: f": {e.get('detail', '')}")
+        moved = of('ip_change')
+        if moved:
+            lines.append("IP changes:")
+            lines += device_lines(moved, 10, lambda e: f" (was {e.get('oldIp', '')})")
+
+        # Port changes grouped per device, risky ones first
+        by_dev = {}
+        for e in of(*PORT_KINDS):
+            slot = by_dev.setdefault(e['id'], {'device': e.get('device') or {}, '+': set(), '-': set(), 'risky': False})
+            slot['+' if e['kind'] == 'port_opened' else '-'].add(e['port'])
+            slot['risky'] = slot['risky'] or e.get('risky')
+        risky = [(k, v) for k, v in by_dev.items() if v['risky']]
+        other = [(k, v) for k, v in by_dev.items() if not v['risky']]
+        if risky:
+            lines.append("Risky port changes:")
+            for did, v in risky[:10]:
+                lines.append(f"- {format_device(v['device'], did)} +{sorted(v['+'])} -{sorted(v['-'])}")
+        if other:
+            lines.append("Other port changes:")
+            for did, v in other[:10]:
+                lines.append(f"- {format_device(v['device'], did)} +{len(v['+'])} -{len(v['-'])}")
+        versions = of('version_change')
+        if versions:
+            lines.append("Service version changes:")
+            lines += device_lines(versions, 10, lambda e: f" {e.get('port')}: {e.get('oldVersion')} -> {e.get('version')}")
+
+    if dashboard_url:
+        lines.append(f"Dashboard: {dashboard_url}")
+    return "\n".join(lines)
+
+
+# --- sinks: fn(cfg, text, events, state_dir) raising on failure ---
+
+def send_webhook(cfg, text, events, state_dir):
+    body = json.dumps({'text': text, 'events': events}).encode('utf-8')
+    req = urllib.request.Request(cfg['url'], data=body, method='POST', headers={
+        'Content-Type': 'application/json',
+        **(cfg.get('headers') or {}),
+    })
+    with urllib.request.urlopen(req, timeout=float(cfg.get('timeout', 10))) as resp:
+        if resp.status >= 300:
+            raise RuntimeError(f"webhook HTTP {resp.status}")
+
+
+def send_smtp(cfg, text, events, state_dir):
+    msg = EmailMessage()
+    msg['Subject'] = cfg.get('subject') or text.splitlines()[0]
+    msg['From'] = cfg['from']
+    to = cfg.get('to') or []
+    msg['To'] = ', '.join(to if isinstance(to, list) else [to])
+    msg.set_content(text)
+    timeout = float(cfg.get('timeout', 20))
+    port = int(cfg.get('port', 587))
+    cls = smtplib.SMTP_SSL if cfg.get('ssl') else smtplib.SMTP
+    with cls(cfg.get('host', 'localhost'), port, timeout=timeout) as s:
+        if cfg.get('starttls') and not cfg.get('ssl'):
+            s.starttls()
+        user = cfg.get('username')
+        if user:
+            s.login(user, os.environ.get(cfg.get('passwordEnv') or 'NW_SMTP_PASSWORD', ''))
+        s.send_message(msg)
+
+
+def send_file(cfg, text, events, state_dir):
+    path = cfg.get('path') or 'alerts/alerts.log'
+    if not os.path.isabs(path):
+        path = os.path.join(state_dir, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a') as f:
+        f.write(json.dumps({'sentAt': now_epoch(), 'text': text, 'events': len(events)}) + '\n')
+
+
+def send_command(cfg, text, events, state_dir):
+    argv = [a.replace('{text}', text) for a in (cfg.get('argv') or [])]
+    p = subprocess.run(argv, capture_output=True, text=True, timeout=float(cfg.get('timeout', 10)))
+    if p.returncode != 0:
+        raise RuntimeError(f"command exited {p.returncode}: {(p.stderr or '').strip()[:200]}")
+
+
+SINK_TYPES = {
+    'webhook': send_webhook,
+    'smtp': send_smtp,
+    'file': send_file,
+    'command': send_command,
+}
+
+
+def backoff_seconds(attempt):
+    return min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * (2 ** max(0, attempt - 1)))
+
+
+def deliver(send, cfg, text, events, state_dir, attempts=RETRY_ATTEMPTS, sleep=None):
+    """Try a sink a few times with exponential backoff; returns the last error or None."""
+    err = None
+    for attempt in range(1, attempts + 1):
+        try:
+            send(cfg, text, events, state_dir)
+            return None
+        except Exception as e:
+            err = f"{type(e).__name__}: {e}"
+            if attempt < attempts:
+                (sleep or time.sleep)(backoff_seconds(attempt))
+    return err
+
+
+def dispatch(jobs, state_dir):
+    """Deliver jobs [(name, cfg, text, events)] through a queue, one worker per
+    sink, so a hung sink only delays itself. Returns {name: error-or-None}."""
+    q = queue.Queue()
+    results = {}
+    for job in jobs:
+        q.put(job)
+
+    def worker():
+        while True:
+            try:
+                name, cfg, text, events = q.get_nowait()
+            except queue.Empty:
+                return
+            send = SINK_TYPES.get(cfg.get('type'))
+            if send is None:
+                results[name] = f"unknown sink type {cfg.get('type')!r}"
+            else:
+                results[name] = deliver(send, cfg, text, events, state_dir)
+            q.task_done()
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(min(len(jobs), 8))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def load_pending(state_dir):
+    obj = load_json(os.path.join(alerts_dir(state_dir), 'pending.json'))
+    return obj if isinstance(obj, dict) else {}
+
+
+def save_pending(state_dir, pending):
+    atomic_write_text(os.path.join(alerts_dir(state_dir), 'pending.json'), json.dumps(pending, indent=2))
+
+
+def run_once(state_dir, now=None, log=print):
+    """Drain the outbox, batch per sink, deliver what the rate limit allows."""
+    now = now_epoch() if now is None else now
+    cfg = load_config(state_dir)
+    events, claimed = take_outbox(state_dir)
+    if not alerts_enabled(cfg):
+        release_outbox(claimed)
+        return {}
+
+    sinks = effective_sinks(cfg)
+    rate_limit = int(cfg.get('rateLimitMinutes', 5) or 0) * 60
+    style = 'minimal' if (cfg.get('mode') or '').strip().lower() == 'minimal' else 'all'
+    dashboard = cfg.get('dashboardUrl') or os.environ.get('NW_DASHBOARD_URL', '')
+
+    # Cooldown/snooze per event key, shared by all sinks
+    st = load_alert_state(state_dir)
+    events = [ev for ev in events if observe(st, cfg, ev, now)]
+
+    pending = load_pending(state_dir)
+    for name, evs in route_events(cfg, events).items():
+        slot = pending.setdefault(name, {'events': [], 'attempts': 0, 'nextAttempt': 0, 'lastSent': 0})
+        queued = {event_key(e) for e in slot['events']}
+        for ev in evs:
+            if event_key(ev) not in queued:
+                queued.add(event_key(ev))
+                slot['events'].append(ev)
+        del slot['events'][:-MAX_OUTBOX_EVENTS]
+    # The claimed outbox goes only once its events are in pending.json; saved
+    # before the alert state so a crash in between re-reads them rather than
+    # dropping them as already seen (the per-slot event_key check dedups).
+    save_pending(state_dir, {name: slot for name, slot in pending.items() if name in sinks})
+    save_alert_state(state_dir, st, now)
+    release_outbox(claimed)
+
+    jobs = []
+    for name, slot in pending.items():
+        cfg_sink = sinks.get(name)
+        if not cfg_sink or not slot['events']:
+            continue
+        if now < slot.get('nextAttempt', 0) or now - slot.get('lastSent', 0) < rate_limit:
+            continue  # keep batching; the next drain sends one digest
+        jobs.append((name, cfg_sink, format_message(slot['events'], style, dashboard), list(slot['events'])))
+
+    results = dispatch(jobs, state_dir) if jobs else {}
+    for name, err in results.items():
+        slot = pending[name]
+        if err is None:
+            slot['events'] = []
+            slot['attempts'] = 0
+            slot['nextAttempt'] = 0
+            slot['lastSent'] = now
+        else:
+            slot['attempts'] = slot.get('attempts', 0) + 1
+            slot['nextAttempt'] = now + backoff_seconds(slot['attempts'] + RETRY_ATTEMPTS)
+            log(f"alert sink {name} failed (attempt {slot['attempts']}): {err}")
+
+    # slots of sinks removed from alerts.json would otherwise be kept forever
+    save_pending(state_dir, {name: slot for name, slot in pending.items() if name in sinks})
+    return results
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Per-key alert memory: state/alert_state.json.
+
+Every event key (kind|device-id|port, plus |subtype for anomalies) keeps when it was first seen, last seen
+and last notified, and how often it occurred. An event is only notified when
+its key is out of cooldown and neither the key nor the device is snoozed, so a
+flapping phone produces one alert per cooldown instead of one per scan.
+
+    {
+      "version": 1,
+      "keys": {"gone|aa:bb:..|": {"first": 1770000000, "seen": ..., "notified": ..., "count": 7}},
+      "snoozes": {"aa:bb:..": 1770003600, "port_opened|aa:bb:..|22/tcp": 1770086400}
+    }
+"""
+import json
+import os
+
+from fsutil import atomic_write_text
+
+VERSION = 1
+
+# Keys not seen for this long are forgotten (keeps the file small on busy networks).
+RETENTION_SECONDS = 30 * 86400
+
+
+def event_key(ev):
+    key = f"{ev.get('kind')}|{ev.get('id')}|{ev.get('port') or ''}"
+    # anomaly subtypes (unusual_hour, ip_unstable, ...) cool down independently
+    return f"{key}|{ev['anomaly']}" if ev.get('anomaly') else key
+
+
+def empty_state():
+    return {'version': VERSION, 'keys': {}, 'snoozes': {}}
+
+
+def load_alert_state(state_dir):
+    try:
+        with open(os.path.join(state_dir, 'alert_state.json'), 'r') as f:
+            obj = json.load(f)
+    except Exception:
+        return empty_state()
+    if not isinstance(obj, dict) or obj.get('version') != VERSION:
+        return empty_state()
+    obj.setdefault('keys', {})
+    obj.setdefault('snoozes', {})
+    return obj
+
+
+def save_alert_state(state_dir, st, now):
+    st['keys'] = {k: v for k, v in st['keys'].items() if now - v.get('seen', 0) <= RETENTION_SECONDS}
+    st['snoozes'] = {k: t for k, t in st['snoozes'].items() if t > now}
+    atomic_write_text(os.path.join(state_dir, 'alert_state.json'), json.dumps(st, separators=(',', ':')))
+
+
+def cooldown_seconds(cfg, kind):
+    per_kind = cfg.get('cooldowns') or {}
+    return int(per_kind.get(kind, cfg.get('dedupMinutes', 60)) or 0) * 60
+
+
+def snoozed(st, ev, now):
+    sn = st['snoozes']
+    return sn.get(ev.get('id'), 0) > now or sn.get(event_key(ev), 0) > now
+
+
+def observe(st, cfg, ev, now):
+    """Record one occurrence; True if it should be notified now.
+
+    Notified events are stamped with how often the key occurred since the last
+    notification (ev['count']) so digests can say "x5" instead of repeating.
+    """
+    key = event_key(ev)
+    rec = st['keys'].get(key)
+    if rec is None:
+        rec = st['keys'][key] = {'first': now, 'seen': now, 'notified': None, 'count': 0, 'pending': 0}
+    rec['seen'] = now
+    rec['count'] += 1
+    rec['pending'] = rec.get('pending', 0) + 1
+    if snoozed(st, ev, now):
+        return False
+    if rec['notified'] is not None and now - rec['notified'] < cooldown_seconds(cfg, ev.get('kind')):
+        return False
+    ev['count'] = rec['pending']
+    rec['notified'] = now
+    rec['pending'] = 0
+    return True
+
+
+def snooze(st, target, until):
+    """Silence a device id or a full event key until the given epoch."""
+    st['snoozes'][target] = int(until)
+
+
+def unsnooze(st, target):
+    st['snoozes'].pop(target, None)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Streaming per-device baselines and anomaly flags.
+
+state/anomaly.json keeps a fixed-size model per device, updated once per scan
+with exponentially weighted averages (no history re-reads):
+
+    hours   24 floats: how often the device is online in each local hour of day
+    hourN   24 ints:   scans observed per hour bin (bins need a few before they count)
+    ipRate  EWMA of "IP changed since last scan"
+    ports   port -> EWMA of "port open"
+    n       scans the device was present (warm-up)
+
+Deviations become anomaly events (same shape as change_detect events, kind
+"anomaly"): a port outside the device's baseline (a printer suddenly exposing
+SSH), presence at an hour it is normally offline, or an IP change on a device
+whose address is normally stable.
+"""
+import json
+import os
+from datetime import datetime, timezone
+
+from change_detect import event
+from fsutil import atomic_write_text
+
+VERSION = 1
+
+ALPHA_HOURS = 0.1
+ALPHA_IP = 0.05
+ALPHA_PORTS = 0.05
+
+WARMUP_SCANS = 24       # present scans before port/IP flags are trusted
+HOUR_MIN_OBS = 7        # scans in an hour bin before presence there is judged
+RARE = 0.05             # below this probability an observation is anomalous
+PORT_FORGET = 0.01      # drop a port from the baseline once its EWMA decays below this
+
+RETENTION_SECONDS = 180 * 86400
+
+
+def empty_model():
+    return {'version': VERSION, 'lastTs': '', 'devices': {}, 'lastFlags': []}
+
+
+def load_model(state_dir):
+    try:
+        with open(os.path.join(state_dir, 'anomaly.json'), 'r') as f:
+            obj = json.load(f)
+    except Exception:
+        return empty_model()
+    if not isinstance(obj, dict) or obj.get('version') != VERSION:
+        return empty_model()
+    obj.setdefault('devices', {})
+    obj.setdefault('lastFlags', [])
+    return obj
+
+
+def save_model(state_dir, model):
+    atomic_write_text(os.path.join(state_dir, 'anomaly.json'), json.dumps(model, separators=(',', ':')))
+
+
+def parse_ts(ts):
+    try:
+        return datetime.strptime(ts, '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return None
+
+
+def ewma(old, x, alpha):
+    return old + alpha * (x - old)
+
+
+def new_device():
+    return {'hours': [0.0] * 24, 'hourN': [0] * 24, 'ipRate': 0.0, 'ip': '', 'ports': {}, 'n': 0, 'last': ''}
+
+
+def flag(ts, did, d, what, score, detail, port=None):
+    return event('anomaly', ts, did, d, port, anomaly=what, score=round(score, 3), detail=detail)
+
+
+def update(model, ts, devices, hour=None):
+    """Score one scan against each device's baseline, then fold it in.
+
+    Returns anomaly events; re-running the same or an older ts returns the
+    flags recorded for the last scan without changing the model.
+    """
+    if model.get('lastTs') and ts <= model['lastTs']:
+        return list(model.get('lastFlags') or [])
+    dt = parse_ts(ts)
+    if hour is None:
+        hour = dt.astimezone().hour if dt else 0
+
+    known = model['devices']
+    now = {}
+    for d in devices:
+        if d.get('id') and d['id'] not in now:
+            now[d['id']] = d
+
+    flags = []
+    for did, d in now.items():
+        m = known.setdefault(did, new_device())
+        warm = m['n'] >= WARMUP_SCANS
+
+        p_hour = m['hours'][hour]
+        if m['hourN'][hour] >= HOUR_MIN_OBS and p_hour < RARE:
+            flags.append(flag(ts, did, d, 'unusual_hour', 1 - p_hour,
+                              f"online at {hour:02d}:00, normally {p_hour:.0%} of scans at this hour"))
+
+        ip = d.get('ip', '')
+        changed = bool(m['ip'] and ip and ip != m['ip'])
+        if warm and changed and m['ipRate'] < RARE:
+            flags.append(flag(ts, did, d, 'ip_unstable', 1 - m['ipRate'],
+                              f"IP {m['ip']} -> {ip}; address normally stable"))
+
+        open_now = {p.get('port') for p in (d.get('open_ports') or []) if p.get('port')}
+        if warm:
+            for port in sorted(open_now):
+                p_port = m['ports'].get(port, 0.0)
+                if p_port < RARE:
+                    flags.append(flag(ts, did, d, 'port_baseline', 1 - p_port,
+                                      f"{port} open; seen open in {p_port:.0%} of recent scans", port=port))
+
+        # Fold the observation in
+        m['ipRate'] = ewma(m['ipRate'], 1.0 if changed else 0.0, ALPHA_IP)
+        m['ip'] = ip or m['ip']
+        for port in set(m['ports']) | open_now:
+            v = ewma(m['ports'].get(port, 0.0), 1.0 if port in open_now else 0.0, ALPHA_PORTS)
+            if v < PORT_FORGET and port not in open_now:
+                m['ports'].pop(port, None)
+            else:
+                m['ports'][port] = round(v, 4)
+        m['n'] += 1
+        m['last'] = ts
+
+    # Every tracked device learns its hour-of-day profile, present or not.
+    for did, m in known.items():
+        m['hours'][hour] = round(ewma(m['hours'][hour], 1.0 if did in now else 0.0, ALPHA_HOURS), 4)
+        m['hourN'][hour] += 1
+
+    if dt is not None:
+        for did in [k for k, m in known.items() if k not in now]:
+            last = parse_ts(known[did].get('last', ''))
+            if last is None or (dt - last).total_seconds() > RETENTION_SECONDS:
+                del known[did]
+
+    model['lastTs'] = ts
+    model['lastFlags'] = flags
+    return flags
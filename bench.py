@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""Benchmark the pipeline on synthetic networks.
+
+Generates arp-scan / nmap / webprobe / enrich artifacts for one scan plus a
+history of snapshots for every (devices, snapshots) case, runs each stage in
+its own process and records wall time and peak RSS:
+
+    parse          render.py's input parsers on the scan artifacts
+    render         render.py, cold (no caches / tracker state)
+    render_warm    render.py again for the same scan (render cache hits)
+    final_report   final_report.py over the whole history
+
+    python3 bench.py                               # default grid, bench_results.json
+    python3 bench.py --devices 10,1000 --snapshots 48
+    python3 bench.py --baseline old.json           # exit 1 on regressions
+
+Cases above --max-cells (devices x snapshots) are recorded as skipped; the
+10k x 8760 corner needs tens of GB of snapshot JSON.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from fsutil import atomic_write_json
+from snapshot_store import write_snapshot
+
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_DEVICES = '10,1000,10000'
+DEFAULT_SNAPSHOTS = '48,720,8760'
+DEFAULT_MAX_CELLS = 2_000_000
+
+SUBNET = '10.0.0.0/16'
+HOST_IP = '10.0.0.1'
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+# (type, vendor, [(port, service, version)])
+PROFILES = [
+    ('phone', 'Apple, Inc.', []),
+    ('phone', 'Samsung Electronics', []),
+    ('laptop', 'Intel Corporate', [('22/tcp', 'ssh', 'OpenSSH 9.6')]),
+    ('printer', 'Brother Industries', [('80/tcp', 'http', ''), ('631/tcp', 'ipp', 'CUPS 2.4'), ('9100/tcp', 'jetdirect', '')]),
+    ('nas', 'Synology Incorporated', [('22/tcp', 'ssh', 'OpenSSH 8.2'), ('445/tcp', 'microsoft-ds', ''), ('5000/tcp', 'http', 'nginx'), ('5001/tcp', 'ssl/http', 'nginx')]),
+    ('tv', 'LG Innotek', [('8008/tcp', 'http', ''), ('8009/tcp', 'ajp13', ''), ('8443/tcp', 'https-alt', '')]),
+    ('iot', 'Espressif Inc.', [('80/tcp', 'http', 'lwIP')]),
+    ('unknown', '(Unknown)', []),
+]
+
+STAGES = ('parse', 'render', 'render_warm', 'final_report')
+
+
+def ts_at(i):
+    return (START + timedelta(hours=i)).strftime('%Y%m%dT%H%M%SZ')
+
+
+def human_at(i):
+    return (START + timedelta(hours=i)).strftime('%Y-%m-%d %H:%M:%S UTC')
+
+
+def synth_devices(n, seed=1):
+    rng = random.Random(seed)
+    out = []
+    for i in range(n):
+        dtype, vendor, ports = PROFILES[rng.randrange(len(PROFILES))]
+        out.append({
+            'i': i,
+            'ip': f'10.0.{(i + 2) // 250}.{(i + 2) % 250 + 1}',
+            'alt_ip': f'10.0.{200 + i // 250 % 50}.{i % 250 + 1}' if rng.random() < 0.1 else '',
+            'mac': '02:00:%02x:%02x:%02x:%02x' % ((i >> 24) & 255, (i >> 16) & 255, (i >> 8) & 255, i & 255),
+            'vendor': vendor,
+            'type': dtype,
+            'ports': ports,
+            'availability': rng.uniform(0.3, 1.0),
+        })
+    return out
+
+
+def port_rows(d):
+    return [{'port': p, 'service': s, 'version': v, 'raw': f'{p} open  {s} {v}'.strip()} for p, s, v in d['ports']]
+
+
+def snapshot_device(d, ip):
+    return {
+        'id': d['mac'],
+        'type': d['type'],
+        'name': '',
+        'hostname': '',
+        'mdns': [],
+        'mdns_services': [],
+        'ssdp': [],
+        'ip': ip,
+        'mac': d['mac'],
+        'vendor': d['vendor'],
+        'open_ports': port_rows(d),
+        'web': [],
+        'risk_flags': ['ssh'] if any(p == '22/tcp' for p, _, _ in d['ports']) else [],
+        'seen_alive': True,
+        'seen_arp': True,
+    }
+
+
+def write_history(state, devices, snapshots, seed=2):
+    rng = random.Random(seed)
+    for s in range(snapshots):
+        present = []
+        for d in devices:
+            if rng.random() < d['availability']:
+                ip = d['alt_ip'] if d['alt_ip'] and rng.random() < 0.2 else d['ip']
+                present.append(snapshot_device(d, ip))
+        snap = {
+            'timestamp_utc': ts_at(s),
+            'timestamp_human': human_at(s),
+            'host_ip': HOST_IP,
+            'subnet': SUBNET,
+            'devices': present,
+            'diff': {'new_ids': [], 'gone_ids': []},
+        }
+        write_snapshot(state, snap)
+        if s == snapshots - 1:
+            atomic_write_json(os.path.join(state, 'latest.json'), snap, indent=2)
+
+
+def write_scan_artifacts(data, ts, devices):
+    with open(os.path.join(data, f'{ts}_arp_scan.txt'), 'w') as f:
+        for d in devices:
+            f.write(f"{d['ip']}\t{d['mac']}\t{d['vendor']}\n")
+    with open(os.path.join(data, f'{ts}_alive.txt'), 'w') as f:
+        for d in devices:
+            f.write(d['ip'] + '\n')
+    with open(os.path.join(data, f'{ts}_top100.txt'), 'w') as f:
+        f.write(f'# Nmap 7.94 scan initiated as: nmap --top-ports 100 {SUBNET}\n')
+        for d in devices:
+            f.write(f"Nmap scan report for {d['ip']}\nHost is up (0.0031s latency).\n")
+            if d['ports']:
+                f.write('PORT     STATE SERVICE VERSION\n')
+                for row in port_rows(d):
+                    f.write(row['raw'] + '\n')
+            f.write(f"MAC Address: {d['mac'].upper()} ({d['vendor']})\n\n")
+    web = []
+    for d in devices:
+        for p, _, _ in d['ports']:
+            if p in ('80/tcp', '5000/tcp', '5001/tcp', '8443/tcp'):
+                scheme = 'https' if p in ('5001/tcp', '8443/tcp') else 'http'
+                port = p.split('/')[0]
+                web.append({'ip': d['ip'], 'port': int(port), 'url': f"{scheme}://{d['ip']}:{port}/",
+                            'status': 200, 'title': f"{d['vendor']} admin", 'server': 'nginx'})
+    with open(os.path.join(data, f'{ts}_webprobe.json'), 'w') as f:
+        json.dump({'results': web}, f)
+    with open(os.path.join(data, f'{ts}_enrich.json'), 'w') as f:
+        json.dump({
+            'rdns': {d['ip']: f"host-{d['i']}.lan" for d in devices[::3]},
+            'mdns': {'hostnames': {}, 'services': {}},
+            'ssdp': {},
+        }, f)
+
+
+def build_case(root, n_devices, n_snapshots):
+    """Lay out a repo-shaped root (state/, data/, site/, logs/); returns the scan ts."""
+    for sub in ('state', 'data', 'site', 'logs'):
+        os.makedirs(os.path.join(root, sub), exist_ok=True)
+    shutil.copytree(os.path.join(REPO, 'site'), os.path.join(root, 'site'), dirs_exist_ok=True)
+    state = os.path.join(root, 'state')
+    with open(os.path.join(state, 'aliases.json'), 'w') as f:
+        f.write('{}')
+    with open(os.path.join(state, 'overrides.json'), 'w') as f:
+        f.write('{"types":{},"names":{}}')
+    with open(os.path.join(state, 'alerts.json'), 'w') as f:
+        f.write('{"mode":"off"}')
+
+    devices = synth_devices(n_devices)
+    write_history(state, devices, n_snapshots)
+    ts = ts_at(n_snapshots)
+    write_scan_artifacts(os.path.join(root, 'data'), ts, devices)
+    return ts
+
+
+def run_measured(argv, env=None):
+    """Run a child process; (seconds, peak RSS MiB, returncode, stdout)."""
+    t0 = time.perf_counter()
+    p = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, env=env, text=True)
+    out = p.stdout.read()
+    p.stdout.close()
+    _, status, ru = os.wait4(p.pid, 0)
+    p.returncode = os.waitstatus_to_exitcode(status)
+    seconds = time.perf_counter() - t0
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = ru.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    return seconds, rss, p.returncode, out
+
+
+def stage_argv(stage, root, ts):
+    if stage in ('render', 'render_warm'):
+        return [sys.executable, os.path.join(REPO, 'render.py'), '--root', root, '--timestamp-utc', ts,
+                '--timestamp-human', ts, '--host-ip', HOST_IP, '--subnet', SUBNET]
+    if stage == 'final_report':
+        return [sys.executable, os.path.join(REPO, 'final_report.py'), '--root', root]
+    return [sys.executable, os.path.abspath(__file__), '--stage', stage, '--root', root, '--ts', ts]
+
+
+def parse_stage(root, ts):
+    """In-process body of the 'parse' stage; prints per-parser seconds as JSON."""
+    sys.path.insert(0, REPO)
+    import render
+    data = os.path.join(root, 'data')
+    detail = {}
+    for name, fn in (
+        ('parse_arp_scan', lambda: render.parse_arp_scan(os.path.join(data, f'{ts}_arp_scan.txt'))),
+        ('parse_alive', lambda: render.parse_alive(os.path.join(data, f'{ts}_alive.txt'))),
+        ('parse_nmap_top', lambda: render.parse_nmap_top(os.path.join(data, f'{ts}_top100.txt'))),
+        ('load_webprobe', lambda: render.load_webprobe(data, ts)),
+        ('load_enrich', lambda: render.load_enrich(data, ts)),
+    ):
+        t0 = time.perf_counter()
+        fn()
+        detail[name] = round(time.perf_counter() - t0, 6)
+    print(json.dumps(detail))
+
+
+def run_case(n_devices, n_snapshots, workdir=None, keep=False, log=print):
+    root = tempfile.mkdtemp(prefix=f'nwbench_{n_devices}x{n_snapshots}_', dir=workdir)
+    case = {'devices': n_devices, 'snapshots': n_snapshots, 'status': 'ok', 'stages': {}}
+    try:
+        t0 = time.perf_counter()
+        ts = build_case(root, n_devices, n_snapshots)
+        case['generateSeconds'] = round(time.perf_counter() - t0, 3)
+
+        env = dict(os.environ)
+        env.pop('NW_APP_ONLY', None)
+        for stage in STAGES:
+            seconds, rss, rc, out = run_measured(stage_argv(stage, root, ts), env=env)
+            res = {'seconds': round(seconds, 4), 'peakRssMb': round(rss, 1)}
+            if rc != 0:
+                res['error'] = f'exit {rc}'
+                case['status'] = 'error'
+            if stage == 'parse' and rc == 0:
+                try:
+                    res['detail'] = json.loads(out.strip().splitlines()[-1])
+                except (ValueError, IndexError):
+                    pass
+            case['stages'][stage] = res
+            log(f"  {n_devices:>6} x {n_snapshots:<5} {stage:<13} {res['seconds']:>9.3f}s {res['peakRssMb']:>8.1f} MiB"
+                + (f"  {res['error']}" if 'error' in res else ''))
+    finally:
+        if keep:
+            case['root'] = root
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+    return case
+
+
+def compare(results, baseline, tolerance=1.5, floor_seconds=0.05):
+    """Regressions of results vs baseline: [(case, stage, metric, old, new)]."""
+    old = {(c['devices'], c['snapshots']): c for c in baseline.get('cases', []) if c.get('status') == 'ok'}
+    out = []
+    for c in results.get('cases', []):
+        prev = old.get((c['devices'], c['snapshots']))
+        if c.get('status') != 'ok' or not prev:
+            continue
+        for stage, res in c['stages'].items():
+            before = prev['stages'].get(stage)
+            if not before:
+                continue
+            label = f"{c['devices']}x{c['snapshots']}"
+            if res['seconds'] > before['seconds'] * tolerance and res['seconds'] - before['seconds'] > floor_seconds:
+                out.append((label, stage, 'seconds', before['seconds'], res['seconds']))
+            if res['peakRssMb'] > before['peakRssMb'] * tolerance:
+                out.append((label, stage, 'peakRssMb', before['peakRssMb'], res['peakRssMb']))
+    return out
+
+
+def int_list(s):
+    return [int(x) for x in s.split(',') if x.strip()]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--devices', default=DEFAULT_DEVICES)
+    ap.add_argument('--snapshots', default=DEFAULT_SNAPSHOTS)
+    ap.add_argument('--max-cells', type=int, default=DEFAULT_MAX_CELLS, help='skip cases with devices*snapshots above this')
+    ap.add_argument('--out', default='bench_results.json')
+    ap.add_argument('--baseline', help='previous results file to compare against')
+    ap.add_argument('--tolerance', type=float, default=1.5, help='allowed slowdown / memory growth factor')
+    ap.add_argument('--workdir', help='where to generate fixtures (default: system temp)')
+    ap.add_argument('--keep', action='store_true', help='keep generated fixtures')
+    ap.add_argument('--stage', help=argparse.SUPPRESS)
+    ap.add_argument('--root', help=argparse.SUPPRESS)
+    ap.add_argument('--ts', help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.stage == 'parse':
+        parse_stage(args.root, args.ts)
+        return
+
+    try:
+        import numpy  # noqa: F401
+        has_numpy = True
+    except ImportError:
+        has_numpy = False
+
+    results = {
+        'version': 1,
+        'createdAt': datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': has_numpy,
+        'cases': [],
+    }
+    for n in int_list(args.devices):
+        for s in int_list(args.snapshots):
+            if n * s > args.max_cells:
+                print(f"  {n:>6} x {s:<5} skipped ({n * s} cells > --max-cells {args.max_cells})")
+                results['cases'].append({'devices': n, 'snapshots': s, 'status': 'skipped', 'stages': {}})
+                continue
+            results['cases'].append(run_case(n, s, workdir=args.workdir, keep=args.keep))
+
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(args.out)
+
+    failed = any(c['status'] == 'error' for c in results['cases'])
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for label, stage, metric, before, after in regressions:
+            print(f"REGRESSION {label} {stage} {metric}: {before} -> {after}")
+        failed = failed or bool(regressions)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
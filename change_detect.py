@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""Incremental change detection across scans.
+
+state/tracker.json remembers every device ever seen (presence/miss streaks,
+IP, MAC, vendor, open ports with service versions). Each scan is folded in
+once and yields typed events, which render.py stores in the snapshot diff and
+queues for alert.py:
+
+    new            first time this device id is seen
+    returned       present again after having gone
+    gone           missed `gone_after` consecutive scans (debounced)
+    ip_change      present device answers on a different IP
+    conflict       one IP claimed by several MACs, or one MAC on several IPs
+    port_opened / port_closed
+    version_change service banner on a still-open port changed
+
+Events share one shape: {kind, ts, id, device, port, risky} plus kind-specific
+fields (oldIp, version/oldVersion, ip/ids/ips for conflicts).
+"""
+import json
+import os
+from datetime import datetime, timezone
+
+from fsutil import atomic_write_text
+
+VERSION = 1
+
+RISKY_PORTS = {'22/tcp', '139/tcp', '445/tcp', '548/tcp', '5000/tcp', '5001/tcp', '8833/tcp', '9100/tcp', '515/tcp', '2049/tcp', '111/tcp'}
+
+GONE_AFTER_MISSES = 2
+
+# Devices gone for longer than this are forgotten (a later sighting is "new" again).
+RETENTION_SECONDS = 180 * 86400
+
+
+def empty_tracker():
+    return {'version': VERSION, 'lastTs': '', 'devices': {}, 'lastEvents': []}
+
+
+def load_tracker(state_dir):
+    try:
+        with open(os.path.join(state_dir, 'tracker.json'), 'r') as f:
+            obj = json.load(f)
+    except Exception:
+        return empty_tracker()
+    if not isinstance(obj, dict) or obj.get('version') != VERSION:
+        return empty_tracker()
+    obj.setdefault('devices', {})
+    obj.setdefault('lastEvents', [])
+    return obj
+
+
+def save_tracker(state_dir, tracker):
+    atomic_write_text(os.path.join(state_dir, 'tracker.json'), json.dumps(tracker, separators=(',', ':')))
+
+
+def device_summary(d):
+    return {k: d.get(k, '') or '' for k in ('name', 'vendor', 'mac', 'ip', 'type')}
+
+
+def event(kind, ts, did, dev, port=None, **extra):
+    ev = {
+        'kind': kind,
+        'ts': ts,
+        'id': did,
+        'device': device_summary(dev or {}),
+        'port': port,
+        'risky': bool(port and port in RISKY_PORTS),
+    }
+    ev.update(extra)
+    return ev
+
+
+def port_map(d):
+    return {p['port']: (p.get('version') or '').strip() for p in (d.get('open_ports') or []) if p.get('port')}
+
+
+def record(d, ts):
+    return {
+        'state': 'present',
+        'streak': 1,
+        'miss': 0,
+        'ip': d.get('ip', ''),
+        'mac': d.get('mac', ''),
+        'vendor': d.get('vendor', ''),
+        'name': d.get('name', ''),
+        'type': d.get('type', ''),
+        'ports': port_map(d),
+        'first': ts,
+        'last': ts,
+    }
+
+
+def seed(tracker, snapshot):
+    """Start tracking from an existing snapshot without emitting events, so the
+    first run after an upgrade does not report every device as new."""
+    ts = snapshot.get('timestamp_utc', '')
+    for d in snapshot.get('devices') or []:
+        if d.get('id') and d['id'] not in tracker['devices']:
+            tracker['devices'][d['id']] = record(d, ts)
+    tracker['lastTs'] = ts
+
+
+def seed_history(tracker, snapshots, gone_after=GONE_AFTER_MISSES):
+    """seed() from a run of snapshots (oldest first). A device's trailing misses
+    are counted over the full scans (discovery sweeps miss sleeping devices):
+    with `gone_after` or more it is tracked as gone, so its next sighting is
+    "returned" rather than "new"; fewer leave it missing, as detect_changes()
+    would have."""
+    devices = tracker['devices']
+    misses = {}
+    last_ts = ''
+    for snap in snapshots:
+        ts = snap.get('timestamp_utc', '')
+        seen = set()
+        for d in snap.get('devices') or []:
+            did = d.get('id')
+            if not did:
+                continue
+            rec = devices.get(did)
+            devices[did] = dict(record(d, ts), first=rec.get('first', ts) if rec else ts)
+            misses[did] = 0
+            seen.add(did)
+        if snap.get('mode') != 'discovery':
+            for did in devices:
+                if did not in seen:
+                    misses[did] = misses.get(did, 0) + 1
+        last_ts = ts or last_ts
+    for did, rec in devices.items():
+        miss = misses.get(did, 0)
+        if miss:
+            rec.update(state='gone' if miss >= gone_after else 'missing', streak=0, miss=miss)
+    if last_ts:
+        tracker['lastTs'] = last_ts
+
+
+def ts_epoch(ts):
+    try:
+        return datetime.strptime(ts, '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def conflict_events(ts, devices, claims):
+    out = []
+    macs_by_ip = {}
+    for ip, mac in claims:
+        if ip and mac:
+            macs_by_ip.setdefault(ip, set()).add(mac)
+    by_id = {d['id']: d for d in devices if d.get('id')}
+    for ip, macs in sorted(macs_by_ip.items()):
+        if len(macs) > 1:
+            owner = next((d for d in devices if d.get('ip') == ip), {'ip': ip})
+            out.append(event('conflict', ts, owner.get('id') or f'ip:{ip}', owner, ip=ip, ids=sorted(macs)))
+    ips_by_id = {}
+    for d in devices:
+        if d.get('id') and d.get('mac'):
+            ips_by_id.setdefault(d['id'], []).append(d.get('ip', ''))
+    for did, ips in sorted(ips_by_id.items()):
+        if len(ips) > 1:
+            out.append(event('conflict', ts, did, by_id[did], ips=sorted(ips)))
+    return out
+
+
+def detect_changes(tracker, ts, devices, claims=(), gone_after=GONE_AFTER_MISSES):
+    """Fold one scan into the tracker and return its events.
+
+    devices: the snapshot's device dicts; claims: raw (ip, mac) sightings (ARP
+    rows) used for conflict detection. Re-running the same or an older ts
+    returns the events recorded for the last scan without touching state.
+    """
+    if tracker.get('lastTs') and ts <= tracker['lastTs']:
+        return list(tracker.get('lastEvents') or [])
+
+    known = tracker['devices']
+    events = []
+    now = {}
+    for d in devices:
+        did = d.get('id')
+        if did and did not in now:
+            now[did] = d
+
+    for did, d in now.items():
+        rec = known.get(did)
+        if rec is None:
+            known[did] = record(d, ts)
+            events.append(event('new', ts, did, d))
+            continue
+
+        if rec['state'] == 'gone':
+            events.append(event('returned', ts, did, d, since=rec.get('last', '')))
+        elif rec['ip'] and d.get('ip') and rec['ip'] != d.get('ip'):
+            events.append(event('ip_change', ts, did, d, oldIp=rec['ip']))
+
+        old_ports = rec.get('ports') or {}
+        new_ports = port_map(d)
+        for port in sorted(set(new_ports) - set(old_ports)):
+            events.append(event('port_opened', ts, did, d, port))
+        for port in sorted(set(old_ports) - set(new_ports)):
+            events.append(event('port_closed', ts, did, d, port))
+        for port in sorted(set(old_ports) & set(new_ports)):
+            if old_ports[port] and new_ports[port] and old_ports[port] != new_ports[port]:
+                events.append(event('version_change', ts, did, d, port, version=new_ports[port], oldVersion=old_ports[port]))
+
+        streak = rec['streak'] + 1 if rec['state'] == 'present' and not rec['miss'] else 1
+        first = rec.get('first', ts)
+        rec.clear()
+        rec.update(record(d, ts), streak=streak, first=first)
+
+    for did, rec in known.items():
+        if did in now or rec['state'] == 'gone':
+            continue
+        rec['miss'] += 1
+        rec['streak'] = 0
+        if rec['miss'] >= gone_after:
+            rec['state'] = 'gone'
+            last = {k: rec.get(k, '') for k in ('name', 'vendor', 'mac', 'ip', 'type')}
+            events.append(event('gone', ts, did, last, since=rec.get('last', '')))
+        else:
+            rec['state'] = 'missing'
+
+    events += conflict_events(ts, list(devices), claims)
+
+    cutoff = ts_epoch(ts)
+    if cutoff is not None:
+        for did in [k for k, r in known.items() if r['state'] == 'gone']:
+            last = ts_epoch(known[did].get('last', ''))
+            if last is not None and cutoff - last > RETENTION_SECONDS:
+                del known[did]
+
+    tracker['lastTs'] = ts
+    tracker['lastEvents'] = events
+    return events
+
+
+def diff_from_events(events):
+    """Snapshot 'diff' block: appeared/gone id lists plus the typed events."""
+    def ids(*kinds):
+        return sorted({e['id'] for e in events if e['kind'] in kinds})
+
+    return {
+        'new_ids': ids('new', 'returned'),
+        'gone_ids': ids('gone'),
+        'returned_ids': ids('returned'),
+        'events': events,
+    }
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""Pack old per-cycle artifacts into per-day archives and apply retention.
+
+Every scan leaves <ts>_* files in data/ (arp-scan, alive, nmap, webprobe,
+enrich, SMB, merged inventories) and logs/ (stdout/stderr, metrics). Once a
+day is NW_COMPACT_AFTER_DAYS old its files move into <dir>/archive/<YYYYMMDD>.zip
+(deflate) and the originals are removed, so data/ and logs/ only hold the
+last few days. Lookups stay random access: the member name's timestamp gives
+the day, the zip's central directory the member (read_artifact()).
+<dir>/archive/index.json lists the archived days (file count, raw and packed
+bytes). Archives older than NW_RETAIN_DATA_DAYS / NW_RETAIN_LOG_DAYS are
+deleted, as are raw files past retention that were never packed.
+
+    python3 compact.py --root R            # run by scan.sh in the background
+    python3 compact.py --root R cat 20260101T000000Z_top100.txt
+"""
+import argparse
+import fcntl
+import os
+import re
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import datetime, timezone
+
+from fsutil import atomic_write_json, read_json
+from stage_metrics import report
+
+ARTIFACT_RE = re.compile(r'^(\d{8})T\d{6}Z_')
+ARCHIVE_DIR = 'archive'
+
+
+def day_of(name):
+    m = ARTIFACT_RE.match(name)
+    return m.group(1) if m else None
+
+
+def day_age_days(day, now):
+    try:
+        start = datetime.strptime(day, '%Y%m%d').replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        return 0
+    return (now - start) / 86400 - 1   # age of the day's end
+
+
+def artifacts_by_day(directory):
+    days = {}
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return days
+    for name in names:
+        day = day_of(name)
+        if day and os.path.isfile(os.path.join(directory, name)):
+            days.setdefault(day, []).append(name)
+    return days
+
+
+def load_index(directory):
+    obj = read_json(os.path.join(directory, ARCHIVE_DIR, 'index.json'), {})
+    if isinstance(obj, dict) and obj.get('version') == 1:
+        return obj
+    return {'version': 1, 'days': {}}
+
+
+def pack_day(directory, day, names):
+    """Merge the day's files into archive/<day>.zip, then delete them; returns (files, bytes)."""
+    adir = os.path.join(directory, ARCHIVE_DIR)
+    os.makedirs(adir, exist_ok=True)
+    dest = os.path.join(adir, f'{day}.zip')
+    fd, tmp = tempfile.mkstemp(prefix=f'.{day}.', suffix='.zip.tmp', dir=adir)
+    os.close(fd)
+    raw = 0
+    try:
+        with zipfile.ZipFile(tmp, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=6) as out:
+            if os.path.exists(dest):
+                with zipfile.ZipFile(dest) as old:
+                    for info in old.infolist():
+                        if info.filename not in names:   # a re-packed name replaces the old member
+                            out.writestr(info, old.read(info.filename))
+            for name in sorted(names):
+                out.write(os.path.join(directory, name), arcname=name)
+                raw += os.path.getsize(os.path.join(directory, name))
+        with zipfile.ZipFile(tmp) as check:
+            if check.testzip() is not None:
+                raise zipfile.BadZipFile(f'{tmp}: CRC mismatch')
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, dest)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    for name in names:
+        try:
+            os.unlink(os.path.join(directory, name))
+        except OSError:
+            pass
+    return len(names), raw
+
+
+def compact_dir(directory, now, after_days, retain_days):
+    """Pack eligible days and apply retention in one artifact directory."""
+    stats = {'packedFiles': 0, 'packedBytes': 0, 'deletedArchives': 0, 'deletedFiles': 0}
+    index = load_index(directory)
+    for day, names in sorted(artifacts_by_day(directory).items()):
+        age = day_age_days(day, now)
+        if retain_days and age >= retain_days:
+            for name in names:
+                os.unlink(os.path.join(directory, name))
+            stats['deletedFiles'] += len(names)
+        elif age >= after_days:
+            n, raw = pack_day(directory, day, names)
+            entry = index['days'].setdefault(day, {'files': 0, 'rawBytes': 0})
+            entry['files'] += n
+            entry['rawBytes'] += raw
+            entry['zipBytes'] = os.path.getsize(os.path.join(directory, ARCHIVE_DIR, f'{day}.zip'))
+            stats['packedFiles'] += n
+            stats['packedBytes'] += raw
+
+    adir = os.path.join(directory, ARCHIVE_DIR)
+    try:
+        archives = [n for n in os.listdir(adir) if re.match(r'^\d{8}\.zip$', n)]
+    except OSError:
+        archives = []
+    for name in archives:
+        day = name[:8]
+        if retain_days and day_age_days(day, now) >= retain_days:
+            os.unlink(os.path.join(adir, name))
+            index['days'].pop(day, None)
+            stats['deletedArchives'] += 1
+    if os.path.isdir(adir):
+        atomic_write_json(os.path.join(adir, 'index.json'), index, indent=2, sort_keys=True)
+    return stats
+
+
+def read_artifact(directory, name):
+    """Bytes of a per-cycle artifact, raw or archived; None if it is gone."""
+    path = os.path.join(directory, name)
+    if os.path.isfile(path):
+        with open(path, 'rb') as f:
+            return f.read()
+    day = day_of(name)
+    if not day:
+        return None
+    try:
+        with zipfile.ZipFile(os.path.join(directory, ARCHIVE_DIR, f'{day}.zip')) as z:
+            return z.read(name)
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return None
+
+
+def env_days(name, default):
+    try:
+        return max(0.0, float(os.environ.get(name, '') or default))
+    except ValueError:
+        return float(default)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--root', required=True)
+    sub = ap.add_subparsers(dest='cmd')
+    c = sub.add_parser('cat', help='print an artifact from data/ or logs/, archived or not')
+    c.add_argument('name')
+    args = ap.parse_args()
+    data = os.path.join(args.root, 'data')
+    logs = os.path.join(args.root, 'logs')
+
+    if args.cmd == 'cat':
+        blob = read_artifact(data, args.name)
+        if blob is None:
+            blob = read_artifact(logs, args.name)
+        if blob is None:
+            print(f'not found: {args.name}', file=sys.stderr)
+            sys.exit(1)
+        sys.stdout.buffer.write(blob)
+        return
+
+    os.makedirs(os.path.join(args.root, 'state'), exist_ok=True)
+    lock = open(os.path.join(args.root, 'state', '.compact.lock'), 'w')
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return   # another compaction is running
+
+    now = time.time()
+    after = env_days('NW_COMPACT_AFTER_DAYS', 2)
+    totals = {}
+    for directory, retain in ((data, env_days('NW_RETAIN_DATA_DAYS', 90)), (logs, env_days('NW_RETAIN_LOG_DAYS', 30))):
+        for k, v in compact_dir(directory, now, after, retain).items():
+            totals[k] = totals.get(k, 0) + v
+    print(' '.join(f'{k}={v}' for k, v in totals.items()))
+    report(**totals)
+
+
+if __name__ == '__main__':
+    main()
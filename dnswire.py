@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""Minimal DNS wire format codec (RFC 1035 + the mDNS bits of RFC 6762).
+
+Used by passive.py to decode sniffed mDNS and by mdns.py to query. Only the
+record types network-watch looks at are decoded; others keep their raw rdata.
+
+    msg = parse_message(packet)
+    msg['answers'] -> [{'name', 'type', 'class', 'cache_flush', 'ttl', 'data'}, ...]
+
+data is a dotted IP for A/AAAA, a name for PTR/CNAME, a list of strings for
+TXT, {'priority', 'weight', 'port', 'target'} for SRV and bytes otherwise.
+
+Names are in presentation form: dots and backslashes inside a label are
+escaped (RFC 6763 section 4.3), so a DNS-SD instance such as
+"Printer v2\\.1._ipp._tcp.local" survives a parse/encode round trip.
+"""
+import socket
+import struct
+
+A = 1
+PTR = 12
+TXT = 16
+AAAA = 28
+SRV = 33
+ANY = 255
+CNAME = 5
+
+CLASS_IN = 1
+QU_BIT = 0x8000           # question: unicast response requested (mDNS)
+CACHE_FLUSH_BIT = 0x8000  # record: cache-flush (mDNS)
+FLAG_QR = 0x8000
+FLAG_AA = 0x0400
+
+MAX_POINTER_HOPS = 32
+
+
+class DNSError(ValueError):
+    pass
+
+
+def read_name(buf, off):
+    """(dotted name, offset after the name in the original position)."""
+    labels = []
+    end = None
+    hops = 0
+    while True:
+        if off >= len(buf):
+            raise DNSError('name runs past end of packet')
+        n = buf[off]
+        if n & 0xC0 == 0xC0:
+            if off + 1 >= len(buf):
+                raise DNSError('truncated pointer')
+            if end is None:
+                end = off + 2
+            hops += 1
+            if hops > MAX_POINTER_HOPS:
+                raise DNSError('pointer loop')
+            off = ((n & 0x3F) << 8) | buf[off + 1]
+            continue
+        if n & 0xC0:
+            raise DNSError('bad label type')
+        off += 1
+        if n == 0:
+            break
+        if off + n > len(buf):
+            raise DNSError('label runs past end of packet')
+        labels.append(buf[off:off + n].decode('utf-8', 'replace').replace('\\', '\\\\').replace('.', '\\.'))
+        off += n
+    return '.'.join(labels), (end if end is not None else off)
+
+
+def split_name(name):
+    """Labels of a presentation-form name, undoing the \\. and \\\\ escapes."""
+    labels, cur, i = [], [], 0
+    while i < len(name):
+        c = name[i]
+        if c == '\\' and i + 1 < len(name):
+            cur.append(name[i + 1])
+            i += 2
+            continue
+        if c == '.':
+            labels.append(''.join(cur))
+            cur = []
+        else:
+            cur.append(c)
+        i += 1
+    labels.append(''.join(cur))
+    return [label for label in labels if label]
+
+
+def encode_name(name):
+    out = b''
+    for label in split_name(name):
+        raw = label.encode('utf-8')
+        if len(raw) > 63:
+            raise DNSError(f'label too long: {label!r}')
+        out += bytes([len(raw)]) + raw
+    return out + b'\x00'
+
+
+def decode_rdata(buf, off, rtype, rdlen):
+    raw = buf[off:off + rdlen]
+    if rtype == A and rdlen == 4:
+        return socket.inet_ntop(socket.AF_INET, raw)
+    if rtype == AAAA and rdlen == 16:
+        return socket.inet_ntop(socket.AF_INET6, raw)
+    if rtype in (PTR, CNAME):
+        return read_name(buf, off)[0]
+    if rtype == SRV and rdlen >= 7:
+        priority, weight, port = struct.unpack_from('!HHH', buf, off)
+        return {'priority': priority, 'weight': weight, 'port': port, 'target': read_name(buf, off + 6)[0]}
+    if rtype == TXT:
+        items, i = [], 0
+        while i < len(raw):
+            n = raw[i]
+            items.append(raw[i + 1:i + 1 + n].decode('utf-8', 'replace'))
+            i += 1 + n
+        return items
+    return bytes(raw)
+
+
+def encode_rdata(rtype, data):
+    if rtype == A:
+        return socket.inet_pton(socket.AF_INET, data)
+    if rtype == AAAA:
+        return socket.inet_pton(socket.AF_INET6, data)
+    if rtype in (PTR, CNAME):
+        return encode_name(data)
+    if rtype == SRV:
+        return struct.pack('!HHH', data.get('priority', 0), data.get('weight', 0), data['port']) + encode_name(data['target'])
+    if rtype == TXT:
+        items = [s.encode('utf-8')[:255] for s in (data or [''])]
+        return b''.join(bytes([len(s)]) + s for s in items)
+    return bytes(data)
+
+
+def parse_message(buf):
+    if len(buf) < 12:
+        raise DNSError('short header')
+    msg_id, flags, qd, an, ns, ar = struct.unpack_from('!HHHHHH', buf, 0)
+    off = 12
+    questions = []
+    for _ in range(qd):
+        name, off = read_name(buf, off)
+        if off + 4 > len(buf):
+            raise DNSError('truncated question')
+        qtype, qclass = struct.unpack_from('!HH', buf, off)
+        off += 4
+        questions.append({'name': name, 'type': qtype, 'class': qclass & ~QU_BIT, 'unicast': bool(qclass & QU_BIT)})
+    sections = []
+    for count in (an, ns, ar):
+        records = []
+        for _ in range(count):
+            name, off = read_name(buf, off)
+            if off + 10 > len(buf):
+                raise DNSError('truncated record')
+            rtype, rclass, ttl, rdlen = struct.unpack_from('!HHIH', buf, off)
+            off += 10
+            if off + rdlen > len(buf):
+                raise DNSError('truncated rdata')
+            records.append({'name': name, 'type': rtype, 'class': rclass & ~CACHE_FLUSH_BIT,
+                            'cache_flush': bool(rclass & CACHE_FLUSH_BIT), 'ttl': ttl,
+                            'data': decode_rdata(buf, off, rtype, rdlen)})
+            off += rdlen
+        sections.append(records)
+    return {'id': msg_id, 'flags': flags, 'response': bool(flags & FLAG_QR), 'questions': questions,
+            'answers': sections[0], 'authority': sections[1], 'additional': sections[2]}
+
+
+def encode_record(rec):
+    rdata = encode_rdata(rec['type'], rec['data'])
+    rclass = rec.get('class', CLASS_IN) | (CACHE_FLUSH_BIT if rec.get('cache_flush') else 0)
+    return encode_name(rec['name']) + struct.pack('!HHIH', rec['type'], rclass, rec.get('ttl', 120), len(rdata)) + rdata
+
+
+def build_message(questions=(), answers=(), additional=(), msg_id=0, flags=0):
+    """questions: [(name, type)] or [(name, type, unicast)]; records as returned by parse_message()."""
+    out = struct.pack('!HHHHHH', msg_id, flags, len(questions), len(answers), 0, len(additional))
+    for q in questions:
+        name, qtype = q[0], q[1]
+        unicast = len(q) > 2 and q[2]
+        out += encode_name(name) + struct.pack('!HH', qtype, CLASS_IN | (QU_BIT if unicast else 0))
+    for rec in list(answers) + list(additional):
+        out += encode_record(rec)
+    return out
@@ -1,6 +1,12 @@
 #!/usr/bin/env bash
 set -euo pipefail
 
+# Aggregator role: no local scanning, just merge sensor deltas and serve the site
+if [[ "${NW_ROLE:-}" == "aggregator" ]]; then
+  mkdir -p /app/data /app/logs /app/state
+  exec python3 /app/aggregator.py --root /app
+fi
+
 : "${NW_SUBNET:?NW_SUBNET is required}"
 : "${NW_INTERFACE:?NW_INTERFACE is required}"
 
@@ -18,10 +24,24 @@ else
   BIND_IP="$(ip -br addr show dev "${NW_INTERFACE}" | awk '{print $3}' | cut -d/ -f1 | head -n1)"
 fi
 
-python3 -m http.server "${NW_HTTP_PORT}" --bind "${BIND_IP}" --directory /app/site >/app/logs/http.log 2>&1 &
+python3 /app/serve.py "${NW_HTTP_PORT}" --bind "${BIND_IP}" --directory /app/site >/app/logs/http.log 2>&1 &
 
 echo "[network-watch] http server: http://${BIND_IP}:${NW_HTTP_PORT}/"
 
+# Passive discovery: sniff ARP/DHCP/mDNS, trigger discovery cycles on new MACs
+case "${NW_PASSIVE:-0}" in
+  1|true|yes|on)
+    python3 /app/passive.py --root /app --iface "${NW_INTERFACE}" >/app/logs/passive.log 2>&1 &
+    echo "[network-watch] passive listener on ${NW_INTERFACE}"
+    ;;
+esac
+
+# Adaptive cadence: ARP discovery every NW_DISCOVERY_EVERY_MINUTES, full scan on
+# change or after NW_SCAN_EVERY_MINUTES (scheduler.py). 0 keeps the fixed loop.
+if [[ "${NW_DISCOVERY_EVERY_MINUTES:-0}" != "0" ]]; then
+  exec python3 /app/scheduler.py --root /app
+fi
+
 # Run one scan immediately, then sleep loop
 while true; do
   echo "[network-watch] scan starting at $(date -Is)"
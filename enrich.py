@@ -1,16 +1,34 @@
 #!/usr/bin/env python3
 import argparse
-import json
 import os
 import re
 import socket
 import subprocess
 
+import mdns as mdns_browser
+import rtt_stats
+import ssdp_probe
+import upnp_describe
+from fsutil import atomic_write_json
+from probe_scheduler import shared as probe_scheduler
+from stage_metrics import report
+
+# Counters reported to stage_metrics.py
+STATS = {'timeouts': 0, 'learnedTimeouts': 0}
+# SMB scripts without RTT history get the old fixed budget; with it, at least
+# SMB_READ_BASE_S or SMB_READ_RTTS round-trip timeouts after connecting
+SMB_TIMEOUT_S = 60
+SMB_READ_BASE_S = 15
+SMB_READ_RTTS = 40
+
 
 def run(cmd, timeout=8):
     try:
         p = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
         return p.returncode, p.stdout, p.stderr
+    except subprocess.TimeoutExpired as e:
+        STATS['timeouts'] += 1
+        return 999, "", str(e)
     except Exception as e:
         return 999, "", str(e)
 
@@ -39,56 +57,18 @@ def rev_dns(ip):
         return None
 
 
-def avahi_mdns(timeout=10):
-    """Return dict with:
-    - hostnames: ip -> [hostnames]
-    - services:  ip -> [service-types]
-
-    Uses avahi-browse -a -r -p -t.
-    """
-    cmd = ['avahi-browse', '-a', '-r', '-p', '-t']
-    rc, out, err = run(cmd, timeout=timeout)
-    hostnames_by_ip = {}
-    services_by_ip = {}
-
-    for line in out.splitlines():
-        parts = line.split(';')
-        # =;iface;proto;inst;_svc._tcp;domain;hostname;ip;port;...
-        if len(parts) >= 9 and (parts[0].startswith('=') or parts[0].startswith('+')):
-            svc = parts[4].strip()
-            hostname = parts[6].strip()
-            ip = parts[7].strip()
-            if re.match(r'^\d+\.\d+\.\d+\.\d+$', ip):
-                if hostname:
-                    hostnames_by_ip.setdefault(ip, set()).add(hostname)
-                if svc:
-                    services_by_ip.setdefault(ip, set()).add(svc)
-
-    return {
-        'hostnames': {ip: sorted(list(v)) for ip, v in hostnames_by_ip.items()},
-        'services': {ip: sorted(list(v)) for ip, v in services_by_ip.items()},
-        'rc': rc,
-        'err': (err or '').strip(),
-    }
-
-
-def nmap_smb_checks(ip, out_path):
-    cmd = ['nmap', '-n', '-p', '445', '--script', 'smb2-security-mode,smb2-time', ip, '-oN', out_path]
-    return run(cmd, timeout=60)
-
-
-def ssdp_probe(root_dir, timeout=2.0):
-    script = os.path.join(root_dir, 'ssdp_probe.py')
-    if not os.path.exists(script):
-        return {}
-    rc, out, err = run(['python3', script, '--timeout', str(timeout)], timeout=int(timeout) + 2)
-    if rc != 0:
-        return {}
+def nmap_smb_checks(ip, out_path, timeout=SMB_TIMEOUT_S):
+    # nmap's own --host-timeout lets it finish the report; the kill is the backstop
+    cmd = ['nmap', '-n', '-p', '445', '--script', 'smb2-security-mode,smb2-time',
+           '--host-timeout', f'{int(timeout)}s', ip, '-oN', out_path]
+    return run(cmd, timeout=timeout + 5)
+
+
+def env_float(name, default):
     try:
-        obj = json.loads(out)
-        return obj.get('ssdp', {}) if isinstance(obj, dict) else {}
-    except Exception:
-        return {}
+        return max(0.5, float(os.environ.get(name, '') or default))
+    except ValueError:
+        return default
 
 
 def main():
@@ -108,29 +88,50 @@ def main():
         if name and name != ip:
             rdns[ip] = name
 
+    iface = os.environ.get('NW_INTERFACE', '')
+    iface_ip = mdns_browser.interface_ip(iface) if iface else ''
+
     mdns = {}
-    try:
-        mdns = avahi_mdns(timeout=10)
-    except Exception:
-        mdns = {}
+    if os.environ.get('NW_ENABLE_MDNS', '1').strip().lower() not in ('0', 'false', 'no', 'off'):
+        try:
+            mdns = mdns_browser.browse(timeout=env_float('NW_MDNS_TIMEOUT', 3.0), iface_ip=iface_ip)
+        except Exception:
+            mdns = {}
 
     ssdp = {}
+    if os.environ.get('NW_ENABLE_SSDP', '1').strip().lower() not in ('0', 'false', 'no', 'off'):
+        try:
+            ssdp = ssdp_probe.collect(timeout=2.0, iface_ip=iface_ip)
+        except Exception:
+            ssdp = {}
+
+    upnp = {}
     try:
-        ssdp = ssdp_probe(args.root, timeout=2.0)
+        upnp, upnp_stats = upnp_describe.describe_all(ssdp, os.path.join(args.root, 'state'))
+        STATS.update(upnp_stats)
     except Exception:
-        ssdp = {}
+        upnp = {}
 
-    smb = {}
+    # SMB scripts run concurrently across hosts, one at a time per host
+    sched = probe_scheduler()
     base_dir = os.path.dirname(args.out)
-    for ip, ports in ports_by_ip.items():
-        if 445 in ports:
-            outp = os.path.join(base_dir, f'{args.ts}_smb_{ip}.txt')
-            rc, _out, err = nmap_smb_checks(ip, outp)
-            smb[ip] = {'rc': rc, 'file': outp, 'err': (err or '').strip()}
+    rtt = rtt_stats.load(os.path.join(args.root, 'state'))
+
+    def smb_check(ip):
+        outp = os.path.join(base_dir, f'{args.ts}_smb_{ip}.txt')
+        _connect, timeout = rtt_stats.timeouts(rtt, ip, SMB_TIMEOUT_S, SMB_TIMEOUT_S, SMB_READ_BASE_S, SMB_READ_RTTS)
+        if ip in rtt:
+            STATS['learnedTimeouts'] += 1
+        with sched.slot(ip):
+            rc, _out, err = nmap_smb_checks(ip, outp, timeout=timeout)
+        return ip, {'rc': rc, 'file': outp, 'err': (err or '').strip()}
+
+    smb = dict(sched.map(smb_check, [ip for ip, ports in ports_by_ip.items() if 445 in ports]))
 
     os.makedirs(os.path.dirname(args.out), exist_ok=True)
-    with open(args.out, 'w') as f:
-        json.dump({'rdns': rdns, 'mdns': mdns, 'ssdp': ssdp, 'smb': smb}, f, indent=2)
+    atomic_write_json(args.out, {'rdns': rdns, 'mdns': mdns, 'ssdp': ssdp, 'upnp': upnp, 'smb': smb}, indent=2)
+
+    report(hosts=len(ports_by_ip), targets=len(smb), **STATS, **sched.stats)
 
 
 if __name__ == '__main__':
@@ -1,24 +1,21 @@
 #!/usr/bin/env python3
-import glob
-import json
+import argparse
 import os
 from collections import defaultdict
 
+from fsutil import atomic_write_text
+from snapshot_store import iter_snapshots
+
 def main():
-    root = os.path.dirname(os.path.abspath(__file__))
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--root', default=os.path.dirname(os.path.abspath(__file__)))
+    root = ap.parse_args().root
     state = os.path.join(root, 'state')
     out_dir = os.path.join(root, 'reports')
     os.makedirs(out_dir, exist_ok=True)
 
-    snapshots = []
-    for p in sorted(glob.glob(os.path.join(state, '*.json'))):
-        if p.endswith('latest.json'):
-            continue
-        try:
-            with open(p, 'r') as f:
-                snapshots.append(json.load(f))
-        except Exception:
-            pass
+    # Timestamped snapshots only (keyframes + deltas, see snapshot_store.py)
+    snapshots = list(iter_snapshots(state))
 
     if not snapshots:
         print('No snapshots found.')
@@ -64,24 +61,23 @@ def main():
     ips_sorted = sorted(seen_counts.keys(), key=lambda ip: (-seen_counts[ip], list(map(int, ip.split('.')))))
 
     for ip in ips_sorted:
-        lines.append(f"{ip}  seen {seen_counts[ip]}/{total} hours")
+        lines.append(f"{ip}  seen {seen_counts[ip]}/{total} snapshots")
         if ip in vendor_by_ip or ip in mac_by_ip:
             lines.append(f"  MAC: {mac_by_ip.get(ip,'')}  Vendor: {vendor_by_ip.get(ip,'')}")
         if flags_by_ip[ip]:
             top_flags = sorted(flags_by_ip[ip].items(), key=lambda kv: -kv[1])
             lines.append("  Risk flags:")
             for fl, c in top_flags[:10]:
-                lines.append(f"    - {fl} ({c}h)")
+                lines.append(f"    - {fl} ({c} snapshots)")
         if ports_by_ip[ip]:
             top_ports = sorted(ports_by_ip[ip].items(), key=lambda kv: -kv[1])
             lines.append("  Open ports observed (top):")
             for raw, c in top_ports[:15]:
-                lines.append(f"    - {raw} ({c}h)")
+                lines.append(f"    - {raw} ({c} snapshots)")
         lines.append("")
 
     out_path = os.path.join(out_dir, f"final_{last.get('timestamp_utc')}.txt")
-    with open(out_path, 'w') as f:
-        f.write("\n".join(lines))
+    atomic_write_text(out_path, "\n".join(lines))
 
     print(out_path)
 
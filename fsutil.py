@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+import json
+import os
+import tempfile
+import time
+
+
+def atomic_write_text(path, text):
+    """Write text to path via a sibling temp file + os.replace.
+
+    Readers (the static HTTP server, alert.py) either see the old file or the
+    new one, never a half-written page.
+    """
+    d = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(path) + '.', suffix='.tmp', dir=d)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def atomic_write_json(path, obj, **dump_kw):
+    atomic_write_text(path, json.dumps(obj, **dump_kw))
+
+
+def read_json(path, default=None, retries=3, delay=0.05):
+    """json.load(path), or default when it is missing or stays unparsable.
+
+    A parse error is retried briefly: files written in place (older releases,
+    hand edits, external tools) can be caught mid-write.
+    """
+    for attempt in range(retries + 1):
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return default
+        except (OSError, ValueError):
+            if attempt == retries:
+                return default
+            time.sleep(delay)
+    return default
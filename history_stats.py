@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""Per-device and per-snapshot history statistics.
+
+Presence and IP lanes are held as devices x snapshots matrices and reduced in
+vectorized passes when NumPy is available (`pip install network-watch[stats]`);
+otherwise the same numbers are computed with plain Python loops.
+"""
+
+try:
+    import numpy as np
+except ImportError:  # optional dependency
+    np = None
+
+# Rolling availability window (snapshots) reported as `availability`.
+AVAILABILITY_WINDOW = 24
+
+
+class _IpCodes(dict):
+    """IP -> integer code, assigned on first sight; '' (not seen) is code 0."""
+
+    def __init__(self):
+        super().__init__({'': 0})
+
+    def __missing__(self, ip):
+        code = self[ip] = len(self)
+        return code
+
+
+def _matrices(order, presence, ip_hist, cols):
+    # Dictionary-encode IPs straight into an int matrix, as presence_pack.py
+    # does; lookups of known IPs stay in C, only first sightings run
+    # _IpCodes.__missing__.
+    codes = _IpCodes()
+    P = np.zeros((len(order), cols), dtype=bool)
+    C = np.zeros((len(order), cols), dtype=np.int32)
+    for r, did in enumerate(order):
+        pres = (presence.get(did) or [])[:cols]
+        P[r, :len(pres)] = np.frombuffer(bytes(pres), dtype=np.bool_)
+        lane = (ip_hist.get(did) or [])[:cols]
+        C[r, :len(lane)] = np.fromiter(map(codes.__getitem__, lane), dtype=np.int32, count=len(lane))
+    return P, C
+
+
+def _device_metrics_np(order, presence, ip_hist, timeline_utc, window):
+    cols = len(timeline_utc)
+    P, codes = _matrices(order, presence, ip_hist, cols)
+
+    flaps = (P[:, 1:] != P[:, :-1]).sum(axis=1)
+    seen = P.sum(axis=1)
+    first = P.argmax(axis=1)
+    last = cols - 1 - P[:, ::-1].argmax(axis=1)
+
+    # Distinct non-empty IP codes per row: sort, count steps, drop the '' code.
+    s = np.sort(codes, axis=1)
+    distinct = (np.diff(s, axis=1) != 0).sum(axis=1) + 1 - (s[:, 0] == 0)
+    avail = P[:, -window:].mean(axis=1)
+
+    out = {}
+    for r, did in enumerate(order):
+        any_seen = bool(seen[r])
+        out[did] = {
+            'flaps': int(flaps[r]),
+            'seen': int(seen[r]),
+            'uptime': round(float(seen[r]) / cols, 4),
+            'availability': round(float(avail[r]), 4),
+            'uniqueIps': int(distinct[r]),
+            'firstSeen': timeline_utc[int(first[r])] if any_seen else '',
+            'lastSeen': timeline_utc[int(last[r])] if any_seen else '',
+        }
+    return out
+
+
+def _device_metrics_py(order, presence, ip_hist, timeline_utc, window):
+    cols = len(timeline_utc)
+    out = {}
+    for did in order:
+        pres = list((presence.get(did) or [])[:cols])
+        pres += [False] * (cols - len(pres))
+        flaps = sum(1 for i in range(1, cols) if pres[i] != pres[i - 1])
+        seen = sum(1 for x in pres if x)
+        lane = (ip_hist.get(did) or [])[:cols]
+        idx = [i for i, on in enumerate(pres) if on]
+        tail = pres[-window:]
+        out[did] = {
+            'flaps': flaps,
+            'seen': seen,
+            'uptime': round(seen / cols, 4) if cols else 0.0,
+            'availability': round(sum(tail) / len(tail), 4) if tail else 0.0,
+            'uniqueIps': len(set(x for x in lane if x)),
+            'firstSeen': timeline_utc[idx[0]] if idx else '',
+            'lastSeen': timeline_utc[idx[-1]] if idx else '',
+        }
+    return out
+
+
+def device_metrics(order, presence, ip_hist, timeline_utc, window=AVAILABILITY_WINDOW):
+    """Flaps, presence counts, uptime, rolling availability, unique IPs, first/last seen.
+
+    presence: device-id -> list[bool] and ip_hist: device-id -> list[str], both
+    aligned to timeline_utc.
+    """
+    if np is not None and order and timeline_utc:
+        return _device_metrics_np(order, presence, ip_hist, timeline_utc, window)
+    return _device_metrics_py(order, presence, ip_hist, timeline_utc, window)
+
+
+def snapshot_totals(history):
+    """Per-snapshot device / open-port / risk-flag counts for history.json."""
+    devices = []
+    ports = []
+    risks = []
+    bounds = []
+    for h in history:
+        ds = h.get('devices', []) or []
+        devices.append(len(ds))
+        bounds.append(len(ports))
+        for d in ds:
+            ports.append(len(d.get('open_ports') or []))
+            risks.append(len(d.get('risk_flags') or []))
+
+    if np is not None and ports:
+        # Segment sums over the flat per-device counts; reduceat needs the
+        # empty snapshots masked out since it returns the next element for them.
+        starts = np.array(bounds, dtype=np.int64)
+        nonempty = np.array(devices, dtype=np.int64) > 0
+        op = np.zeros(len(history), dtype=np.int64)
+        rk = np.zeros(len(history), dtype=np.int64)
+        op[nonempty] = np.add.reduceat(np.array(ports, dtype=np.int64), starts[nonempty])
+        rk[nonempty] = np.add.reduceat(np.array(risks, dtype=np.int64), starts[nonempty])
+        return {'devices': devices, 'openPorts': op.tolist(), 'risks': rk.tolist()}
+
+    bounds.append(len(ports))
+    return {
+        'devices': devices,
+        'openPorts': [sum(ports[bounds[i]:bounds[i + 1]]) for i in range(len(history))],
+        'risks': [sum(risks[bounds[i]:bounds[i + 1]]) for i in range(len(history))],
+    }
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""In-process mDNS browser (one-shot querier, RFC 6762 section 5.1).
+
+Replaces `avahi-browse -a -r -p -t`: no daemon or subprocess, and the
+browse ends as soon as the network goes quiet instead of after a fixed 10 s.
+Queries go out in rounds, each batching as many questions per packet as fit:
+
+    1. PTR _services._dns-sd._udp.local          (service types)
+    2. PTR <type> for every type, repeated once   (instances)
+    3. SRV + TXT per instance, A per SRV target   (host, address)
+
+Records already known go into the answer section (known-answer suppression),
+so responders only send what is missing, and most answer steps 2-3 in the
+additional section of earlier replies anyway. Replies are collected with
+selectors; a round starts once nothing new has arrived for `quiet` seconds,
+and the browse ends when no question is left (or at the deadline).
+
+    browse(timeout=3.0) -> {'hostnames': {ip: [name.local]}, 'services': {ip: [_type._tcp]},
+                            'txt': {ip: {instance: [k=v, ...]}}, 'rc': 0, 'err': ''}
+
+    python3 mdns.py [--iface eth0] [--timeout 3]
+"""
+import argparse
+import fcntl
+import json
+import os
+import selectors
+import socket
+import struct
+import time
+
+import dnswire
+
+MDNS_ADDR = '224.0.0.251'
+MDNS_PORT = 5353
+SERVICES = '_services._dns-sd._udp.local'
+MAX_PACKET = 1400
+PTR_ROUNDS = 2
+# Replies to a one-shot querier carry TTLs capped at 10 s (RFC 6762 6.7);
+# known answers are sent with the DNS-SD default so responders suppress them.
+KNOWN_ANSWER_TTL = 4500
+SIOCGIFADDR = 0x8915
+
+
+def interface_ip(name):
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        return socket.inet_ntoa(fcntl.ioctl(s.fileno(), SIOCGIFADDR, struct.pack('256s', name[:15].encode()))[20:24])
+    except OSError:
+        return ''
+    finally:
+        s.close()
+
+
+class Browser:
+    """What the responders told us so far, and the questions still open."""
+
+    def __init__(self):
+        self.types = set()
+        self.instances = {}   # type -> {instance}
+        self.srv = {}         # instance -> target host
+        self.txt = {}         # instance -> [k=v]
+        self.addrs = {}       # host -> {ip}
+        self.source = {}      # instance -> ip the announcement came from
+        self.asked = {}       # (name, qtype) -> times asked
+
+    def facts(self):
+        return (len(self.types) + sum(len(v) for v in self.instances.values()) + len(self.srv)
+                + len(self.txt) + sum(len(v) for v in self.addrs.values()))
+
+    def handle(self, packet, src_ip):
+        """Fold a reply in; True if it taught us anything."""
+        try:
+            msg = dnswire.parse_message(packet)
+        except dnswire.DNSError:
+            return False
+        if not msg['response']:
+            return False
+        before = self.facts()
+        for rec in msg['answers'] + msg['additional']:
+            name, rtype, data = rec['name'], rec['type'], rec['data']
+            if rtype == dnswire.PTR and name == SERVICES:
+                self.types.add(data)
+            elif rtype == dnswire.PTR and name.endswith(('._tcp.local', '._udp.local')):
+                self.types.add(name)
+                self.instances.setdefault(name, set()).add(data)
+                self.source.setdefault(data, src_ip)
+            elif rtype == dnswire.SRV:
+                self.srv[name] = data['target']
+                self.source.setdefault(name, src_ip)
+            elif rtype == dnswire.TXT:
+                self.txt[name] = [t for t in data if t]
+            elif rtype == dnswire.A:
+                self.addrs.setdefault(name, set()).add(data)
+        return self.facts() > before
+
+    def questions(self):
+        """[(name, qtype, known answers)] still worth asking."""
+        out = []
+        for name in [SERVICES] + sorted(self.types):
+            if self.asked.get((name, dnswire.PTR), 0) < PTR_ROUNDS:
+                have = self.types if name == SERVICES else self.instances.get(name, ())
+                known = [{'name': name, 'type': dnswire.PTR, 'data': d, 'ttl': KNOWN_ANSWER_TTL} for d in sorted(have)]
+                out.append((name, dnswire.PTR, known))
+        for inst in sorted(i for insts in self.instances.values() for i in insts):
+            for qtype, have in ((dnswire.SRV, self.srv), (dnswire.TXT, self.txt)):
+                if inst not in have and not self.asked.get((inst, qtype)):
+                    out.append((inst, qtype, []))
+        for host in sorted(set(self.srv.values())):
+            if host not in self.addrs and not self.asked.get((host, dnswire.A)):
+                out.append((host, dnswire.A, []))
+        return out
+
+    def result(self):
+        hostnames, services, txt = {}, {}, {}
+        for host, ips in self.addrs.items():
+            for ip in ips:
+                hostnames.setdefault(ip, set()).add(host)
+        for stype, insts in self.instances.items():
+            for inst in insts:
+                target = self.srv.get(inst)
+                ips = self.addrs.get(target) if target else None
+                for ip in ips or [self.source.get(inst)]:
+                    if not ip:
+                        continue
+                    services.setdefault(ip, set()).add(stype[:-len('.local')])
+                    if target:
+                        hostnames.setdefault(ip, set()).add(target)
+                    if self.txt.get(inst):
+                        txt.setdefault(ip, {})[inst] = self.txt[inst]
+        return {
+            'hostnames': {ip: sorted(v) for ip, v in hostnames.items()},
+            'services': {ip: sorted(v) for ip, v in services.items()},
+            'txt': txt,
+        }
+
+
+def pack_queries(questions, max_bytes=MAX_PACKET):
+    """Batch questions (with their known answers) into as few packets as fit."""
+    packets, batch = [], []
+    for q in questions:
+        trial = batch + [q]
+        msg = dnswire.build_message([(n, t) for n, t, _ in trial], answers=[a for _, _, ka in trial for a in ka])
+        if len(msg) > max_bytes and batch:
+            packets.append(dnswire.build_message([(n, t) for n, t, _ in batch],
+                                                 answers=[a for _, _, ka in batch for a in ka]))
+            batch = [q]
+        else:
+            batch = trial
+    if batch:
+        packets.append(dnswire.build_message([(n, t) for n, t, _ in batch], answers=[a for _, _, ka in batch for a in ka]))
+    return packets
+
+
+def open_sockets(iface_ip, listen_multicast):
+    """Query socket (ephemeral port: responders answer it unicast) and, when
+    possible, a 5353 listener for responders that always answer multicast."""
+    q = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    q.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 255)
+    if iface_ip:
+        q.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(iface_ip))
+    q.bind((iface_ip or '', 0))
+    socks = [q]
+    if listen_multicast:
+        m = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            m.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if hasattr(socket, 'SO_REUSEPORT'):
+                m.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            m.bind(('', MDNS_PORT))
+            m.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+                         socket.inet_aton(MDNS_ADDR) + socket.inet_aton(iface_ip or '0.0.0.0'))
+            socks.append(m)
+        except OSError:
+            m.close()
+    return socks
+
+
+def browse(timeout=3.0, quiet=0.5, iface_ip='', dest=(MDNS_ADDR, MDNS_PORT), listen_multicast=True):
+    """Browse all services until quiet or `timeout` seconds; same shape as the old avahi-browse parse."""
+    b = Browser()
+    try:
+        socks = open_sockets(iface_ip, listen_multicast)
+    except OSError as e:
+        return dict(b.result(), rc=1, err=str(e))
+    sel = selectors.DefaultSelector()
+    for s in socks:
+        sel.register(s, selectors.EVENT_READ)
+    start = time.monotonic()
+    deadline = start + timeout
+    idle_since = start - quiet
+    rounds = packets_sent = 0
+    try:
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if now - idle_since >= quiet:
+                qs = b.questions()
+                if not qs:
+                    break
+                for pkt in pack_queries(qs):
+                    socks[0].sendto(pkt, dest)
+                    packets_sent += 1
+                for name, qtype, _ in qs:
+                    b.asked[(name, qtype)] = b.asked.get((name, qtype), 0) + 1
+                rounds += 1
+                idle_since = now
+            for key, _ in sel.select(max(0.0, min(deadline, idle_since + quiet) - now)):
+                try:
+                    packet, addr = key.fileobj.recvfrom(9000)
+                except OSError:
+                    continue
+                if b.handle(packet, addr[0]):
+                    idle_since = time.monotonic()
+    except OSError as e:
+        return dict(b.result(), rc=1, err=str(e))
+    finally:
+        sel.close()
+        for s in socks:
+            s.close()
+    return dict(b.result(), rc=0, err='', rounds=rounds, packets=packets_sent,
+                seconds=round(time.monotonic() - start, 3))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--iface', default=os.environ.get('NW_INTERFACE', ''))
+    ap.add_argument('--timeout', type=float, default=3.0)
+    ap.add_argument('--quiet', type=float, default=0.5)
+    args = ap.parse_args()
+    print(json.dumps(browse(args.timeout, args.quiet, interface_ip(args.iface) if args.iface else ''), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""Passive device discovery: sniff ARP, DHCP and mDNS on the LAN interface.
+
+Active sweeps only see a device on the next cycle; most devices announce
+themselves long before that (ARP for their gateway, a DHCP request when they
+join, mDNS announcements). This listener reads those frames from an
+AF_PACKET socket (kernel-side BPF filter: ARP, UDP 67/68/5353) and keeps a
+last-seen table in state/passive.json:
+
+    {"version": 1, "updated": <epoch>,
+     "devices": {mac: {"ip", "firstSeen", "lastSeen", "hostname", "vendorClass",
+                       "mdns": [...], "services": [...], "sources": [...]}}}
+
+ - ARP: sender MAC/IP (probes from 0.0.0.0 give the MAC only)
+ - DHCP: client MAC, hostname (option 12), vendor class (60), requested or
+   client IP; ACKs seen on the wire give the leased IP
+ - mDNS: A records for the sender's own IP (hostname), PTR service types
+
+render.py merges entries seen within NW_PASSIVE_WINDOW_MINUTES into the
+inventory. A MAC that is neither in the table nor in state/latest.json
+triggers `scan.sh --discovery` after NW_PASSIVE_TRIGGER_SECONDS (coalescing
+bursts, at most one run a minute), so new devices show up within seconds.
+Entries unseen for NW_PASSIVE_FORGET_HOURS are dropped.
+
+    python3 passive.py --root /app [--iface eth0]       # started by the entrypoint (NW_PASSIVE=1)
+    python3 passive.py --root R --pcap capture.pcap     # replay a classic pcap (Ethernet) file
+"""
+import argparse
+import ctypes
+import os
+import socket
+import struct
+import subprocess
+import sys
+import time
+
+import dnswire
+from fsutil import atomic_write_json, read_json
+
+VERSION = 1
+ETH_P_ALL = 0x0003
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_ARP = 0x0806
+ETHERTYPE_VLAN = (0x8100, 0x88a8)
+PACKET_OUTGOING = 4
+SO_ATTACH_FILTER = 26
+DHCP_MAGIC = b'\x63\x82\x53\x63'
+DHCP_SERVER_PORT = 67
+DHCP_CLIENT_PORT = 68
+DHCPREQUEST = 3
+DHCPACK = 5
+MDNS_PORT = 5353
+IGNORE_MACS = ('00:00:00:00:00:00', 'ff:ff:ff:ff:ff:ff')
+MIN_TRIGGER_GAP = 60
+
+# arp or (udp and (port 67 or port 68 or port 5353)), unfragmented IPv4 only
+BPF_PROGRAM = [
+    (0x28, 0, 0, 12),          # ldh [12]
+    (0x15, 14, 0, 0x0806),     # jeq ARP -> accept
+    (0x15, 0, 14, 0x0800),     # jeq IPv4 else drop
+    (0x30, 0, 0, 23),          # ldb [23]
+    (0x15, 0, 12, 17),         # jeq UDP else drop
+    (0x28, 0, 0, 20),          # ldh [20]
+    (0x45, 10, 0, 0x1fff),     # jset fragment offset -> drop
+    (0xb1, 0, 0, 14),          # ldxb 4*([14]&0xf)
+    (0x48, 0, 0, 14),          # ldh [x+14] source port
+    (0x15, 6, 0, 67),
+    (0x15, 5, 0, 68),
+    (0x15, 4, 0, 5353),
+    (0x48, 0, 0, 16),          # ldh [x+16] destination port
+    (0x15, 2, 0, 67),
+    (0x15, 1, 0, 68),
+    (0x15, 0, 1, 5353),
+    (0x06, 0, 0, 0x40000),     # accept
+    (0x06, 0, 0, 0),           # drop
+]
+
+
+def mac_str(raw):
+    return ':'.join(f'{b:02x}' for b in raw)
+
+
+def ip_str(raw):
+    ip = socket.inet_ntoa(raw)
+    return '' if ip == '0.0.0.0' else ip
+
+
+def observation(mac, ip, source, **extra):
+    return dict({'mac': mac, 'ip': ip, 'source': source}, **extra)
+
+
+def parse_arp(payload):
+    if len(payload) < 28:
+        return None
+    htype, ptype, hlen, plen = struct.unpack_from('!HHBB', payload, 0)
+    if htype != 1 or ptype != ETHERTYPE_IPV4 or hlen != 6 or plen != 4:
+        return None
+    return observation(mac_str(payload[8:14]), ip_str(payload[14:18]), 'arp')
+
+
+def dhcp_options(buf):
+    opts, i = {}, 0
+    while i < len(buf):
+        code = buf[i]
+        if code == 0:
+            i += 1
+            continue
+        if code == 255 or i + 1 >= len(buf):
+            break
+        n = buf[i + 1]
+        opts.setdefault(code, bytes(buf[i + 2:i + 2 + n]))
+        i += 2 + n
+    return opts
+
+
+def parse_dhcp(payload):
+    if len(payload) < 240 or payload[236:240] != DHCP_MAGIC:
+        return None
+    op, htype, hlen = payload[0], payload[1], payload[2]
+    if htype != 1 or hlen != 6:
+        return None
+    mac = mac_str(payload[28:34])
+    opts = dhcp_options(payload[240:])
+    msg_type = opts.get(53, b'\x00')[0]
+    text = lambda code: opts.get(code, b'').decode('utf-8', 'replace').strip('\x00 ')[:64]
+    if op == 2:
+        # server reply; only an ACK says the address is actually in use
+        if msg_type != DHCPACK:
+            return None
+        return observation(mac, ip_str(payload[16:20]), 'dhcp')
+    ip = ip_str(payload[12:16])
+    if not ip and msg_type == DHCPREQUEST and len(opts.get(50, b'')) == 4:
+        ip = ip_str(opts[50])
+    return observation(mac, ip, 'dhcp', hostname=text(12), vendorClass=text(60))
+
+
+def parse_mdns(mac, src_ip, payload):
+    obs = observation(mac, src_ip, 'mdns')
+    try:
+        msg = dnswire.parse_message(payload)
+    except dnswire.DNSError:
+        return obs
+    if not msg['response']:
+        return obs
+    names, services = set(), set()
+    for rec in msg['answers'] + msg['additional']:
+        if rec['type'] == dnswire.A and rec['data'] == src_ip:
+            names.add(rec['name'])
+        elif rec['type'] == dnswire.PTR and rec['name'].endswith(('._tcp.local', '._udp.local')) \
+                and not rec['name'].startswith('_services._dns-sd.'):
+            services.add(rec['name'][:-len('.local')])
+    if names:
+        obs['mdns'] = sorted(names)
+    if services:
+        obs['services'] = sorted(services)
+    return obs
+
+
+def parse_frame(frame):
+    """Observation dict ({mac, ip, source, ...}) for an Ethernet frame, or None."""
+    if len(frame) < 14:
+        return None
+    ethertype = struct.unpack_from('!H', frame, 12)[0]
+    off = 14
+    while ethertype in ETHERTYPE_VLAN and len(frame) >= off + 4:
+        ethertype = struct.unpack_from('!H', frame, off + 2)[0]
+        off += 4
+    payload = memoryview(frame)[off:]
+    obs = None
+    if ethertype == ETHERTYPE_ARP:
+        obs = parse_arp(payload)
+    elif ethertype == ETHERTYPE_IPV4 and len(payload) >= 28 and payload[0] >> 4 == 4 and payload[9] == 17:
+        ihl = (payload[0] & 0x0F) * 4
+        if struct.unpack_from('!H', payload, 6)[0] & 0x1FFF or len(payload) < ihl + 8:
+            return None
+        src_ip = ip_str(payload[12:16])
+        sport, dport = struct.unpack_from('!HH', payload, ihl)
+        udp = payload[ihl + 8:]
+        if sport in (DHCP_SERVER_PORT, DHCP_CLIENT_PORT) and dport in (DHCP_SERVER_PORT, DHCP_CLIENT_PORT):
+            obs = parse_dhcp(udp)
+        elif (sport == MDNS_PORT or dport == MDNS_PORT) and src_ip:
+            obs = parse_mdns(mac_str(frame[6:12]), src_ip, bytes(udp))
+    if obs is None or obs['mac'] in IGNORE_MACS or int(obs['mac'][:2], 16) & 1:
+        return None
+    return obs
+
+
+def load_table(state_dir):
+    obj = read_json(os.path.join(state_dir, 'passive.json'), {})
+    if isinstance(obj, dict) and obj.get('version') == VERSION and isinstance(obj.get('devices'), dict):
+        return obj['devices']
+    return {}
+
+
+def save_table(state_dir, devices, now):
+    atomic_write_json(os.path.join(state_dir, 'passive.json'),
+                      {'version': VERSION, 'updated': int(now), 'devices': devices}, indent=2, sort_keys=True)
+
+
+def observe(devices, obs, now):
+    """Fold an observation into the table; True if the MAC was not in it."""
+    rec = devices.get(obs['mac'])
+    new = rec is None
+    if new:
+        rec = devices[obs['mac']] = {'ip': '', 'firstSeen': int(now), 'lastSeen': 0, 'hostname': '',
+                                     'vendorClass': '', 'mdns': [], 'services': [], 'sources': []}
+    rec['lastSeen'] = max(rec['lastSeen'], int(now))
+    if obs['ip']:
+        rec['ip'] = obs['ip']
+    for key in ('hostname', 'vendorClass'):
+        if obs.get(key):
+            rec[key] = obs[key]
+    for key in ('mdns', 'services'):
+        if obs.get(key):
+            rec[key] = sorted(set(rec[key]) | set(obs[key]))
+    if obs['source'] not in rec['sources']:
+        rec['sources'] = sorted(rec['sources'] + [obs['source']])
+    return new
+
+
+def prune(devices, now, max_age):
+    for mac in [m for m, r in devices.items() if now - r.get('lastSeen', 0) > max_age]:
+        del devices[mac]
+
+
+def inventory_macs(state_dir):
+    snap = read_json(os.path.join(state_dir, 'latest.json'), {})
+    devices = snap.get('devices', []) if isinstance(snap, dict) else []
+    return {(d.get('mac') or '').lower() for d in devices if isinstance(d, dict) and d.get('mac')}
+
+
+def read_pcap(path):
+    """Yield (epoch, frame) from a classic libpcap file with Ethernet link type."""
+    with open(path, 'rb') as f:
+        header = f.read(24)
+        if len(header) < 24:
+            return
+        for endian in ('<', '>'):
+            magic = struct.unpack(endian + 'I', header[:4])[0]
+            if magic in (0xA1B2C3D4, 0xA1B23C4D):
+                break
+        else:
+            raise ValueError(f'{path}: not a pcap file (pcapng is not supported)')
+        scale = 1e-9 if magic == 0xA1B23C4D else 1e-6
+        linktype = struct.unpack(endian + 'I', header[20:24])[0]
+        if linktype != 1:
+            raise ValueError(f'{path}: link type {linktype} is not Ethernet')
+        while True:
+            rec = f.read(16)
+            if len(rec) < 16:
+                return
+            sec, frac, incl, _orig = struct.unpack(endian + 'IIII', rec)
+            frame = f.read(incl)
+            if len(frame) < incl:
+                return
+            yield sec + frac * scale, frame
+
+
+def replay(state_dir, path):
+    devices = load_table(state_dir)
+    frames = observations = 0
+    now = time.time()
+    for now, frame in read_pcap(path):
+        frames += 1
+        obs = parse_frame(frame)
+        if obs:
+            observations += 1
+            observe(devices, obs, now)
+    save_table(state_dir, devices, now)
+    return {'frames': frames, 'observations': observations, 'devices': len(devices)}
+
+
+def open_socket(iface):
+    s = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+    try:
+        prog = ctypes.create_string_buffer(b''.join(struct.pack('HBBI', *ins) for ins in BPF_PROGRAM))
+        s.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, struct.pack('HL', len(BPF_PROGRAM), ctypes.addressof(prog)))
+    except OSError as e:
+        print(f'[passive] BPF filter not attached ({e}); filtering in userspace', file=sys.stderr)
+    s.bind((iface, 0))
+    s.settimeout(1.0)
+    return s
+
+
+class Trigger:
+    """Debounced `scan.sh --discovery` runner, one at a time."""
+
+    def __init__(self, cmd, debounce):
+        self.cmd = cmd
+        self.debounce = debounce
+        self.due = None
+        self.last = 0
+        self.proc = None
+
+    def request(self, now):
+        if self.due is None:
+            self.due = max(now + self.debounce, self.last + MIN_TRIGGER_GAP)
+
+    def ready(self, now):
+        if self.proc is not None:
+            rc = self.proc.poll()
+            if rc is None:
+                return False
+            if rc == 75:   # a full scan holds the lock; its render picks the table up anyway
+                print('[passive] discovery skipped: scan in progress', flush=True)
+            self.proc = None
+        return self.due is not None and now >= self.due
+
+    def fire(self, now):
+        self.due = None
+        self.last = now
+        try:
+            self.proc = subprocess.Popen(self.cmd, stdin=subprocess.DEVNULL)
+        except OSError as e:
+            print(f'[passive] discovery failed to start: {e}', file=sys.stderr)
+
+
+def run_live(root, iface, trigger_s, flush_s, forget_s):
+    state = os.path.join(root, 'state')
+    devices = load_table(state)
+    known = inventory_macs(state) | set(devices)
+    trigger = Trigger(['bash', os.path.join(root, 'scan.sh'), '--discovery'], trigger_s)
+    sock = open_socket(iface)
+    dirty, last_flush = False, 0.0
+    print(f'[passive] listening on {iface} ({len(devices)} known)', flush=True)
+    while True:
+        try:
+            frame, addr = sock.recvfrom(65535)
+        except socket.timeout:
+            frame, addr = None, None
+        now = time.time()
+        obs = parse_frame(frame) if frame and addr[2] != PACKET_OUTGOING else None
+        if obs:
+            observe(devices, obs, now)
+            dirty = True
+            if obs['mac'] not in known:
+                known.add(obs['mac'])
+                print(f"[passive] new device {obs['mac']} {obs['ip']} via {obs['source']}", flush=True)
+                trigger.request(now)
+        fire = trigger.ready(now)
+        if dirty and (fire or now - last_flush >= flush_s):
+            prune(devices, now, forget_s)
+            save_table(state, devices, now)
+            dirty, last_flush = False, now
+        if fire:
+            known |= inventory_macs(state)
+            trigger.fire(now)
+
+
+def env_float(name, default):
+    try:
+        return max(0.0, float(os.environ.get(name, '') or default))
+    except ValueError:
+        return float(default)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--root', default=os.path.dirname(os.path.abspath(__file__)))
+    ap.add_argument('--iface', default=os.environ.get('NW_INTERFACE', ''))
+    ap.add_argument('--pcap', help='replay a pcap file into state/passive.json instead of listening')
+    args = ap.parse_args()
+    state = os.path.join(args.root, 'state')
+    os.makedirs(state, exist_ok=True)
+
+    if args.pcap:
+        print(replay(state, args.pcap))
+        return
+    if not args.iface:
+        print('ERROR: set NW_INTERFACE or --iface', file=sys.stderr)
+        sys.exit(2)
+    run_live(args.root, args.iface,
+             trigger_s=env_float('NW_PASSIVE_TRIGGER_SECONDS', 10),
+             flush_s=env_float('NW_PASSIVE_FLUSH_SECONDS', 5),
+             forget_s=env_float('NW_PASSIVE_FORGET_HOURS', 24) * 3600)
+
+
+if __name__ == '__main__':
+    main()
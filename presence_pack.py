@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Compact presence / IP-history encoding for site/presence.json.
+
+Layout (all binary fields base64, integers little-endian):
+
+    {
+      "version": 1,
+      "t": ["20260207T000000Z", ...],   # T snapshot timestamps (columns)
+      "ids": ["aa:bb:..", ...],         # D device ids (rows)
+      "ips": ["192.168.1.10", ...],     # IP dictionary; code k means ips[k-1]
+      "stride": ceil(T / 8),
+      "bits": "...",                    # D * stride bytes, bit j of row r = present
+      "ipRunOffsets": "...",            # uint32[D + 1] into ipRuns (in pairs)
+      "ipRuns": "..."                   # uint32 pairs (start column, ip code)
+    }
+
+Presence is one bit per cell (LSB first). IPs rarely change, so each row's IP
+lane is run-length encoded over dictionary codes (code 0 = not seen).
+"""
+import base64
+import sys
+from array import array
+
+VERSION = 1
+
+
+def _u32(values):
+    a = array('I', values)
+    if a.itemsize != 4:
+        a = array('L', values)
+    if sys.byteorder == 'big':
+        a.byteswap()
+    return a.tobytes()
+
+
+def _from_u32(blob):
+    a = array('I')
+    if a.itemsize != 4:
+        a = array('L')
+    a.frombytes(blob)
+    if sys.byteorder == 'big':
+        a.byteswap()
+    return a
+
+
+def pack_bits(bools, stride):
+    out = bytearray(stride)
+    for j, on in enumerate(bools):
+        if on:
+            out[j >> 3] |= 1 << (j & 7)
+    return out
+
+
+def encode_presence(timeline_utc, order, presence, ip_hist):
+    """Encode presence/IP lanes for the devices in `order`.
+
+    presence: device-id -> list[bool] and ip_hist: device-id -> list[str], both
+    aligned to timeline_utc.
+    """
+    cols = len(timeline_utc)
+    stride = (cols + 7) // 8
+    bits = bytearray()
+    ip_codes = {}
+    ips = []
+    run_offsets = [0]
+    runs = []
+
+    for did in order:
+        pres = presence.get(did) or [False] * cols
+        bits += pack_bits(pres[:cols], stride)
+
+        lane = ip_hist.get(did) or []
+        prev = None
+        for j in range(cols):
+            ip = lane[j] if j < len(lane) and pres[j] else ''
+            code = 0
+            if ip:
+                code = ip_codes.get(ip)
+                if code is None:
+                    ips.append(ip)
+                    code = ip_codes[ip] = len(ips)
+            if code != prev:
+                runs += (j, code)
+                prev = code
+        run_offsets.append(len(runs) // 2)
+
+    return {
+        'version': VERSION,
+        't': list(timeline_utc),
+        'ids': list(order),
+        'ips': ips,
+        'stride': stride,
+        'bits': base64.b64encode(bytes(bits)).decode('ascii'),
+        'ipRunOffsets': base64.b64encode(_u32(run_offsets)).decode('ascii'),
+        'ipRuns': base64.b64encode(_u32(runs)).decode('ascii'),
+    }
+
+
+def decode_presence(obj):
+    """Inverse of encode_presence: (t, {id: [bool]}, {id: [ip or '']})."""
+    t = obj.get('t') or []
+    cols = len(t)
+    stride = obj.get('stride') or 0
+    bits = base64.b64decode(obj.get('bits') or '')
+    offsets = _from_u32(base64.b64decode(obj.get('ipRunOffsets') or ''))
+    runs = _from_u32(base64.b64decode(obj.get('ipRuns') or ''))
+    ips = obj.get('ips') or []
+
+    presence = {}
+    ip_hist = {}
+    for r, did in enumerate(obj.get('ids') or []):
+        row = bits[r * stride:(r + 1) * stride]
+        presence[did] = [bool(row[j >> 3] >> (j & 7) & 1) for j in range(cols)]
+        lane = [''] * cols
+        lo, hi = offsets[r], offsets[r + 1]
+        for k in range(lo, hi):
+            start, code = runs[2 * k], runs[2 * k + 1]
+            end = runs[2 * k + 2] if k + 1 < hi else cols
+            if code:
+                lane[start:end] = [ips[code - 1]] * (end - start)
+        ip_hist[did] = lane
+    return t, presence, ip_hist
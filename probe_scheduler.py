@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""Per-host politeness for the Python probing stages.
+
+web_probe.py (curl/openssl), enrich.py (SMB scripts) and upnp_describe.py
+used to hit each device on their own schedule. Every request to a device
+now takes a slot from one ProbeScheduler:
+
+    - a token bucket per host: NW_PROBE_RATE requests/s, bursts of NW_PROBE_BURST
+    - at most NW_PROBE_PER_HOST requests in flight per host
+    - at most NW_PROBE_PARALLEL requests in flight overall
+
+so overall parallelism can go up (many hosts at once) while a cheap camera
+still sees one request at a time. The stages run one after another within
+a cycle, so each process holding its own scheduler with the same limits
+keeps the per-device budget.
+
+    sched = ProbeScheduler.from_env()
+    with sched.slot(ip):
+        ...one request to ip...
+    results = sched.map(fn, interleave(items, host=lambda item: item[0]))   # up to NW_PROBE_PARALLEL threads
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+DEFAULTS = {'rate': 2.0, 'burst': 4.0, 'per_host': 1, 'parallel': 8}
+
+
+def env_number(name, default, cast=float):
+    try:
+        value = cast(os.environ.get(name, '') or default)
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+class ProbeScheduler:
+    def __init__(self, rate=DEFAULTS['rate'], burst=DEFAULTS['burst'], per_host=DEFAULTS['per_host'],
+                 parallel=DEFAULTS['parallel'], clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.per_host = max(1, int(per_host))
+        self.parallel = max(1, int(parallel))
+        self.clock = clock
+        self.cond = threading.Condition()
+        self.tokens = {}      # host -> (tokens, at)
+        self.inflight = {}    # host -> requests in flight
+        self.total = 0
+        self.stats = {'probeSlots': 0, 'probeWaits': 0, 'probeWaitSeconds': 0.0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(rate=env_number('NW_PROBE_RATE', DEFAULTS['rate']),
+                   burst=env_number('NW_PROBE_BURST', DEFAULTS['burst']),
+                   per_host=env_number('NW_PROBE_PER_HOST', DEFAULTS['per_host'], int),
+                   parallel=env_number('NW_PROBE_PARALLEL', DEFAULTS['parallel'], int))
+
+    def _tokens(self, host, now):
+        tokens, at = self.tokens.get(host, (self.burst, now))
+        return min(self.burst, tokens + (now - at) * self.rate)
+
+    def acquire(self, host):
+        t0 = self.clock()
+        waited = False
+        with self.cond:
+            while True:
+                now = self.clock()
+                tokens = self._tokens(host, now)
+                free = self.inflight.get(host, 0) < self.per_host and self.total < self.parallel
+                if free and tokens >= 1.0:
+                    self.tokens[host] = (tokens - 1.0, now)
+                    self.inflight[host] = self.inflight.get(host, 0) + 1
+                    self.total += 1
+                    self.stats['probeSlots'] += 1
+                    if waited:
+                        self.stats['probeWaits'] += 1
+                        self.stats['probeWaitSeconds'] = round(self.stats['probeWaitSeconds'] + now - t0, 3)
+                    return
+                waited = True
+                # a release notifies; otherwise wake when the bucket has a token again
+                self.cond.wait(None if not free else (1.0 - tokens) / self.rate)
+
+    def release(self, host):
+        with self.cond:
+            self.inflight[host] -= 1
+            if not self.inflight[host]:
+                del self.inflight[host]
+            self.total -= 1
+            self.cond.notify_all()
+
+    @contextmanager
+    def slot(self, host):
+        if not host:
+            yield
+            return
+        self.acquire(host)
+        try:
+            yield
+        finally:
+            self.release(host)
+
+    def map(self, fn, items, workers=None):
+        """[fn(item) for item in items], run on up to `parallel` threads; fn
+        takes its own slots per request."""
+        items = list(items)
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=min(len(items), workers or self.parallel)) as pool:
+            return list(pool.map(fn, items))
+
+
+def interleave(items, host):
+    """items reordered round-robin by host(item), so the first `parallel`
+    workers go to different devices instead of queueing on one."""
+    queues = {}
+    for item in items:
+        queues.setdefault(host(item), []).append(item)
+    out = []
+    lanes = list(queues.values())
+    for i in range(max((len(q) for q in lanes), default=0)):
+        out.extend(q[i] for q in lanes if i < len(q))
+    return out
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared():
+    """Process-wide scheduler configured from the environment."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = ProbeScheduler.from_env()
+        return _shared
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""Opt-in profiling of Python pipeline stages.
+
+    NW_PROFILE=all python3 profiling.py --out-prefix logs/<ts>_render -- render.py --root ...
+
+runs a script as __main__ under cProfile and/or a sampling profiler and writes:
+
+    <prefix>.prof        cProfile dump (pstats / snakeviz)
+    <prefix>.txt         top functions by cumulative time (pstats text)
+    <prefix>.collapsed   sampled stacks, one "root;...;leaf count" per line
+                         (flamegraph.pl / speedscope / inferno)
+
+and a short top-functions summary reported to stage_metrics.py ("profile" in
+the stage's metrics record). scan.sh needs no changes: with NW_PROFILE set,
+stage_metrics.py wraps every Python stage in this script.
+
+NW_PROFILE: off (default) | cprofile | sample | all (1/true/on = all)
+NW_PROFILE_INTERVAL_MS: sampling interval (default 5)
+NW_PROFILE_TOP: functions kept in the summary (default 15)
+"""
+import argparse
+import cProfile
+import io
+import os
+import pstats
+import runpy
+import sys
+import threading
+import time
+from collections import Counter
+
+from stage_metrics import report
+
+MODES = ('cprofile', 'sample', 'all')
+
+
+def profile_mode(env=None):
+    v = (env if env is not None else os.environ.get('NW_PROFILE', '')).strip().lower()
+    if v in ('1', 'true', 'yes', 'on'):
+        return 'all'
+    return v if v in MODES else ''
+
+
+def frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(';', ':')
+
+
+class Sampler:
+    """Samples one thread's Python stack every `interval` seconds."""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='nw-sampler', daemon=True)
+        # Frames of this wrapper and runpy are left out of the stacks
+        self._skip = {os.path.abspath(__file__), os.path.abspath(runpy.__file__), '<frozen runpy>'}
+        self._seen = {}
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                label = self._seen.get(code)
+                if label is None:
+                    skip = code.co_filename in self._skip or os.path.abspath(code.co_filename) in self._skip
+                    label = self._seen[code] = '' if skip else frame_label(code)
+                if label:
+                    stack.append(label)
+                frame = frame.f_back
+            if stack:
+                self.stacks[tuple(reversed(stack))] += 1
+                self.samples += 1
+
+    def collapsed(self):
+        return ''.join(f"{';'.join(stack)} {n}\n" for stack, n in self.stacks.most_common())
+
+    def top(self, n):
+        own = Counter()
+        incl = Counter()
+        for stack, c in self.stacks.items():
+            own[stack[-1]] += c
+            for label in set(stack):
+                incl[label] += c
+        total = self.samples or 1
+        return [{'func': f, 'selfPct': round(100.0 * c / total, 1), 'totalPct': round(100.0 * incl[f] / total, 1)}
+                for f, c in own.most_common(n)]
+
+
+def cprofile_top(prof, n):
+    st = pstats.Stats(prof)
+    rows = []
+    for (filename, line, name), (cc, nc, tt, ct, _callers) in st.stats.items():
+        rows.append({'func': f"{name} ({os.path.basename(filename)}:{line})", 'calls': nc,
+                     'tottime': round(tt, 4), 'cumtime': round(ct, 4)})
+    rows.sort(key=lambda r: -r['tottime'])
+    return rows[:n]
+
+
+def run_profiled(script, argv, out_prefix, mode, interval=0.005, top=15):
+    """Run script as __main__; returns (exit code, summary dict)."""
+    sys.argv = [script] + list(argv)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    os.makedirs(os.path.dirname(os.path.abspath(out_prefix)), exist_ok=True)
+
+    prof = cProfile.Profile() if mode in ('cprofile', 'all') else None
+    sampler = Sampler(threading.get_ident(), interval) if mode in ('sample', 'all') else None
+    code = 0
+    t0 = time.perf_counter()
+    if sampler:
+        sampler.start()
+    if prof:
+        prof.enable()
+    try:
+        runpy.run_path(script, run_name='__main__')
+    except SystemExit as e:
+        code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    finally:
+        if prof:
+            prof.disable()
+        if sampler:
+            sampler.stop()
+
+    summary = {'mode': mode, 'seconds': round(time.perf_counter() - t0, 3), 'files': []}
+    if prof:
+        prof.dump_stats(out_prefix + '.prof')
+        buf = io.StringIO()
+        pstats.Stats(prof, stream=buf).sort_stats('cumulative').print_stats(40)
+        with open(out_prefix + '.txt', 'w') as f:
+            f.write(buf.getvalue())
+        summary['files'] += [out_prefix + '.prof', out_prefix + '.txt']
+        summary['top'] = cprofile_top(prof, top)
+    if sampler:
+        with open(out_prefix + '.collapsed', 'w') as f:
+            f.write(sampler.collapsed())
+        summary['files'].append(out_prefix + '.collapsed')
+        summary['samples'] = sampler.samples
+        summary['topSampled'] = sampler.top(top)
+    return code, summary
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--mode', default=profile_mode() or 'all', choices=MODES)
+    ap.add_argument('--out-prefix', required=True, help='e.g. logs/<ts>_render')
+    ap.add_argument('command', nargs=argparse.REMAINDER, help='-- script.py args...')
+    args = ap.parse_args()
+
+    cmd = args.command[1:] if args.command[:1] == ['--'] else args.command
+    if not cmd:
+        ap.error('missing script after --')
+    interval = max(0.001, float(os.environ.get('NW_PROFILE_INTERVAL_MS', '5') or 5) / 1000.0)
+    top = int(os.environ.get('NW_PROFILE_TOP', '15') or 15)
+
+    code, summary = run_profiled(cmd[0], cmd[1:], args.out_prefix, args.mode, interval=interval, top=top)
+    report(profile=summary)
+    sys.exit(code)
+
+
+if __name__ == '__main__':
+    main()
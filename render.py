@@ -1,10 +1,105 @@
 #!/usr/bin/env python3
 import argparse
-import glob
+import hashlib
 import html
 import json
 import os
 import re
+import time
+from datetime import datetime, timezone
+
+from alert_engine import alerts_enabled, enqueue_events, load_config as load_alert_config
+from anomaly import load_model as load_anomaly_model, save_model as save_anomaly_model, update as update_anomalies
+from change_detect import GONE_AFTER_MISSES, detect_changes, diff_from_events, load_tracker, save_tracker, seed_history
+from fsutil import atomic_write_json, atomic_write_text, read_json
+from history_stats import device_metrics, snapshot_totals
+from presence_pack import encode_presence
+from rollups import METRICS as ROLLUP_METRICS, add_sample, load_rollups, save_rollups, write_site_series
+from snapshot_store import (iter_snapshots, list_ts as list_snapshots, load as load_snapshot,
+                            load_last as load_last_snapshots, write_snapshot)
+from stage_metrics import report
+
+
+# Minimal index for app-only deployments
+APP_REDIRECT_HTML = """<!doctype html>
+<html>
+<head>
+  <meta charset=\"utf-8\" />
+  <meta name=\"viewport\" content=\"width=device-width, initial-scale=1\" />
+  <meta http-equiv=\"refresh\" content=\"0; url=/app/\" />
+  <title>Network Watch</title>
+  <style>body{font-family:ui-sans-serif,system-ui,-apple-system,Segoe UI,Roboto,Helvetica,Arial;margin:24px}</style>
+</head>
+<body>
+  <p>Redirecting to <a href=\"/app/\">/app/</a>…</p>
+</body>
+</html>
+"""
+
+# Device detail page (client-side render from latest.json)
+DEVICE_HTML = """<!doctype html>
+<html>
+<head>
+  <meta charset=\"utf-8\" />
+  <meta name=\"viewport\" content=\"width=device-width, initial-scale=1\" />
+  <title>Network Watch — Device</title>
+  <style>
+    body { font-family: ui-sans-serif, system-ui, -apple-system, Segoe UI, Roboto, Helvetica, Arial; margin: 24px; }
+    code { background: #f6f6f6; padding: 2px 6px; border-radius: 6px; }
+    a { color: #0b57d0; }
+    .muted { color: #666; }
+    pre { background: #f6f6f6; padding: 12px; border-radius: 8px; overflow-x: auto; }
+  </style>
+</head>
+<body>
+  <p><a href=\"/\">← Back</a> · <a href=\"/timeline.html\">Timeline</a> · <a href=\"/ip-history.html\">IP history</a> · <a href=\"/churn.html\">Churn</a> · <a href=\"/graph.html\">Device↔Port graph</a></p>
+  <h1 id=\"title\">Device</h1>
+  <div id=\"content\" class=\"muted\">Loading…</div>
+
+<script>
+(async function(){
+  const params = new URLSearchParams(location.search);
+  const id = params.get('id');
+  const resp = await fetch('/latest.json', {cache:'no-store'}).catch(()=>null);
+  if(!resp){ document.getElementById('content').innerText = 'Failed to load latest.json'; return; }
+  const data = await resp.json();
+  const dev = (data.devices||[]).find(d => d.id === id);
+  if(!dev){ document.getElementById('content').innerText = 'Device not found in latest snapshot.'; return; }
+
+  const title = (dev.name || dev.vendor || dev.id) + ' — ' + (dev.ip || '');
+  document.getElementById('title').innerText = title;
+
+  const lines = [];
+  lines.push('Type: ' + (dev.type||''));
+  lines.push('IP: ' + (dev.ip||''));
+  lines.push('MAC: ' + (dev.mac||''));
+  lines.push('Vendor: ' + (dev.vendor||''));
+  if(dev.hostname) lines.push('Hostname: ' + dev.hostname);
+  if((dev.mdns||[]).length) lines.push('mDNS hostnames: ' + dev.mdns.join(', '));
+  if((dev.mdns_services||[]).length) lines.push('mDNS services: ' + dev.mdns_services.join(', '));
+  if((dev.ssdp||[]).length) {
+    lines.push('SSDP/UPnP:');
+    (dev.ssdp||[]).slice(0,8).forEach(s => {
+      lines.push('  - ' + (s.st||'') + ' | ' + (s.server||'') + ' | ' + (s.location||''));
+    });
+  }
+  lines.push('');
+  lines.push('Open ports:');
+  (dev.open_ports||[]).forEach(p => lines.push('  - ' + p.raw));
+  lines.push('');
+  lines.push('Web probe:');
+  (dev.web||[]).forEach(w => {
+    lines.push('  - ' + (w.url||'') + ' status=' + (w.status||'') + ' server=' + (w.server||'') + ' title=' + (w.title||''));
+  });
+  lines.push('');
+  lines.push('Risk flags: ' + (dev.risk_flags||[]).join(', '));
+
+  document.getElementById('content').innerHTML = '<pre>' + lines.join('\\n').replace(/[&<>]/g, c=>({"&":"&amp;","<":"&lt;",">":"&gt;"}[c])) + '</pre>';
+})();
+</script>
+</body>
+</html>
+"""
 
 
 def read_lines(path):
@@ -189,14 +284,126 @@ def load_enrich(data_dir, ts):
         return {}
 
 
+def last_details(state_dir, latest_path):
+    """device id -> last known device record (ports, web, enrichment) with
+    'details_ts', the full scan it came from: the newest full snapshot,
+    overlaid by state/latest.json (which may be a discovery-only snapshot)."""
+    full = list_snapshots(state_dir)
+    out = {}
+    for snap in [load_snapshot(state_dir, ts) for ts in full[-1:]] + [read_json(latest_path, {})]:
+        if not isinstance(snap, dict):
+            continue
+        for d in snap.get('devices', []) or []:
+            details_ts = d.get('details_ts', snap.get('timestamp_utc', '')) if snap.get('mode') == 'discovery' else snap.get('timestamp_utc', '')
+            if d.get('id') and details_ts and details_ts >= out.get(d['id'], {}).get('details_ts', ''):
+                out[d['id']] = dict(d, details_ts=details_ts)
+    return out
+
+
+def load_passive(state_dir, now, window_s):
+    """mac -> passive.py table entry (with 'mac') seen within window_s of now."""
+    obj = read_json(os.path.join(state_dir, 'passive.json'), {})
+    devices = obj.get('devices') if isinstance(obj, dict) else None
+    if not isinstance(devices, dict):
+        return {}
+    return {mac.lower(): dict(rec, mac=mac.lower()) for mac, rec in devices.items()
+            if isinstance(rec, dict) and now - (rec.get('lastSeen') or 0) <= window_s}
+
+
+def ts_epoch(ts):
+    try:
+        return datetime.strptime(ts, '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc).timestamp()
+    except ValueError:
+        return time.time()
+
+
+def load_merged_devices(path, overrides):
+    """Device list written by aggregator.py; local overrides win over the sensors' names/types."""
+    devices = read_json(path, [])
+    if not isinstance(devices, list):
+        return []
+    out = []
+    for d in devices:
+        if not isinstance(d, dict) or not d.get('id'):
+            continue
+        mac = (d.get('mac') or '').lower()
+        if mac and overrides.get('types', {}).get(mac):
+            d['type'] = overrides['types'][mac]
+        if mac and overrides.get('names', {}).get(mac):
+            d['name'] = overrides['names'][mac]
+        out.append(d)
+    return out
+
+
+def load_render_cache(state_dir):
+    """Input hashes of the legacy HTML pages from the previous render.
+
+    File: state/render_cache.json  {"timeline.html": "<sha256>", ...}
+    """
+    path = os.path.join(state_dir, 'render_cache.json')
+    try:
+        with open(path, 'r') as f:
+            obj = json.load(f)
+            return obj if isinstance(obj, dict) else {}
+    except FileNotFoundError:
+        return {}
+    except Exception:
+        return {}
+
+
+def save_render_cache(state_dir, cache):
+    atomic_write_text(os.path.join(state_dir, 'render_cache.json'), json.dumps(cache, indent=2, sort_keys=True))
+
+
+_SOURCE_DIGEST = None
+
+
+def inputs_key(inputs):
+    # Fold in this file's own digest so template edits invalidate cached pages.
+    global _SOURCE_DIGEST
+    if _SOURCE_DIGEST is None:
+        with open(os.path.abspath(__file__), 'rb') as f:
+            _SOURCE_DIGEST = hashlib.sha256(f.read()).hexdigest()
+    h = hashlib.sha256(_SOURCE_DIGEST.encode('ascii'))
+    h.update(json.dumps(inputs, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8'))
+    return h.hexdigest()
+
+
+def render_page(site_dir, cache, name, inputs, build):
+    """Rebuild site/<name> only when its inputs changed since the last render.
+
+    `inputs` covers everything the page shows except the "Updated" stamp, so a
+    skipped page keeps the time its content last changed. Returns True when
+    the page was (re)written.
+    """
+    key = inputs_key(inputs)
+    out = os.path.join(site_dir, name)
+    if cache.get(name) == key and os.path.exists(out):
+        return False
+    atomic_write_text(out, build())
+    cache[name] = key
+    return True
+
+
+def env_int(name, default):
+    try:
+        return max(1, int(os.environ.get(name, '') or default))
+    except ValueError:
+        return default
+
+
 def device_id(ip, mac):
     if mac and mac != '00:00:00:00:00:00':
         return mac.lower()
     return f"ip:{ip}"
 
 
-def type_guess(vendor, ports, hostname='', mdns_names=None):
-    v = (vendor or '').lower()
+def type_guess(vendor, ports, hostname='', mdns_names=None, vendor_class='', upnp=None):
+    u = upnp or {}
+    v = ((vendor or '') + ' ' + (u.get('manufacturer') or '')).lower()
+    ut = (u.get('deviceType') or '').lower()
+    um = ' '.join(u.get(k) or '' for k in ('friendlyName', 'modelName', 'modelDescription')).lower()
+    vc = (vendor_class or '').lower()
     h = (hostname or '').lower()
     md = [x.lower() for x in (mdns_names or [])]
     ps = set(int(p['port'].split('/')[0]) for p in ports) if ports else set()
@@ -209,6 +416,16 @@ def type_guess(vendor, ports, hostname='', mdns_names=None):
     if 'netgear' in v and (80 in ps or 443 in ps or 53 in ps):
         return 'ap'
 
+    # UPnP device description (upnp_describe.py)
+    if 'internetgatewaydevice' in ut:
+        return 'gateway'
+    if ':printer:' in ut:
+        return 'printer'
+    if 'qnap' in v or 'diskstation' in um:
+        return 'nas'
+    if 'mediarenderer' in ut and re.search(r'\b(tv|bravia|webos|roku|vizio)\b', um + ' ' + v):
+        return 'tv'
+
     # Google Cast / TV-ish patterns
     # 8008/8009/8443 are commonly seen on Chromecast/Android TV devices.
     if (8008 in ps or 8009 in ps or 8443 in ps) and ('android' in h or any('android' in x for x in md) or 'tv' in h or any('tv' in x for x in md)):
@@ -227,6 +444,9 @@ def type_guess(vendor, ports, hostname='', mdns_names=None):
     # Clients
     if 'apple' in v or 'intel' in v:
         return 'client'
+    # DHCP vendor class (option 60) of desktop/phone OS stacks
+    if vc.startswith(('msft', 'android-dhcp')):
+        return 'client'
 
     if 'raspberry pi' in v:
         return 'server'
@@ -244,8 +464,17 @@ def main():
     ap.add_argument('--timestamp-human', required=True)
     ap.add_argument('--host-ip', required=True)
     ap.add_argument('--subnet', required=True)
+    ap.add_argument('--discovery-only', action='store_true',
+                    help='fast cycle: ARP only, keep last known ports/enrichment, refresh presence artifacts')
+    ap.add_argument('--devices-json', help='render this device list (aggregator.py merged inventory) instead of data/<ts>_* scans')
     args = ap.parse_args()
 
+    # Snapshots read from state/ for history, and the slice shown on the
+    # timeline pages / history.json / presence.json.
+    history_snapshots = env_int('NW_HISTORY_SNAPSHOTS', 72)
+    gone_after = env_int('NW_GONE_AFTER_MISSES', GONE_AFTER_MISSES)
+    timeline_snapshots = env_int('NW_TIMELINE_SNAPSHOTS', 48)
+
     # Public app packaging option: only render the offline SPA (+ JSON endpoints).
     # Skip legacy HTML pages (timeline/churn/graph/device/fancy).
     app_only = os.environ.get('NW_APP_ONLY', '').strip().lower() in ('1','true','yes','on')
@@ -273,12 +502,26 @@ def main():
     rdns = enrich.get('rdns', {}) if isinstance(enrich, dict) else {}
     mdns = enrich.get('mdns', {}) if isinstance(enrich, dict) else {}
     ssdp = enrich.get('ssdp', {}) if isinstance(enrich, dict) else {}
+    upnp = enrich.get('upnp', {}) if isinstance(enrich, dict) else {}
 
     inv_by_ip = {r['ip']: r for r in arp_rows}
 
+    # Devices heard by passive.py (ARP/DHCP/mDNS) recently: an inventory source
+    # of their own, and hostname/mDNS hints for the ARP-scanned ones. The
+    # sweep wins where both claim an IP or MAC.
+    passive = load_passive(state, ts_epoch(ts), env_int('NW_PASSIVE_WINDOW_MINUTES', 10) * 60)
+    arp_macs = {(r.get('mac') or '').lower() for r in arp_rows}
+    passive_by_ip = {r['ip']: r for r in passive.values()
+                     if r.get('ip') and r['ip'] not in inv_by_ip and r['mac'] not in arp_macs}
+
+    # Discovery-only cycles have no port scan / enrichment of their own: the
+    # last known details per device come from the previous snapshots.
+    prev_path = os.path.join(state, 'latest.json')
+    prev_by_id = last_details(state, prev_path) if args.discovery_only else {}
+
     devices = []
-    for ip in sorted(set(alive_ips) | set(inv_by_ip.keys()) | set(nmap_hosts.keys()), key=ip_key):
-        inv = inv_by_ip.get(ip, {})
+    for ip in sorted(set(alive_ips) | set(inv_by_ip.keys()) | set(nmap_hosts.keys()) | set(passive_by_ip), key=ip_key):
+        inv = inv_by_ip.get(ip) or passive_by_ip.get(ip, {})
         mac = (inv.get('mac') or '').lower()
         vendor = inv.get('vendor', '')
         did = device_id(ip, mac)
@@ -294,7 +537,27 @@ def main():
             mdns_names = (mdns.get('hostnames', {}) or {}).get(ip, [])
             mdns_services = (mdns.get('services', {}) or {}).get(ip, [])
 
-        dtype = type_guess(vendor, ports, hostname=hostname, mdns_names=mdns_names)
+        ssdp_rows = ssdp.get(ip, []) if isinstance(ssdp, dict) else []
+        upnp_desc = upnp.get(ip, {}) if isinstance(upnp, dict) else {}
+        carried = prev_by_id.get(did)
+        if carried:
+            ports = carried.get('open_ports') or []
+            flags = risk_flags_for_ports(ports)
+            web = carried.get('web') or []
+            hostname = carried.get('hostname', '')
+            mdns_names = carried.get('mdns') or []
+            mdns_services = carried.get('mdns_services') or []
+            ssdp_rows = carried.get('ssdp') or []
+            upnp_desc = carried.get('upnp') or {}
+
+        heard = passive.get(mac, {}) if mac else {}
+        if heard:
+            hostname = hostname or heard.get('hostname', '')
+            mdns_names = mdns_names + [n for n in heard.get('mdns') or [] if n not in mdns_names]
+            mdns_services = mdns_services + [n for n in heard.get('services') or [] if n not in mdns_services]
+
+        dtype = type_guess(vendor, ports, hostname=hostname, mdns_names=mdns_names,
+                           vendor_class=heard.get('vendorClass', ''), upnp=upnp_desc)
 
         # Apply user overrides by MAC
         if mac and overrides.get('types', {}).get(mac):
@@ -309,7 +572,8 @@ def main():
             'hostname': hostname,
             'mdns': mdns_names,
             'mdns_services': mdns_services,
-            'ssdp': ssdp.get(ip, []) if isinstance(ssdp, dict) else [],
+            'ssdp': ssdp_rows,
+            'upnp': upnp_desc,
             'ip': ip,
             'mac': mac,
             'vendor': vendor,
@@ -318,36 +582,57 @@ def main():
             'risk_flags': flags,
             'seen_alive': ip in alive_ips,
             'seen_arp': ip in inv_by_ip,
+            'seen_passive': bool(heard),
+            'vendor_class': heard.get('vendorClass', ''),
         })
-
-    # Previous snapshot for diff (by device id) with debounce: require 2 consecutive misses
-    prev_path = os.path.join(state, 'latest.json')
-    prev = None
-    if os.path.exists(prev_path):
-        with open(prev_path, 'r') as f:
-            prev = json.load(f)
-
-    # second previous (timestamped snapshots only)
-    prev2 = None
-    snap_paths = sorted([
-        p for p in glob.glob(os.path.join(state, '*.json'))
-        if re.search(r'/\d{8}T\d{6}Z\.json$', p)
-    ])
-    if len(snap_paths) >= 2:
-        try:
-            with open(snap_paths[-2], 'r') as f:
-                prev2 = json.load(f)
-        except Exception:
-            prev2 = None
-
-    prev_ids = set(d.get('id') for d in (prev.get('devices', []) if prev else []) if d.get('id'))
-    now_ids = set(d.get('id') for d in devices if d.get('id'))
-
-    prev2_ids = set(d.get('id') for d in (prev2.get('devices', []) if prev2 else []) if d.get('id'))
-
-    new_ids = sorted(now_ids - prev_ids)
-    # Gone: present in prev and prev2, missing now
-    gone_ids = sorted((prev_ids & prev2_ids) - now_ids)
+        if args.discovery_only:
+            # ports/enrichment are as of details_ts ('' = never port-scanned)
+            devices[-1]['details_ts'] = (carried or {}).get('details_ts', '')
+            devices[-1]['details_stale'] = True
+
+    if args.devices_json:
+        devices, arp_rows = load_merged_devices(args.devices_json, overrides), []
+
+    if args.discovery_only:
+        # Presence refresh only: change events, baselines and alerts come from
+        # full scans; the SPA keeps showing the last full scan's diff.
+        fresh = False
+        events, anomalies = [], []
+        prev = read_json(prev_path, {})
+        diff = (prev.get('diff') if isinstance(prev, dict) else None) or diff_from_events([])
+        new_ids = diff.get('new_ids', [])
+        gone_ids = diff.get('gone_ids', [])
+    else:
+        # Typed change events (new/gone/returned/IP/ports/...) from the device tracker
+        tracker = load_tracker(state)
+        if not tracker['devices']:
+            # first run with a tracker: seed from the history window, so
+            # devices absent from the last scan come back as "returned"
+            seeds = list(iter_snapshots(state, [t for t in list_snapshots(state) if t < ts][-history_snapshots:]))
+            prev = read_json(prev_path, {})
+            last_ts = seeds[-1].get('timestamp_utc', '') if seeds else ''
+            if isinstance(prev, dict) and last_ts < prev.get('timestamp_utc', '') < ts:
+                seeds.append(prev)   # latest.json from a discovery cycle after the last full scan
+            seed_history(tracker, seeds, gone_after)
+        # Alert only on scans newer than a known baseline (not the very first scan or a re-render)
+        fresh = bool(tracker.get('lastTs')) and ts > tracker['lastTs']
+        events = detect_changes(tracker, ts, devices, claims=[(r['ip'], r['mac']) for r in arp_rows],
+                                gone_after=gone_after)
+        save_tracker(state, tracker)
+        diff = diff_from_events(events)
+        new_ids = diff['new_ids']
+        gone_ids = diff['gone_ids']
+
+        # Deviations from each device's learned baseline (hours, IP, ports)
+        model = load_anomaly_model(state)
+        anomalies = update_anomalies(model, ts, devices)
+        save_anomaly_model(state, model)
+        by_dev = {}
+        for a in anomalies:
+            by_dev.setdefault(a['id'], []).append({k: a[k] for k in ('anomaly', 'detail', 'score', 'port')})
+        for d in devices:
+            if d.get('id') in by_dev:
+                d['anomalies'] = by_dev[d['id']]
 
     snapshot = {
         'timestamp_utc': ts,
@@ -355,26 +640,23 @@ def main():
         'host_ip': args.host_ip,
         'subnet': args.subnet,
         'devices': devices,
-        'diff': {'new_ids': new_ids, 'gone_ids': gone_ids},
+        'diff': diff,
     }
+    if args.discovery_only:
+        snapshot['mode'] = 'discovery'
+    else:
+        write_snapshot(state, snapshot)
+    atomic_write_json(prev_path, snapshot, indent=2)
 
-    with open(os.path.join(state, f'{ts}.json'), 'w') as f:
-        json.dump(snapshot, f, indent=2)
-    with open(prev_path, 'w') as f:
-        json.dump(snapshot, f, indent=2)
-
-    # History for timeline (up to last 72 timestamped snapshots)
-    snap_paths = sorted([
-        p for p in glob.glob(os.path.join(state, '*.json'))
-        if re.search(r'/\d{8}T\d{6}Z\.json$', p)
-    ])[-72:]
-    history = []
-    for p in snap_paths:
-        try:
-            with open(p, 'r') as f:
-                history.append(json.load(f))
-        except Exception:
-            pass
+    # Queue alert events for alert.py; delivery happens out of band
+    if fresh and alerts_enabled(load_alert_config(state)):
+        enqueue_events(state, events + anomalies)
+
+    # History for timeline (up to last NW_HISTORY_SNAPSHOTS timestamped snapshots)
+    history = load_last_snapshots(state, history_snapshots)
+    if args.discovery_only:
+        # Not kept in state/: the sweep shows up as the newest column until the next one
+        history = history[-(history_snapshots - 1):] + [snapshot] if history_snapshots > 1 else [snapshot]
 
     timeline_utc = [h.get('timestamp_utc', '') for h in history]
     counts = [len(h.get('devices', [])) for h in history]
@@ -443,127 +725,144 @@ def main():
         suffix = mac or did
         return f"{primary} ({suffix})" if primary != suffix else primary
 
-    new_html = "<br>".join(esc(label_for_id(x)) for x in new_ids) if new_ids else "(none)"
-    gone_html = "<br>".join(esc(label_for_id(x)) for x in gone_ids) if gone_ids else "(none)"
-
-    # Group counts by type
-    by_type = {}
-    for d in devices:
-        by_type.setdefault(d['type'], 0)
-        by_type[d['type']] += 1
-    type_summary = ', '.join(f"{k}:{v}" for k, v in sorted(by_type.items(), key=lambda kv: (-kv[1], kv[0])))
-
-    # Index table
-    rows_html = []
-    for d in sorted(devices, key=lambda x: (0 if x.get('name') else 1, x.get('type', ''), ip_key(x['ip']))):
-        ports = d['open_ports']
-        port_lines = "<br>".join(esc(p['raw']) for p in ports) if ports else ""
-        flags = ", ".join(esc(x) for x in d['risk_flags'])
-
-        web_items = d.get('web') or []
-        web_lines = []
-        for w in sorted(web_items, key=lambda x: (x.get('port', 0), x.get('url', ''))):
-            s = w.get('status')
-            title = (w.get('title') or '').strip()
-            server = (w.get('server') or '').strip()
-            url = w.get('url')
-            robots = (w.get('robots_txt') or '').strip()
-            security = (w.get('security_txt') or '').strip()
-            tls_sum = (w.get('tls') or {}).get('summary') if isinstance(w.get('tls'), dict) else None
-
-            parts = []
-            if url:
-                parts.append(url)
-            if s:
-                parts.append(f"HTTP {s}")
-            if title:
-                parts.append(f"title=\"{title[:80]}\"")
-            if server:
-                parts.append(f"server=\"{server[:60]}\"")
-
-            extra = []
-            if robots:
-                extra.append('robots.txt')
-            if security:
-                extra.append('security.txt')
-            if tls_sum:
-                extra.append('tls')
-
-            line = " • ".join(parts)
-            if extra:
-                line += " • [" + ", ".join(extra) + "]"
-            web_lines.append(line)
-        web_html = "<br>".join(esc(x) for x in web_lines)
-
-        display = d.get('name') or d.get('vendor') or ''
-        host = d.get('hostname')
-        mdns_list = d.get('mdns') or []
-        mdns_s = mdns_list[0] if mdns_list else ''
-        if mdns_s and mdns_s != host:
-            host = mdns_s
-        if host:
-            display = f"{display} ({host})" if display else host
-
-        device_link = f"/device.html?id={esc(d['id'])}"
-
-        rows_html.append(
-            f"<tr>"
-            f"<td><b><a href=\"{device_link}\">{esc(display)}</a></b><div class='muted'>{esc(d.get('type',''))}</div></td>"
-            f"<td>{esc(d['ip'])}</td>"
-            f"<td>{esc(d['mac'])}</td>"
-            f"<td>{esc(d['vendor'])}</td>"
-            f"<td>{'yes' if d['seen_arp'] else ''}</td>"
-            f"<td>{'yes' if d['seen_alive'] else ''}</td>"
-            f"<td style='max-width:650px; word-break:break-word'>{port_lines}</td>"
-            f"<td style='max-width:650px; word-break:break-word'>{web_html}</td>"
-            f"<td>{flags}</td>"
-            f"</tr>"
-        )
+    # Timeline: last up to NW_TIMELINE_SNAPSHOTS snapshots
+    N = min(len(history), timeline_snapshots)
+    start_idx = max(0, len(history) - N)
 
-    # If app-only mode: we already wrote the JSON artifacts above, so we can skip
-    # generating legacy HTML pages and just ensure / redirects to /app/.
-    if app_only:
-        index_out = """<!doctype html>
-<html>
-<head>
-  <meta charset=\"utf-8\" />
-  <meta name=\"viewport\" content=\"width=device-width, initial-scale=1\" />
-  <meta http-equiv=\"refresh\" content=\"0; url=/app/\" />
-  <title>Network Watch</title>
-</head>
-<body>
-  <p>Redirecting to <a href=\"/app/\">/app/</a>…</p>
-</body>
-</html>
-"""
-        with open(os.path.join(site, 'index.html'), 'w') as f:
-            f.write(index_out)
-        return
+    # --- Churn stats (exported as device_stats.json for the app) ---
+    churn_rows = []
+    device_stats = {}
+    total_hours = len(history)
 
-    # Timeline: last up to 48 snapshots
-    N = min(len(history), 48)
-    start_idx = max(0, len(history) - N)
+    metrics = device_metrics(did_order, presence, ip_hist, timeline_utc)
 
-    heatmap_rows = []
     for did in did_order:
-        bits = presence[did][start_idx:]
-        cells = []
-        for j, on in enumerate(bits):
-            utc = timeline_utc[start_idx + j]
-            title = f"{label_for_id(did)} @ {utc}" if utc else label_for_id(did)
-            cls = "cell on" if on else "cell off"
-            cells.append(f"<div class='{cls}' title='{esc(title)}'></div>")
+        if not presence.get(did):
+            continue
+        mx = metrics[did]
+        flaps = mx['flaps']
+        unique_ips = mx['uniqueIps']
+        seen = mx['seen']
         m = meta.get(did, {})
         display = (m.get('name') or m.get('vendor') or did)
-        sub = m.get('mac') or did
-        heatmap_rows.append(
-            f"<div class='row'>"
-            f"<div class='id'><div class='primary'>{esc(display)}</div><div class='meta'>{esc(sub)} • type {esc(m.get('type',''))} • last IP {esc(m.get('last_ip',''))}</div></div>"
-            f"<div class='cells'>{''.join(cells)}</div>"
-            f"</div>"
-        )
 
-    timeline_html = f"""<!doctype html>
+        device_stats[did] = {
+            'id': did,
+            'display': display,
+            'mac': m.get('mac', ''),
+            'type': m.get('type', ''),
+            'vendor': m.get('vendor', ''),
+            'hostname': m.get('hostname', ''),
+            'flaps': flaps,
+            'uniqueIps': unique_ips,
+            'seenHours': seen,
+            'totalHours': total_hours,
+            'uptime': mx['uptime'],
+            'availability': mx['availability'],
+            'firstSeen': mx['firstSeen'],
+            'lastSeen': mx['lastSeen'],
+        }
+
+        churn_rows.append((flaps, unique_ips, -seen, display, did, m))
+
+    # Write device stats for the SPA
+    try:
+        atomic_write_json(os.path.join(site, 'device_stats.json'), {'generatedAt': ts, 'window': N, 'devices': device_stats})
+    except Exception:
+        pass
+
+    # Bit-packed presence + run-length IP lanes for the same window (see presence_pack.py)
+    try:
+        window_presence = {did: presence[did][start_idx:] for did in did_order}
+        window_ips = {did: (ip_hist.get(did) or [])[start_idx:] for did in did_order}
+        atomic_write_json(os.path.join(site, 'presence.json'),
+                          encode_presence(timeline_utc[start_idx:], did_order, window_presence, window_ips))
+    except Exception:
+        pass
+
+    # Copy latest snapshot into site so the static server can serve it
+    try:
+        with open(os.path.join(state, 'latest.json'), 'r') as f:
+            latest_blob = f.read()
+        atomic_write_text(os.path.join(site, 'latest.json'), latest_blob)
+    except Exception:
+        pass
+
+    # Build a compact history.json (timeline window) for app charts
+    try:
+        window = history[start_idx:]
+        totals = snapshot_totals(window)
+        # use UTC for chart labels to avoid TZ surprises
+        t = [h.get('timestamp_utc', '')[-7:-1] if h.get('timestamp_utc') else '' for h in window]
+
+        atomic_write_json(os.path.join(site, 'history.json'), {
+            't': t,
+            'devices': totals['devices'],
+            'openPorts': totals['openPorts'],
+            'risks': totals['risks'],
+        })
+    except Exception:
+        pass
+
+    # Fold snapshots newer than the last rollup into the raw/hourly/daily/weekly
+    # series; charts for long ranges read site/history/<resolution>.json.
+    if not args.discovery_only:
+        try:
+            rollups = load_rollups(state)
+            new_snaps = [h for h in history if h.get('timestamp_utc', '') > rollups.get('lastTs', '')]
+            if new_snaps:
+                new_totals = snapshot_totals(new_snaps)
+                for i, h in enumerate(new_snaps):
+                    add_sample(rollups, h['timestamp_utc'], {m: new_totals[m][i] for m in ROLLUP_METRICS})
+                save_rollups(state, rollups)
+            write_site_series(site, rollups)
+        except Exception:
+            pass
+
+    report(hosts=len(devices), snapshots=len(history), events=len(events), anomalies=len(anomalies))
+    if args.discovery_only:
+        return
+
+    # If app-only mode: the JSON artifacts are written above, so skip the
+    # legacy HTML pages and just ensure / redirects to /app/.
+    if app_only:
+        atomic_write_text(os.path.join(site, 'index.html'), APP_REDIRECT_HTML)
+        return
+
+    # Legacy HTML pages are rebuilt only when their inputs change.
+    render_cache = load_render_cache(state)
+
+    timeline_inputs = {
+        'N': N,
+        'utc': timeline_utc[start_idx:],
+        'counts': counts[start_idx:],
+        'rows': [
+            [did, label_for_id(did), meta.get(did, {}), presence[did][start_idx:]]
+            for did in did_order
+        ],
+    }
+
+    def build_timeline():
+        heatmap_rows = []
+        for did in did_order:
+            bits = presence[did][start_idx:]
+            cells = []
+            for j, on in enumerate(bits):
+                utc = timeline_utc[start_idx + j]
+                title = f"{label_for_id(did)} @ {utc}" if utc else label_for_id(did)
+                cls = "cell on" if on else "cell off"
+                cells.append(f"<div class='{cls}' title='{esc(title)}'></div>")
+            m = meta.get(did, {})
+            display = (m.get('name') or m.get('vendor') or did)
+            sub = m.get('mac') or did
+            heatmap_rows.append(
+                f"<div class='row'>"
+                f"<div class='id'><div class='primary'>{esc(display)}</div><div class='meta'>{esc(sub)} • type {esc(m.get('type',''))} • last IP {esc(m.get('last_ip',''))}</div></div>"
+                f"<div class='cells'>{''.join(cells)}</div>"
+                f"</div>"
+            )
+
+        return f"""<!doctype html>
 <html>
 <head>
   <meta charset="utf-8" />
@@ -586,7 +885,7 @@ def main():
 </head>
 <body>
   <h1>Network Watch — Timeline</h1>
-  <p class="muted">Updated: <code>{esc(args.timestamp_human)}</code> • Showing last <code>{N}</code> hourly snapshots • keyed by MAC when available</p>
+  <p class="muted">Updated: <code>{esc(args.timestamp_human)}</code> • Showing last <code>{N}</code> snapshots • keyed by MAC when available</p>
   <p><a href="/">← Back to latest</a> · <a href="/ip-history.html">IP history</a> · <a href="/churn.html">Churn</a> · <a href="/graph.html">Device↔Port graph</a></p>
 
   <h2>Device count over time (last {N} snapshots)</h2>
@@ -594,14 +893,13 @@ def main():
   <div class="legend"><span><b>min</b>: {min(counts[start_idx:]) if counts[start_idx:] else ''}</span><span><b>max</b>: {max(counts[start_idx:]) if counts[start_idx:] else ''}</span></div>
 
   <h2>Per-device presence heatmap</h2>
-  <p class="muted">Each square is one hour. Blue = seen on LAN. Hover a square to see the timestamp (UTC).</p>
+  <p class="muted">Each square is one snapshot. Blue = seen on LAN. Hover a square to see the timestamp (UTC).</p>
   {''.join(heatmap_rows) if heatmap_rows else '<p class="muted">Not enough data yet.</p>'}
 </body>
 </html>
 """
 
-    with open(os.path.join(site, 'timeline.html'), 'w') as f:
-        f.write(timeline_html)
+    render_page(site, render_cache, 'timeline.html', timeline_inputs, build_timeline)
 
     # --- IP History page ---
     def ip_color(ip):
@@ -616,28 +914,38 @@ def main():
         b = 180 + ((h >> 12) & 0x3F)
         return f"rgb({r},{g},{b})"
 
-    ip_rows = []
-    for did in did_order:
-        m = meta.get(did, {})
-        display = (m.get('name') or m.get('vendor') or did)
-        mac = (m.get('mac') or did)
-        bits = presence[did][start_idx:]
-        ips = (ip_hist.get(did) or [''] * len(history))[start_idx:]
-        cells = []
-        for j, on in enumerate(bits):
-            ip = ips[j] if on else ''
-            title = f"{display} @ {timeline_utc[start_idx+j]} ip={ip}".strip()
-            bg = ip_color(ip)
-            txt = ip.split('.')[-1] if ip else ''
-            cells.append(f"<div class='cell' style='background:{bg}' title='{esc(title)}'>{esc(txt)}</div>")
-        ip_rows.append(
-            f"<div class='row'>"
-            f"<div class='id'><div class='primary'>{esc(display)}</div><div class='meta'>{esc(mac)} • type {esc(m.get('type',''))}</div></div>"
-            f"<div class='cells'>{''.join(cells)}</div>"
-            f"</div>"
-        )
+    ip_history_inputs = {
+        'N': N,
+        'utc': timeline_utc[start_idx:],
+        'rows': [
+            [did, meta.get(did, {}), presence[did][start_idx:], (ip_hist.get(did) or [''] * len(history))[start_idx:]]
+            for did in did_order
+        ],
+    }
 
-    ip_history_html = f"""<!doctype html>
+    def build_ip_history():
+        ip_rows = []
+        for did in did_order:
+            m = meta.get(did, {})
+            display = (m.get('name') or m.get('vendor') or did)
+            mac = (m.get('mac') or did)
+            bits = presence[did][start_idx:]
+            ips = (ip_hist.get(did) or [''] * len(history))[start_idx:]
+            cells = []
+            for j, on in enumerate(bits):
+                ip = ips[j] if on else ''
+                title = f"{display} @ {timeline_utc[start_idx+j]} ip={ip}".strip()
+                bg = ip_color(ip)
+                txt = ip.split('.')[-1] if ip else ''
+                cells.append(f"<div class='cell' style='background:{bg}' title='{esc(title)}'>{esc(txt)}</div>")
+            ip_rows.append(
+                f"<div class='row'>"
+                f"<div class='id'><div class='primary'>{esc(display)}</div><div class='meta'>{esc(mac)} • type {esc(m.get('type',''))}</div></div>"
+                f"<div class='cells'>{''.join(cells)}</div>"
+                f"</div>"
+            )
+
+        return f"""<!doctype html>
 <html>
 <head>
   <meta charset="utf-8" />
@@ -657,7 +965,7 @@ def main():
 </head>
 <body>
   <h1>Network Watch — IP History</h1>
-  <p class="muted">Updated: <code>{esc(args.timestamp_human)}</code> • Showing last <code>{N}</code> hourly snapshots (cell text is last octet)</p>
+  <p class="muted">Updated: <code>{esc(args.timestamp_human)}</code> • Showing last <code>{N}</code> snapshots (cell text is last octet)</p>
   <p><a href="/">← Back to latest</a> · <a href="/timeline.html">Timeline</a> · <a href="/churn.html">Churn</a> · <a href="/graph.html">Device↔Port graph</a></p>
 
   {''.join(ip_rows) if ip_rows else '<p class="muted">Not enough data yet.</p>'}
@@ -665,64 +973,23 @@ def main():
 </html>
 """
 
-    with open(os.path.join(site, 'ip-history.html'), 'w') as f:
-        f.write(ip_history_html)
-
-    # --- Churn page + export device_stats.json for the app ---
-    churn_rows = []
-    device_stats = {}
-    total_hours = len(history)
-
-    for did in did_order:
-        pres = presence.get(did, [])
-        if not pres:
-            continue
-        # flaps = count transitions
-        flaps = 0
-        for i in range(1, len(pres)):
-            if pres[i] != pres[i-1]:
-                flaps += 1
-        ips_all = (ip_hist.get(did) or [])
-        ips = [x for x in ips_all if x]
-        unique_ips = len(set(ips))
-        seen = sum(1 for x in pres if x)
-        m = meta.get(did, {})
-        display = (m.get('name') or m.get('vendor') or did)
-
-        # last N IPs aligned to history window
-        ip_tail = ips_all[start_idx:] if ips_all else []
-
-        device_stats[did] = {
-            'id': did,
-            'display': display,
-            'mac': m.get('mac', ''),
-            'type': m.get('type', ''),
-            'vendor': m.get('vendor', ''),
-            'hostname': m.get('hostname', ''),
-            'flaps': flaps,
-            'uniqueIps': unique_ips,
-            'seenHours': seen,
-            'totalHours': total_hours,
-            'ipTail': ip_tail,
-        }
-
-        churn_rows.append((flaps, unique_ips, -seen, display, did, m))
-
-    # Write device stats for the SPA
-    try:
-        with open(os.path.join(site, 'device_stats.json'), 'w') as f:
-            json.dump({'generatedAt': ts, 'window': N, 'devices': device_stats}, f)
-    except Exception:
-        pass
+    render_page(site, render_cache, 'ip-history.html', ip_history_inputs, build_ip_history)
 
+    # --- Churn page ---
     churn_rows.sort(reverse=True)
-    churn_html_rows = []
-    for flaps, uips, _seen_neg, display, did, m in churn_rows[:100]:
-        churn_html_rows.append(
-            f"<tr><td><a href='/device.html?id={esc(did)}'>{esc(display)}</a></td><td>{esc(m.get('type',''))}</td><td><code>{esc(m.get('mac',did))}</code></td><td>{flaps}</td><td>{uips}</td><td>{sum(presence.get(did, []))}/{len(history)}</td></tr>"
-        )
-
-    churn_page = f"""<!doctype html>
+    churn_top = [
+        [flaps, uips, display, did, m.get('type', ''), m.get('mac', did), sum(presence.get(did, []))]
+        for flaps, uips, _seen_neg, display, did, m in churn_rows[:100]
+    ]
+
+    def build_churn():
+        churn_html_rows = []
+        for flaps, uips, display, did, dtype, mac, seen in churn_top:
+            churn_html_rows.append(
+                f"<tr><td><a href='/device.html?id={esc(did)}'>{esc(display)}</a></td><td>{esc(dtype)}</td><td><code>{esc(mac)}</code></td><td>{flaps}</td><td>{uips}</td><td>{seen}/{len(history)}</td></tr>"
+            )
+
+        return f"""<!doctype html>
 <html>
 <head>
   <meta charset="utf-8" />
@@ -744,15 +1011,14 @@ def main():
   <p><a href="/">← Back to latest</a> · <a href="/timeline.html">Timeline</a> · <a href="/ip-history.html">IP history</a> · <a href="/graph.html">Device↔Port graph</a></p>
 
   <table>
-    <thead><tr><th>Device</th><th>Type</th><th>MAC</th><th>Flaps</th><th>Unique IPs</th><th>Seen (hours)</th></tr></thead>
+    <thead><tr><th>Device</th><th>Type</th><th>MAC</th><th>Flaps</th><th>Unique IPs</th><th>Seen (snapshots)</th></tr></thead>
     <tbody>{''.join(churn_html_rows)}</tbody>
   </table>
 </body>
 </html>
 """
 
-    with open(os.path.join(site, 'churn.html'), 'w') as f:
-        f.write(churn_page)
+    render_page(site, render_cache, 'churn.html', {'total': len(history), 'rows': churn_top}, build_churn)
 
     # --- Graph page (port-centric) ---
     # Compute port -> devices (from latest snapshot only)
@@ -766,13 +1032,15 @@ def main():
             port_map.setdefault(port, []).append((label, d.get('id'), d.get('ip')))
 
     # Sort ports by fanout
-    ports_sorted = sorted(port_map.items(), key=lambda kv: (-len(kv[1]), kv[0]))
-    port_sections = []
-    for port, devs in ports_sorted[:50]:
-        items = ''.join([f"<li><a href='/device.html?id={esc(did)}'>{esc(lbl)}</a> <span class='muted'>@ {esc(ip)}</span></li>" for lbl, did, ip in sorted(devs)])
-        port_sections.append(f"<h3>{esc(port)} <span class='muted'>({len(devs)} devices)</span></h3><ul>{items}</ul>")
+    ports_sorted = sorted(port_map.items(), key=lambda kv: (-len(kv[1]), kv[0]))[:50]
 
-    graph_page = f"""<!doctype html>
+    def build_graph():
+        port_sections = []
+        for port, devs in ports_sorted:
+            items = ''.join([f"<li><a href='/device.html?id={esc(did)}'>{esc(lbl)}</a> <span class='muted'>@ {esc(ip)}</span></li>" for lbl, did, ip in sorted(devs)])
+            port_sections.append(f"<h3>{esc(port)} <span class='muted'>({len(devs)} devices)</span></h3><ul>{items}</ul>")
+
+        return f"""<!doctype html>
 <html>
 <head>
   <meta charset="utf-8" />
@@ -796,136 +1064,105 @@ def main():
 </html>
 """
 
-    if not app_only:
-        with open(os.path.join(site, 'graph.html'), 'w') as f:
-            f.write(graph_page)
-
-    # Copy latest snapshot into site so the static server can serve it
-    try:
-        with open(os.path.join(state, 'latest.json'), 'r') as f:
-            latest_blob = f.read()
-        with open(os.path.join(site, 'latest.json'), 'w') as f:
-            f.write(latest_blob)
-    except Exception:
-        pass
-
-    # Build a compact history.json (last up to 48 snapshots) for app charts
-    try:
-        t = []
-        devices_s = []
-        open_ports_s = []
-        risks_s = []
-
-        for h in history[-48:]:
-            # use UTC for chart labels to avoid TZ surprises
-            t.append(h.get('timestamp_utc', '')[-7:-1] if h.get('timestamp_utc') else '')
-            ds = h.get('devices', []) or []
-            devices_s.append(len(ds))
-            op = 0
-            rk = 0
-            for d in ds:
-                op += len(d.get('open_ports') or [])
-                rk += len(d.get('risk_flags') or [])
-            open_ports_s.append(op)
-            risks_s.append(rk)
-
-        with open(os.path.join(site, 'history.json'), 'w') as f:
-            json.dump({
-                't': t,
-                'devices': devices_s,
-                'openPorts': open_ports_s,
-                'risks': risks_s,
-            }, f)
-    except Exception:
-        pass
-
-    if not app_only:
-        # Device detail page (client-side render from latest.json)
-        device_html = """<!doctype html>
-<html>
-<head>
-  <meta charset=\"utf-8\" />
-  <meta name=\"viewport\" content=\"width=device-width, initial-scale=1\" />
-  <title>Network Watch — Device</title>
-  <style>
-    body { font-family: ui-sans-serif, system-ui, -apple-system, Segoe UI, Roboto, Helvetica, Arial; margin: 24px; }
-    code { background: #f6f6f6; padding: 2px 6px; border-radius: 6px; }
-    a { color: #0b57d0; }
-    .muted { color: #666; }
-    pre { background: #f6f6f6; padding: 12px; border-radius: 8px; overflow-x: auto; }
-  </style>
-</head>
-<body>
-  <p><a href=\"/\">← Back</a> · <a href=\"/timeline.html\">Timeline</a> · <a href=\"/ip-history.html\">IP history</a> · <a href=\"/churn.html\">Churn</a> · <a href=\"/graph.html\">Device↔Port graph</a></p>
-  <h1 id=\"title\">Device</h1>
-  <div id=\"content\" class=\"muted\">Loading…</div>
+    render_page(site, render_cache, 'graph.html', ports_sorted, build_graph)
 
-<script>
-(async function(){
-  const params = new URLSearchParams(location.search);
-  const id = params.get('id');
-  const resp = await fetch('/latest.json', {cache:'no-store'}).catch(()=>null);
-  if(!resp){ document.getElementById('content').innerText = 'Failed to load latest.json'; return; }
-  const data = await resp.json();
-  const dev = (data.devices||[]).find(d => d.id === id);
-  if(!dev){ document.getElementById('content').innerText = 'Device not found in latest snapshot.'; return; }
+    # Device detail page (client-side render from latest.json); static.
+    render_page(site, render_cache, 'device.html', None, lambda: DEVICE_HTML)
 
-  const title = (dev.name || dev.vendor || dev.id) + ' — ' + (dev.ip || '');
-  document.getElementById('title').innerText = title;
+    # --- Index page ---
+    new_labels = [label_for_id(x) for x in new_ids]
+    gone_labels = [label_for_id(x) for x in gone_ids]
 
-  const lines = [];
-  lines.push('Type: ' + (dev.type||''));
-  lines.push('IP: ' + (dev.ip||''));
-  lines.push('MAC: ' + (dev.mac||''));
-  lines.push('Vendor: ' + (dev.vendor||''));
-  if(dev.hostname) lines.push('Hostname: ' + dev.hostname);
-  if((dev.mdns||[]).length) lines.push('mDNS hostnames: ' + dev.mdns.join(', '));
-  if((dev.mdns_services||[]).length) lines.push('mDNS services: ' + dev.mdns_services.join(', '));
-  if((dev.ssdp||[]).length) {
-    lines.push('SSDP/UPnP:');
-    (dev.ssdp||[]).slice(0,8).forEach(s => {
-      lines.push('  - ' + (s.st||'') + ' | ' + (s.server||'') + ' | ' + (s.location||''));
-    });
-  }
-  lines.push('');
-  lines.push('Open ports:');
-  (dev.open_ports||[]).forEach(p => lines.push('  - ' + p.raw));
-  lines.push('');
-  lines.push('Web probe:');
-  (dev.web||[]).forEach(w => {
-    lines.push('  - ' + (w.url||'') + ' status=' + (w.status||'') + ' server=' + (w.server||'') + ' title=' + (w.title||''));
-  });
-  lines.push('');
-  lines.push('Risk flags: ' + (dev.risk_flags||[]).join(', '));
-
-  document.getElementById('content').innerHTML = '<pre>' + lines.join('\\n').replace(/[&<>]/g, c=>({"&":"&amp;","<":"&lt;",">":"&gt;"}[c])) + '</pre>';
-})();
-</script>
-</body>
-</html>
-"""
+    # Group counts by type
+    by_type = {}
+    for d in devices:
+        by_type.setdefault(d['type'], 0)
+        by_type[d['type']] += 1
+    type_summary = ', '.join(f"{k}:{v}" for k, v in sorted(by_type.items(), key=lambda kv: (-kv[1], kv[0])))
 
-        with open(os.path.join(site, 'device.html'), 'w') as f:
-            f.write(device_html)
+    index_devices = sorted(devices, key=lambda x: (0 if x.get('name') else 1, x.get('type', ''), ip_key(x['ip'])))
+    index_inputs = {
+        'ts': ts,
+        'host_ip': args.host_ip,
+        'subnet': args.subnet,
+        'new': new_labels,
+        'gone': gone_labels,
+        'devices': index_devices,
+        'gone_after': gone_after,
+    }
 
-    if app_only:
-        # Minimal index for app-only deployments
-        index_out = """<!doctype html>
-<html>
-<head>
-  <meta charset=\"utf-8\" />
-  <meta name=\"viewport\" content=\"width=device-width, initial-scale=1\" />
-  <meta http-equiv=\"refresh\" content=\"0; url=/app/\" />
-  <title>Network Watch</title>
-  <style>body{font-family:ui-sans-serif,system-ui,-apple-system,Segoe UI,Roboto,Helvetica,Arial;margin:24px}</style>
-</head>
-<body>
-  <p>Redirecting to <a href=\"/app/\">/app/</a>…</p>
-</body>
-</html>
-"""
-    else:
-        index_out = f"""<!doctype html>
+    def build_index():
+        new_html = "<br>".join(esc(x) for x in new_labels) if new_labels else "(none)"
+        gone_html = "<br>".join(esc(x) for x in gone_labels) if gone_labels else "(none)"
+
+        # Index table
+        rows_html = []
+        for d in index_devices:
+            ports = d['open_ports']
+            port_lines = "<br>".join(esc(p['raw']) for p in ports) if ports else ""
+            flags = ", ".join(esc(x) for x in d['risk_flags'])
+
+            web_items = d.get('web') or []
+            web_lines = []
+            for w in sorted(web_items, key=lambda x: (x.get('port', 0), x.get('url', ''))):
+                s = w.get('status')
+                title = (w.get('title') or '').strip()
+                server = (w.get('server') or '').strip()
+                url = w.get('url')
+                robots = (w.get('robots_txt') or '').strip()
+                security = (w.get('security_txt') or '').strip()
+                tls_sum = (w.get('tls') or {}).get('summary') if isinstance(w.get('tls'), dict) else None
+
+                parts = []
+                if url:
+                    parts.append(url)
+                if s:
+                    parts.append(f"HTTP {s}")
+                if title:
+                    parts.append(f"title=\"{title[:80]}\"")
+                if server:
+                    parts.append(f"server=\"{server[:60]}\"")
+
+                extra = []
+                if robots:
+                    extra.append('robots.txt')
+                if security:
+                    extra.append('security.txt')
+                if tls_sum:
+                    extra.append('tls')
+
+                line = " • ".join(parts)
+                if extra:
+                    line += " • [" + ", ".join(extra) + "]"
+                web_lines.append(line)
+            web_html = "<br>".join(esc(x) for x in web_lines)
+
+            display = d.get('name') or d.get('vendor') or ''
+            host = d.get('hostname')
+            mdns_list = d.get('mdns') or []
+            mdns_s = mdns_list[0] if mdns_list else ''
+            if mdns_s and mdns_s != host:
+                host = mdns_s
+            if host:
+                display = f"{display} ({host})" if display else host
+
+            device_link = f"/device.html?id={esc(d['id'])}"
+
+            rows_html.append(
+                f"<tr>"
+                f"<td><b><a href=\"{device_link}\">{esc(display)}</a></b><div class='muted'>{esc(d.get('type',''))}</div></td>"
+                f"<td>{esc(d['ip'])}</td>"
+                f"<td>{esc(d['mac'])}</td>"
+                f"<td>{esc(d['vendor'])}</td>"
+                f"<td>{'yes' if d['seen_arp'] else ''}</td>"
+                f"<td>{'yes' if d['seen_alive'] else ''}</td>"
+                f"<td style='max-width:650px; word-break:break-word'>{port_lines}</td>"
+                f"<td style='max-width:650px; word-break:break-word'>{web_html}</td>"
+                f"<td>{flags}</td>"
+                f"</tr>"
+            )
+
+        return f"""<!doctype html>
 <html>
 <head>
   <meta charset="utf-8" />
@@ -959,10 +1196,10 @@ def main():
   <ul>
     <li><strong>Devices:</strong> {len(devices)}</li>
     <li><strong>Types:</strong> {esc(type_summary)}</li>
-    <li><strong>Note:</strong> Gone devices are debounced (must be missing 2 consecutive hours).</li>
+    <li><strong>Note:</strong> Gone devices are debounced (must be missing {gone_after} consecutive scans).</li>
   </ul>
 
-  <h2>Changes since previous hour (by device id)</h2>
+  <h2>Changes since previous scan (by device id)</h2>
   <ul>
     <li><strong>New:</strong><br>{new_html}</li>
     <li><strong>Gone:</strong><br>{gone_html}</li>
@@ -986,8 +1223,9 @@ def main():
 </html>
 """
 
-    with open(os.path.join(site, 'index.html'), 'w') as f:
-        f.write(index_out)
+    render_page(site, render_cache, 'index.html', index_inputs, build_index)
+
+    save_render_cache(state, render_cache)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Multi-resolution rollups of the per-snapshot chart series.
+
+state/rollups.json keeps one bucket list per resolution (raw, hourly, daily,
+weekly). Each scan folds its totals into the current bucket of every
+resolution, so charts over a year read ~52-365 points instead of thousands of
+snapshots. The SPA fetches site/history/<resolution>.json for the zoom level.
+"""
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+from fsutil import atomic_write_text
+
+RESOLUTIONS = ('raw', 'hourly', 'daily', 'weekly')
+METRICS = ('devices', 'openPorts', 'risks')
+
+# Buckets kept per resolution (~30 days of hourly raw, 90 days hourly, 3 years daily, 10 years weekly).
+# 'raw' can be overridden with NW_ROLLUP_RAW_POINTS, see retention().
+RETENTION = {
+    'raw': 720,
+    'hourly': 24 * 90,
+    'daily': 366 * 3,
+    'weekly': 52 * 10,
+}
+
+TS_FORMAT = '%Y%m%dT%H%M%SZ'
+
+
+def retention(res):
+    if res == 'raw':
+        try:
+            return max(1, int(os.environ.get('NW_ROLLUP_RAW_POINTS', '') or RETENTION['raw']))
+        except ValueError:
+            return RETENTION['raw']
+    return RETENTION[res]
+
+
+def parse_ts(ts):
+    try:
+        return datetime.strptime(ts, TS_FORMAT).replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return None
+
+
+def bucket_start(ts, res):
+    """Bucket key (a snapshot-style UTC timestamp) for ts at resolution res."""
+    if res == 'raw':
+        return ts
+    dt = parse_ts(ts)
+    if dt is None:
+        return None
+    if res == 'hourly':
+        dt = dt.replace(minute=0, second=0)
+    elif res == 'daily':
+        dt = dt.replace(hour=0, minute=0, second=0)
+    elif res == 'weekly':
+        dt = (dt - timedelta(days=dt.weekday())).replace(hour=0, minute=0, second=0)
+    return dt.strftime(TS_FORMAT)
+
+
+def empty_rollups():
+    return {'version': 1, 'lastTs': '', 'series': {res: [] for res in RESOLUTIONS}}
+
+
+def load_rollups(state_dir):
+    path = os.path.join(state_dir, 'rollups.json')
+    try:
+        with open(path, 'r') as f:
+            obj = json.load(f)
+    except FileNotFoundError:
+        return empty_rollups()
+    except Exception:
+        return empty_rollups()
+    if not isinstance(obj, dict) or obj.get('version') != 1:
+        return empty_rollups()
+    for res in RESOLUTIONS:
+        obj.setdefault('series', {}).setdefault(res, [])
+    return obj
+
+
+def save_rollups(state_dir, rollups):
+    atomic_write_text(os.path.join(state_dir, 'rollups.json'), json.dumps(rollups, separators=(',', ':')))
+
+
+def add_sample(rollups, ts, values):
+    """Fold one snapshot's totals into every resolution.
+
+    Samples at or before rollups['lastTs'] are ignored, so re-rendering the same
+    snapshot (or backfilling from history) never double counts.
+    """
+    if not ts or (rollups.get('lastTs') and ts <= rollups['lastTs']):
+        return False
+    keep = {res: retention(res) for res in RESOLUTIONS}
+    for res in RESOLUTIONS:
+        key = bucket_start(ts, res)
+        if key is None:
+            continue
+        series = rollups['series'][res]
+        if series and series[-1]['t'] == key:
+            b = series[-1]
+            b['n'] += 1
+            for m in METRICS:
+                v = values.get(m, 0)
+                s, lo, hi = b[m]
+                b[m] = [s + v, min(lo, v), max(hi, v)]
+        else:
+            b = {'t': key, 'n': 1}
+            for m in METRICS:
+                v = values.get(m, 0)
+                b[m] = [v, v, v]
+            series.append(b)
+            if len(series) > keep[res]:
+                del series[:len(series) - keep[res]]
+    rollups['lastTs'] = ts
+    return True
+
+
+def export_series(rollups, res):
+    """Chart-ready arrays: per bucket start time, sample count, avg/min/max per metric."""
+    series = rollups['series'].get(res, [])
+    out = {'resolution': res, 't': [b['t'] for b in series], 'n': [b['n'] for b in series]}
+    for m in METRICS:
+        out[m] = [round(b[m][0] / b['n'], 2) for b in series]
+        out[m + 'Min'] = [b[m][1] for b in series]
+        out[m + 'Max'] = [b[m][2] for b in series]
+    return out
+
+
+def write_site_series(site_dir, rollups):
+    out_dir = os.path.join(site_dir, 'history')
+    os.makedirs(out_dir, exist_ok=True)
+    for res in RESOLUTIONS:
+        atomic_write_text(os.path.join(out_dir, f'{res}.json'), json.dumps(export_series(rollups, res), separators=(',', ':')))
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Per-host response-time statistics and the timeouts derived from them.
+
+Every cycle adds RTT samples per IP: nmap's "Host is up (0.0023s latency)"
+and curl's TCP connect time in web_probe.py. They are smoothed across cycles
+the way TCP does it (RFC 6298: SRTT, RTTVAR with alpha 1/8, beta 1/4) and
+kept in state/rtt.json. RTO = SRTT + 4 * RTTVAR then sizes the probes:
+
+    connect timeout = clamp(3 * RTO, NW_RTT_MIN_TIMEOUT, NW_RTT_MAX_TIMEOUT)
+    total timeout   = connect + max(read_base, read_rtts * RTO), at most 2x the default
+
+so a wired host on a closed port fails in half a second while a dozing
+Wi-Fi device gets seconds. Hosts without samples keep the fixed defaults.
+For nmap (one run for all hosts) the slowest alive host scales
+--host-timeout and the median one sets --initial-rtt-timeout.
+
+    python3 rtt_stats.py nmap-args --state S --hosts alive.txt --host-timeout 30
+    python3 rtt_stats.py record-nmap --state S --nmap top100.txt
+"""
+import argparse
+import os
+import re
+import time
+
+from fsutil import atomic_write_json, read_json
+
+VERSION = 1
+ALPHA = 1 / 8
+BETA = 1 / 4
+CONNECT_RTOS = 3
+FORGET_AFTER_S = 14 * 86400
+HOST_TIMEOUT_REF_RTO = 0.5   # RTO the default nmap --host-timeout is sized for
+NMAP_T4_MAX_RTT = 1.25
+LATENCY_RE = re.compile(r'^Host is up \(([\d.]+)s latency\)')
+
+
+def env_seconds(name, default):
+    try:
+        value = float(os.environ.get(name, '') or default)
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+def load(state_dir):
+    obj = read_json(os.path.join(state_dir, 'rtt.json'), {}) if state_dir else {}
+    if isinstance(obj, dict) and obj.get('version') == VERSION and isinstance(obj.get('hosts'), dict):
+        return obj['hosts']
+    return {}
+
+
+def save(state_dir, hosts, now):
+    hosts = {ip: e for ip, e in hosts.items() if now - e.get('ts', 0) < FORGET_AFTER_S}
+    atomic_write_json(os.path.join(state_dir, 'rtt.json'), {'version': VERSION, 'hosts': hosts},
+                      indent=2, sort_keys=True)
+
+
+def update(hosts, ip, rtt, now):
+    """Fold one RTT sample (seconds) into ip's SRTT/RTTVAR."""
+    if rtt is None or rtt <= 0:
+        return
+    e = hosts.get(ip)
+    if not e:
+        hosts[ip] = {'srtt': rtt, 'rttvar': rtt / 2, 'samples': 1, 'ts': int(now)}
+        return
+    e['rttvar'] = (1 - BETA) * e['rttvar'] + BETA * abs(e['srtt'] - rtt)
+    e['srtt'] = (1 - ALPHA) * e['srtt'] + ALPHA * rtt
+    e['samples'] = e.get('samples', 0) + 1
+    e['ts'] = int(now)
+
+
+def rto(entry):
+    return entry['srtt'] + 4 * entry['rttvar']
+
+
+def clamp(value, lo, hi):
+    return max(lo, min(hi, value))
+
+
+def timeouts(hosts, ip, default_connect, default_total, read_base, read_rtts=8):
+    """(connect, total) seconds for a request to ip; the defaults without samples."""
+    e = hosts.get(ip)
+    if not e:
+        return default_connect, default_total
+    r = rto(e)
+    connect = clamp(CONNECT_RTOS * r, env_seconds('NW_RTT_MIN_TIMEOUT', 0.5), env_seconds('NW_RTT_MAX_TIMEOUT', 10.0))
+    total = clamp(connect + max(read_base, read_rtts * r), connect, 2 * default_total)
+    return round(connect, 2), round(total, 2)
+
+
+def parse_nmap_latency(nmap_path):
+    out = {}
+    current = None
+    try:
+        with open(nmap_path, 'r', errors='replace') as f:
+            for line in f:
+                if line.startswith('Nmap scan report for '):
+                    current = line.split()[-1]
+                    continue
+                m = LATENCY_RE.match(line)
+                if current and m:
+                    out[current] = float(m.group(1))
+    except OSError:
+        pass
+    return out
+
+
+def nmap_args(hosts, alive, host_timeout):
+    """nmap timing flags for this cycle's alive hosts."""
+    rtos = sorted(rto(hosts[ip]) for ip in alive if ip in hosts)
+    if not rtos:
+        return ['--host-timeout', f'{int(host_timeout)}s']
+    ht = clamp(host_timeout * rtos[-1] / HOST_TIMEOUT_REF_RTO, host_timeout, 4 * host_timeout)
+    args = ['--host-timeout', f'{int(ht)}s',
+            '--initial-rtt-timeout', f'{int(clamp(3 * rtos[len(rtos) // 2], 0.1, 1.0) * 1000)}ms']
+    if 3 * rtos[-1] > NMAP_T4_MAX_RTT:
+        # only ever raise the -T4 ceiling, for the slow hosts' sake
+        args += ['--max-rtt-timeout', f'{int(clamp(3 * rtos[-1], NMAP_T4_MAX_RTT, 10.0) * 1000)}ms']
+    return args
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest='cmd', required=True)
+    a = sub.add_parser('nmap-args', help='print nmap timing flags for the alive hosts')
+    a.add_argument('--state', required=True)
+    a.add_argument('--hosts', required=True, help='file with one IP per line')
+    a.add_argument('--host-timeout', type=float, default=30)
+    r = sub.add_parser('record-nmap', help='fold nmap "Host is up" latencies into state/rtt.json')
+    r.add_argument('--state', required=True)
+    r.add_argument('--nmap', required=True)
+    args = ap.parse_args()
+
+    hosts = load(args.state)
+    if args.cmd == 'nmap-args':
+        try:
+            with open(args.hosts) as f:
+                alive = [line.strip() for line in f if line.strip()]
+        except OSError:
+            alive = []
+        print(' '.join(nmap_args(hosts, alive, args.host_timeout)))
+        return
+    now = time.time()
+    for ip, rtt in parse_nmap_latency(args.nmap).items():
+        update(hosts, ip, rtt, now)
+    save(args.state, hosts, now)
+
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,32 @@ LOG="$ROOT/logs"
 
 mkdir -p "$DATA" "$SITE" "$STATE" "$LOG"
 
+# Fast cycle: `scan.sh --discovery` (or NW_SCAN_MODE=discovery) runs ARP discovery
+# only and refreshes the inventory/presence artifacts; ports and enrichment are
+# carried over from the last full scan (marked details_stale in latest.json).
+SCAN_MODE="${NW_SCAN_MODE:-full}"
+if [[ "${1:-}" == "--discovery" ]]; then
+  SCAN_MODE=discovery
+fi
+
+# One cycle at a time (scheduler/cron loop + manual runs share state/).
+# Full scans wait up to NW_SCAN_LOCK_WAIT seconds for a running cycle; discovery
+# sweeps just skip. Exit 75 (EX_TEMPFAIL) when the lock was not obtained.
+if command -v flock >/dev/null 2>&1; then
+  exec 9>"$STATE/.scan.lock"
+  LOCK_WAIT="${NW_SCAN_LOCK_WAIT:-600}"
+  if [[ "$SCAN_MODE" == "discovery" ]]; then
+    LOCK_WAIT=0
+  fi
+  if ! flock -w "$LOCK_WAIT" 9; then
+    echo "SKIP: another scan cycle holds $STATE/.scan.lock" >&2
+    exit 75
+  fi
+else
+  echo "WARN: flock not found; scan cycles are not serialized." >&2
+fi
+
+CYCLE_START="$(date +%s.%N)"
 TS_UTC="$(date -u +"%Y%m%dT%H%M%SZ")"
 TS_HUMAN="$(date +"%Y-%m-%d %H:%M:%S %Z")"
 IFACE="${NW_INTERFACE:-}"
@@ -20,9 +46,24 @@ fi
 
 HOST_IP="$(ip -br addr show dev "$IFACE" | awk '{print $3}' | cut -d/ -f1 | head -n1)"
 
+# Run one stage under stage_metrics.py (wall/CPU/RSS/counters -> logs/<ts>_metrics.jsonl)
+stage() {
+  local name="$1"; shift
+  python3 "$ROOT/stage_metrics.py" run --root "$ROOT" --ts "$TS_UTC" --stage "$name" "$@"
+}
+
+# Sensor role: ship the new inventory delta to the aggregator (best effort)
+push_to_aggregator() {
+  if [[ -n "${NW_AGGREGATOR_URL:-}" ]]; then
+    stage sensor_push -- python3 "$ROOT/sensor.py" --root "$ROOT" \
+      >"$LOG/${TS_UTC}_sensor.stdout" 2>"$LOG/${TS_UTC}_sensor.stderr" || true
+  fi
+}
+
 # 1) L2 inventory (arp-scan; in Docker we typically run as root with NET_RAW)
 ARP_OUT="$DATA/${TS_UTC}_arp_scan.txt"
-if /usr/sbin/arp-scan --interface="$IFACE" --localnet --plain --ignoredups --timeout=200 --retry=2 >"$ARP_OUT" 2>"$LOG/${TS_UTC}_arp_scan.err"; then
+if stage arp_scan --out "$ARP_OUT" --count "hosts=$ARP_OUT" -- \
+  /usr/sbin/arp-scan --interface="$IFACE" --localnet --plain --ignoredups --timeout=200 --retry=2 >"$ARP_OUT" 2>"$LOG/${TS_UTC}_arp_scan.err"; then
   :
 else
   echo "WARN: arp-scan failed (need NET_RAW/NET_ADMIN or sudo)." >>"$LOG/${TS_UTC}_warnings.log"
@@ -37,36 +78,72 @@ else
   /usr/bin/nmap -sn -n "$SUBNET_CIDR" -oG - | awk '/Up$/{print $2}' | sort -V >"$ALIVE_OUT"
 fi
 
+if [[ "$SCAN_MODE" == "discovery" ]]; then
+  stage render -- \
+    python3 "$ROOT/render.py" \
+    --root "$ROOT" \
+    --timestamp-utc "$TS_UTC" \
+    --timestamp-human "$TS_HUMAN" \
+    --host-ip "$HOST_IP" \
+    --subnet "$SUBNET_CIDR" \
+    --discovery-only
+  # no push: an ARP-only sweep misses sleeping devices, and the aggregator
+  # would count them as gone
+  python3 "$ROOT/stage_metrics.py" finalize --root "$ROOT" --ts "$TS_UTC" --cycle-start "$CYCLE_START" \
+    2>>"$LOG/${TS_UTC}_warnings.log" || true
+  echo "OK (discovery) $TS_HUMAN"
+  exit 0
+fi
+
 # 3) Top 100 ports + light service detection (reasonable hourly noise)
 PORTSCAN_OUT="$DATA/${TS_UTC}_top${NW_TOP_PORTS:-100}.txt"
-/usr/bin/nmap --top-ports "${NW_TOP_PORTS:-100}" -sV -n -T"${NW_NMAP_TIMING:-4}" ${NW_NMAP_VERSION:---version-light} --max-retries 2 --host-timeout 30s -iL "$ALIVE_OUT" -oN "$PORTSCAN_OUT" \
+# --host-timeout/--initial-rtt-timeout sized from the alive hosts' RTT history (rtt_stats.py)
+NMAP_TIMING="$(python3 "$ROOT/rtt_stats.py" nmap-args --state "$STATE" --hosts "$ALIVE_OUT" --host-timeout 30 \
+  2>>"$LOG/${TS_UTC}_warnings.log" || echo "--host-timeout 30s")"
+stage nmap_top --out "$PORTSCAN_OUT" \
+  --count "hosts=$PORTSCAN_OUT:^Nmap scan report for" --count "timeouts=$LOG/${TS_UTC}_nmap_top.stdout:due to host timeout" -- \
+  /usr/bin/nmap --top-ports "${NW_TOP_PORTS:-100}" -sV -n -T"${NW_NMAP_TIMING:-4}" ${NW_NMAP_VERSION:---version-light} --max-retries 2 $NMAP_TIMING -iL "$ALIVE_OUT" -oN "$PORTSCAN_OUT" \
   >"$LOG/${TS_UTC}_nmap_top.stdout" 2>"$LOG/${TS_UTC}_nmap_top.stderr" || true
+python3 "$ROOT/rtt_stats.py" record-nmap --state "$STATE" --nmap "$PORTSCAN_OUT" \
+  2>>"$LOG/${TS_UTC}_warnings.log" || true
 
-# 4) Web probing (read-only HTTP(S) HEAD/GET for title/headers on common web ports)
+# 4) Web probing (read-only HTTP(S) HEAD/GET for title/headers on nmap-identified web services)
 WEBPROBE_OUT="$DATA/${TS_UTC}_webprobe.json"
-python3 "$ROOT/web_probe.py" --nmap "$PORTSCAN_OUT" --out "$WEBPROBE_OUT" --timeout 3 \
+stage web_probe --out "$WEBPROBE_OUT" -- \
+  python3 "$ROOT/web_probe.py" --nmap "$PORTSCAN_OUT" --out "$WEBPROBE_OUT" --state "$STATE" --timeout 3 \
   >"$LOG/${TS_UTC}_webprobe.stdout" 2>"$LOG/${TS_UTC}_webprobe.stderr" || true
 
 # 5) Enrichment (reverse DNS + safe SMB scripts when applicable)
 ENRICH_OUT="$DATA/${TS_UTC}_enrich.json"
-python3 "$ROOT/enrich.py" --nmap "$PORTSCAN_OUT" --webprobe "$WEBPROBE_OUT" --out "$ENRICH_OUT" --ts "$TS_UTC" --root "$ROOT" \
+stage enrich --out "$ENRICH_OUT" -- \
+  python3 "$ROOT/enrich.py" --nmap "$PORTSCAN_OUT" --webprobe "$WEBPROBE_OUT" --out "$ENRICH_OUT" --ts "$TS_UTC" --root "$ROOT" \
   >"$LOG/${TS_UTC}_enrich.stdout" 2>"$LOG/${TS_UTC}_enrich.stderr" || true
 
 # 6) Render site (static)
-python3 "$ROOT/render.py" \
+stage render -- \
+  python3 "$ROOT/render.py" \
   --root "$ROOT" \
   --timestamp-utc "$TS_UTC" \
   --timestamp-human "$TS_HUMAN" \
   --host-ip "$HOST_IP" \
   --subnet "$SUBNET_CIDR"
 
-# 7) Alerts (best effort)
-python3 "$ROOT/alert.py" \
-  >"$LOG/${TS_UTC}_alert.stdout" 2>"$LOG/${TS_UTC}_alert.stderr" || true
+push_to_aggregator
+
+# Per-stage metrics -> snapshot "metrics", state/metrics.json, site/metrics.json (/metrics)
+python3 "$ROOT/stage_metrics.py" finalize --root "$ROOT" --ts "$TS_UTC" --cycle-start "$CYCLE_START" \
+  2>>"$LOG/${TS_UTC}_warnings.log" || true
+
+# 7) Alerts (best effort, in the background: render queued the events)
+nohup python3 "$ROOT/alert.py" --root "$ROOT" \
+  >"$LOG/${TS_UTC}_alert.stdout" 2>"$LOG/${TS_UTC}_alert.stderr" </dev/null 9>&- &
+
+# 7b) Pack days older than NW_COMPACT_AFTER_DAYS into data|logs/archive/<day>.zip, apply retention
+nohup python3 "$ROOT/compact.py" --root "$ROOT" >>"$LOG/compact.log" 2>&1 </dev/null 9>&- &
 
 # 8) Ensure web server is running (no-op in Docker if entrypoint already started it)
 if [[ "${NW_NO_SERVER:-0}" != "1" ]]; then
-  bash "$ROOT/server.sh" "$HOST_IP"
+  bash "$ROOT/server.sh" "$HOST_IP" 9>&-
 fi
 
 echo "OK $TS_HUMAN"
\ No newline at end of file
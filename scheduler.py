@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""Adaptive scan cadence.
+
+Instead of a full scan.sh every NW_SCAN_EVERY_MINUTES, run the discovery-only
+cycle (`scan.sh --discovery`: ARP sweep + inventory/presence refresh) every
+NW_DISCOVERY_EVERY_MINUTES and escalate to the full cycle (nmap, web probe,
+enrichment, render, alerts) only when
+
+    - the sweep shows a device the change tracker (state/tracker.json) has
+      never seen, or a known device on a different IP, or
+    - the last full scan is NW_SCAN_EVERY_MINUTES old (maximum staleness).
+
+Change-triggered scans are at least NW_SCAN_MIN_MINUTES apart so a flapping
+device cannot keep nmap running back to back. Devices missing from a sweep do
+not escalate (single ARP sweeps miss sleeping phones), and neither do known
+devices coming back; the next full scan reports them gone or returned. Only a
+full scan that exits 0 counts: a skipped (75, cycle lock held) or failed one
+is retried on the next sweep. state/scheduler.json records the last full scan
+and why it ran.
+
+    python3 scheduler.py --root /app [--once]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from change_detect import load_tracker
+from fsutil import atomic_write_text, read_json
+from snapshot_store import list_ts, load
+
+VERSION = 1
+
+
+def load_sched(state_dir):
+    try:
+        with open(os.path.join(state_dir, 'scheduler.json'), 'r') as f:
+            obj = json.load(f)
+        if isinstance(obj, dict) and obj.get('version') == VERSION:
+            return obj
+    except Exception:
+        pass
+    return {'version': VERSION, 'lastFull': 0, 'lastDiscovery': 0, 'lastReason': '', 'fullScans': 0, 'discoveries': 0}
+
+
+def save_sched(state_dir, sched):
+    atomic_write_text(os.path.join(state_dir, 'scheduler.json'), json.dumps(sched, indent=2))
+
+
+def read_devices(path):
+    snap = read_json(path, {})
+    if not isinstance(snap, dict):
+        return {}, {}
+    return snap, {d['id']: d.get('ip', '') for d in snap.get('devices', []) or [] if d.get('id')}
+
+
+def known_devices(state_dir):
+    """device id -> last IP of every device the change tracker remembers, so
+    sleeping devices waking up are not "new"; the last full snapshot
+    (state/<ts>.json; discovery cycles only update latest.json) until the
+    tracker exists."""
+    tracked = load_tracker(state_dir)['devices']
+    if tracked:
+        return {did: rec.get('ip', '') for did, rec in tracked.items()}
+    tss = list_ts(state_dir)
+    snap = load(state_dir, tss[-1]) if tss else None
+    return {d['id']: d.get('ip', '') for d in (snap or {}).get('devices', []) or [] if d.get('id')}
+
+
+def discover(root):
+    """One discovery-only cycle -> {device id: ip} seen by it, or None when it failed."""
+    latest = os.path.join(root, 'state', 'latest.json')
+    before = read_devices(latest)[0].get('timestamp_utc', '')
+    try:
+        rc = subprocess.call(['bash', os.path.join(root, 'scan.sh'), '--discovery'], timeout=600)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    snap, seen = read_devices(latest)
+    if rc != 0 or snap.get('mode') != 'discovery' or snap.get('timestamp_utc', '') <= before:
+        return None
+    return {did: ip for did, ip in seen.items() if not did.startswith('ip:')} or None
+
+
+def changes(known, seen):
+    """(new ids, ids whose IP changed) between the known devices and a sweep."""
+    new = sorted(did for did in seen if did not in known)
+    moved = sorted(did for did, ip in seen.items() if did in known and known[did] and ip != known[did])
+    return new, moved
+
+
+def decide(sched, known, seen, now, max_stale, min_gap):
+    """Reason for a full scan now, or '' to stay with discovery."""
+    last = sched.get('lastFull') or 0
+    if not last:
+        return 'first scan'
+    if now - last >= max_stale:
+        return 'stale'
+    if seen is None or now - last < min_gap:
+        return ''
+    new, moved = changes(known, seen)
+    parts = []
+    if new:
+        parts.append(f"{len(new)} new ({', '.join(new[:3])})")
+    if moved:
+        parts.append(f"{len(moved)} IP change ({', '.join(moved[:3])})")
+    return '; '.join(parts)
+
+
+def log(msg):
+    print(f"[network-watch] {msg} at {datetime.now().astimezone().isoformat(timespec='seconds')}", flush=True)
+
+
+def tick(root, scan_cmd, max_stale, min_gap, now=None, sweep=discover):
+    """One discovery round; runs the full scan when decide() says so."""
+    state = os.path.join(root, 'state')
+    now = time.time() if now is None else now
+    sched = load_sched(state)
+    seen = sweep(root) if sched.get('lastFull') else None
+    sched['lastDiscovery'] = now
+    sched['discoveries'] = sched.get('discoveries', 0) + 1
+    reason = decide(sched, known_devices(state), seen, now, max_stale, min_gap)
+    if reason:
+        log(f"scan starting ({reason})")
+        rc = subprocess.call(scan_cmd)
+        log({0: 'scan done', 75: 'scan skipped (another cycle running)'}.get(rc, f'scan failed rc={rc} (continuing)'))
+        if rc == 0:
+            sched['lastFull'] = now
+            sched['lastReason'] = reason
+            sched['fullScans'] = sched.get('fullScans', 0) + 1
+    save_sched(state, sched)
+    return reason
+
+
+def minutes_env(name, default):
+    try:
+        return max(0.0, float(os.environ.get(name, '') or default))
+    except ValueError:
+        return float(default)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--root', default=os.path.dirname(os.path.abspath(__file__)))
+    ap.add_argument('--once', action='store_true', help='single discovery round, then exit')
+    args = ap.parse_args()
+
+    if not os.environ.get('NW_INTERFACE'):
+        print('ERROR: set NW_INTERFACE', file=sys.stderr)
+        sys.exit(2)
+    os.makedirs(os.path.join(args.root, 'state'), exist_ok=True)
+    every = max(0.5, minutes_env('NW_DISCOVERY_EVERY_MINUTES', 5)) * 60
+    max_stale = max(every, minutes_env('NW_SCAN_EVERY_MINUTES', 60) * 60)
+    min_gap = minutes_env('NW_SCAN_MIN_MINUTES', 10) * 60
+    scan_cmd = ['bash', os.path.join(args.root, 'scan.sh')]
+
+    while True:
+        t0 = time.time()
+        tick(args.root, scan_cmd, max_stale, min_gap, now=t0)
+        if args.once:
+            return
+        time.sleep(max(1.0, every - (time.time() - t0)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""Sensor role: ship this host's inventory to an aggregator as deltas.
+
+    NW_AGGREGATOR_URL=http://hq:8787 NW_SENSOR_ID=branch-1 python3 sensor.py --root R
+
+Run by scan.sh after the render of a full cycle when NW_AGGREGATOR_URL is
+set; discovery (ARP-only) snapshots are not pushed. The delta holds only
+devices that changed since the last snapshot the aggregator acknowledged
+(state/sensor.json), plus the ids that disappeared, gzip'ed and POSTed to
+<url>/api/ingest:
+
+    {"version": 1, "sensor": "branch-1", "ts": "...", "base": "<acked ts>",
+     "full": false, "upsert": [device, ...], "remove": [id, ...], "meta": {...}}
+
+An unreachable aggregator just leaves the acknowledged state alone, so the
+next push carries everything changed since then. When the aggregator's copy
+does not match "base" (it lost state, or this sensor did) it answers 409 and
+the sensor resends its whole inventory.
+"""
+import argparse
+import gzip
+import json
+import os
+import socket
+import sys
+import urllib.error
+import urllib.request
+
+from fsutil import atomic_write_json, read_json
+from stage_metrics import report
+
+VERSION = 1
+INGEST_PATH = '/api/ingest'
+
+
+def load_acked(state_dir):
+    obj = read_json(os.path.join(state_dir, 'sensor.json'), {})
+    if isinstance(obj, dict) and obj.get('version') == VERSION:
+        return obj
+    return {'version': VERSION, 'ts': '', 'devices': {}}
+
+
+def save_acked(state_dir, acked):
+    atomic_write_json(os.path.join(state_dir, 'sensor.json'), acked, separators=(',', ':'))
+
+
+def build_delta(sensor_id, snap, acked, full=False):
+    """(delta, current devices by id) for snapshot snap against the acked state."""
+    cur = {d['id']: d for d in snap.get('devices', []) or [] if d.get('id')}
+    full = full or not acked.get('ts')
+    base = {} if full else acked.get('devices', {})
+    delta = {
+        'version': VERSION,
+        'sensor': sensor_id,
+        'ts': snap.get('timestamp_utc', ''),
+        'base': '' if full else acked['ts'],
+        'full': full,
+        'upsert': [d for did, d in cur.items() if base.get(did) != d],
+        'remove': sorted(did for did in base if did not in cur),
+        'meta': {k: snap.get(k, '') for k in ('subnet', 'host_ip', 'timestamp_human', 'mode')},
+    }
+    return delta, cur
+
+
+def post_delta(url, delta, token='', timeout=15):
+    """POST one gzip'ed delta -> (HTTP status, response JSON, bytes sent)."""
+    body = gzip.compress(json.dumps(delta, separators=(',', ':')).encode('utf-8'))
+    headers = {'Content-Type': 'application/json', 'Content-Encoding': 'gzip'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    req = urllib.request.Request(url.rstrip('/') + INGEST_PATH, data=body, method='POST', headers=headers)
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            status, raw = resp.status, resp.read()
+    except urllib.error.HTTPError as e:
+        status, raw = e.code, e.read()
+    try:
+        reply = json.loads(raw or b'{}')
+    except ValueError:
+        reply = {}
+    return status, reply, len(body)
+
+
+def push(state_dir, url, sensor_id, token='', post=post_delta):
+    """Send the latest snapshot's delta; returns a stats dict."""
+    snap = read_json(os.path.join(state_dir, 'latest.json'), {})
+    acked = load_acked(state_dir)
+    ts = snap.get('timestamp_utc', '') if isinstance(snap, dict) else ''
+    if not ts or ts <= acked.get('ts', ''):
+        return {'sent': False, 'reason': 'nothing new'}
+    if snap.get('mode') == 'discovery':
+        return {'sent': False, 'reason': 'discovery snapshot'}
+
+    delta, cur = build_delta(sensor_id, snap, acked)
+    status, reply, sent = post(url, delta, token)
+    if status == 409 and not delta['full']:
+        delta, cur = build_delta(sensor_id, snap, acked, full=True)
+        status, reply, more = post(url, delta, token)
+        sent += more
+    stats = {'sent': status == 200, 'status': status, 'full': delta['full'], 'upserts': len(delta['upsert']),
+             'removes': len(delta['remove']), 'bytesSent': sent}
+    if status == 200:
+        save_acked(state_dir, {'version': VERSION, 'ts': ts, 'devices': cur})
+    else:
+        stats['reason'] = reply.get('error', '') if isinstance(reply, dict) else ''
+    return stats
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--root', required=True)
+    ap.add_argument('--url', default=os.environ.get('NW_AGGREGATOR_URL', ''))
+    ap.add_argument('--sensor', default=os.environ.get('NW_SENSOR_ID', '') or socket.gethostname())
+    args = ap.parse_args()
+    if not args.url:
+        print('ERROR: set NW_AGGREGATOR_URL or --url', file=sys.stderr)
+        sys.exit(2)
+
+    try:
+        stats = push(os.path.join(args.root, 'state'), args.url, args.sensor, os.environ.get('NW_SENSOR_TOKEN', ''))
+    except (OSError, urllib.error.URLError) as e:
+        stats = {'sent': False, 'reason': str(e)}
+    print(json.dumps(stats))
+    report(**{k: v for k, v in stats.items() if k in ('upserts', 'removes', 'bytesSent')})
+    sys.exit(0 if stats['sent'] or stats.get('reason') in ('nothing new', 'discovery snapshot') else 1)
+
+
+if __name__ == '__main__':
+    main()
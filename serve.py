@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""Static file server for site/ plus a Prometheus /metrics endpoint.
+
+Drop-in for `python3 -m http.server PORT --bind IP --directory site`; /metrics
+renders the last cycle's stage metrics (state/metrics.json) as Prometheus text.
+"""
+import argparse
+import functools
+import os
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from stage_metrics import load_rolling, prometheus_text
+
+
+class Handler(SimpleHTTPRequestHandler):
+    state_dir = ''
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0] == '/metrics':
+            body = prometheus_text(load_rolling(self.state_dir)).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Cache-Control', 'no-store')
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        super().do_GET()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('port', type=int, nargs='?', default=int(os.environ.get('NW_HTTP_PORT', '8787') or 8787))
+    ap.add_argument('--bind', default='0.0.0.0')
+    ap.add_argument('--directory', required=True)
+    ap.add_argument('--state', help='state dir with metrics.json (default: <directory>/../state)')
+    args = ap.parse_args()
+
+    Handler.state_dir = args.state or os.path.join(os.path.dirname(os.path.abspath(args.directory)), 'state')
+    handler = functools.partial(Handler, directory=args.directory)
+    with ThreadingHTTPServer((args.bind, args.port), handler) as httpd:
+        print(f'Serving {args.directory} on http://{args.bind}:{args.port}/ (metrics: /metrics)', flush=True)
+        httpd.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -21,6 +21,6 @@ fi
 BIND="${HOST_IP:-${NW_HTTP_BIND:-0.0.0.0}}"
 
 # Start server
-nohup python3 -m http.server "$PORT" --directory "$SITE" --bind "$BIND" >"$ROOT/logs/http_server.log" 2>&1 &
+nohup python3 "$ROOT/serve.py" "$PORT" --directory "$SITE" --bind "$BIND" >"$ROOT/logs/http_server.log" 2>&1 &
 PID=$!
 echo "$PID" >"$PIDFILE"
@@ -11,6 +11,14 @@ function labelDevice(d){
 
 function clamp(n, a, b){ return Math.max(a, Math.min(b, n)); }
 
+function debounce(fn, ms){
+  let timer = 0;
+  return (...args) => {
+    clearTimeout(timer);
+    timer = setTimeout(()=> fn(...args), ms);
+  };
+}
+
 function typeColor(t){
   const m = {
     gateway: 'rgba(168, 255, 214, .95)',
@@ -63,9 +71,64 @@ function spark(values, opts={}){
   </svg>`;
 }
 
+function b64bytes(b64){
+  const bin = atob(b64 || '');
+  const out = new Uint8Array(bin.length);
+  for(let i = 0; i < bin.length; i++) out[i] = bin.charCodeAt(i);
+  return out;
+}
+
+// Decode site/presence.json (see presence_pack.py). Rows stay bit-packed and
+// are expanded lazily per device.
+function decodePresence(obj){
+  if(!obj || obj.version !== 1) return null;
+  const u32 = (b64) => {
+    const bytes = b64bytes(b64);
+    // little-endian on the wire; every platform we target is little-endian too
+    return new Uint32Array(bytes.buffer, 0, bytes.length >> 2);
+  };
+  const rowOf = new Map();
+  (obj.ids || []).forEach((id, i) => rowOf.set(id, i));
+  return {
+    t: obj.t || [],
+    ips: obj.ips || [],
+    stride: obj.stride || 0,
+    bits: b64bytes(obj.bits),
+    runOffsets: u32(obj.ipRunOffsets),
+    runs: u32(obj.ipRuns),
+    rowOf,
+  };
+}
+
+function presenceBits(id){
+  const p = presence;
+  const r = p ? p.rowOf.get(id) : undefined;
+  if(r === undefined) return new Uint8Array(0);
+  const n = p.t.length, base = r * p.stride;
+  const out = new Uint8Array(n);
+  for(let j = 0; j < n; j++) out[j] = (p.bits[base + (j >> 3)] >> (j & 7)) & 1;
+  return out;
+}
+
+function presenceIps(id){
+  const p = presence;
+  const r = p ? p.rowOf.get(id) : undefined;
+  if(r === undefined) return [];
+  const n = p.t.length;
+  const out = new Array(n).fill('');
+  const lo = p.runOffsets[r], hi = p.runOffsets[r+1];
+  for(let k = lo; k < hi; k++){
+    const start = p.runs[2*k], code = p.runs[2*k+1];
+    const end = k + 1 < hi ? p.runs[2*k+2] : n;
+    if(code) out.fill(p.ips[code-1], start, end);
+  }
+  return out;
+}
+
 let latest = null;
 let history = null;
 let deviceStats = null;
+let presence = null;
 let lessons = null;
 let selectedId = null;
 let learnOpenId = null;
@@ -98,6 +161,17 @@ function applyLearnVisibility(){
   if(!on && route() === 'learn') location.hash = '#overview';
 }
 
+// Search text per device, built once per load instead of on every keystroke.
+const searchHay = new WeakMap();
+function hayFor(d){
+  let hay = searchHay.get(d);
+  if(hay === undefined){
+    hay = [labelDevice(d), d.vendor, d.hostname, ...(d.mdns||[]), d.mac, d.ip].join(' ').toLowerCase();
+    searchHay.set(d, hay);
+  }
+  return hay;
+}
+
 function filteredDevices(){
   if(!latest) return [];
   const q = ($('#search').value || '').toLowerCase().trim();
@@ -108,8 +182,7 @@ function filteredDevices(){
     if(risk === 'risky' && !(d.risk_flags||[]).length) return false;
     if(risk === 'unknown' && (d.type||'') !== 'unknown') return false;
     if(!q) return true;
-    const hay = [labelDevice(d), d.vendor, d.hostname, ...(d.mdns||[]), d.mac, d.ip].join(' ').toLowerCase();
-    return hay.includes(q);
+    return hayFor(d).includes(q);
   });
 }
 
@@ -179,15 +252,15 @@ function renderOverview(){
 
         ${timeSeries ? `<div style="height:12px"></div>
           <div class="card" style="border-radius:14px; box-shadow:none; background:rgba(0,0,0,.10)">
-            <div class="card__hd" style="border-bottom:0"><h2>Trends</h2><div class="card__sub">Last ~48 snapshots</div></div>
+            <div class="card__hd" style="border-bottom:0"><h2>Trends</h2><div class="card__sub">Last ${timeSeries.t.length} snapshots</div></div>
             <div class="card__bd">
               <div class="trendGrid">
                 <div class="trend">
                   <div class="label">Devices</div>
                   <div class="value">${timeSeries.devices.slice(-1)[0] ?? total}</div>
-                  <div class="spark">${spark(timeSeries.devices.slice(-48), {stroke:'rgba(122,162,255,.95)', fill:'rgba(122,162,255,.18)'})}</div>
+                  <div class="spark">${spark(timeSeries.devices, {stroke:'rgba(122,162,255,.95)', fill:'rgba(122,162,255,.18)'})}</div>
                   ${(()=>{
-                    const vals = timeSeries.devices.slice(-48);
+                    const vals = timeSeries.devices;
                     const mn = Math.min(...vals), mx = Math.max(...vals);
                     const rng = (mx-mn)||1;
                     const cells = vals.map(v=>{
@@ -200,12 +273,12 @@ function renderOverview(){
                 <div class="trend">
                   <div class="label">Open ports</div>
                   <div class="value">${timeSeries.openPorts.slice(-1)[0] ?? openPorts}</div>
-                  <div class="spark">${spark(timeSeries.openPorts.slice(-48), {stroke:'rgba(255,211,107,.95)', fill:'rgba(255,211,107,.18)'})}</div>
+                  <div class="spark">${spark(timeSeries.openPorts, {stroke:'rgba(255,211,107,.95)', fill:'rgba(255,211,107,.18)'})}</div>
                 </div>
                 <div class="trend">
                   <div class="label">Risk flags</div>
                   <div class="value">${timeSeries.risks.slice(-1)[0] ?? risks}</div>
-                  <div class="spark">${spark(timeSeries.risks.slice(-48), {stroke:'rgba(255,107,158,.95)', fill:'rgba(255,107,158,.18)'})}</div>
+                  <div class="spark">${spark(timeSeries.risks, {stroke:'rgba(255,107,158,.95)', fill:'rgba(255,107,158,.18)'})}</div>
                 </div>
               </div>
             </div>
@@ -273,6 +346,101 @@ function renderOverview(){
 }
 
 
+// Devices view is windowed: only rows near the viewport are in the DOM, so a
+// 1,000+ device inventory scrolls and filters without jank. Row heights are
+// fixed (see .vtable in app.css) so offsets are plain arithmetic.
+const DEV_ROW_H = 92;
+const DEV_GROUP_H = 48;
+const DEV_OVERSCAN = 8;
+const collapsedGroups = new Set();
+let devList = null;   // {items, offsets, range}
+let devFrame = 0;
+
+function upnpLabel(u){
+  const model = [u.manufacturer, u.modelName, u.modelNumber].filter(Boolean).join(' ');
+  return `${u.friendlyName||''}${model ? ` (${model})` : ''}`;
+}
+
+function deviceRow(d){
+  const flags = (d.risk_flags||[]);
+  const mdnsSvc = (d.mdns_services||[]).slice(0,3).join(', ');
+  const ssdp = d.upnp?.friendlyName ? upnpLabel(d.upnp) : (d.ssdp||[]).slice(0,1).map(s=> (s.server||s.st||'')).join('');
+  const stability = deviceStats?.devices?.[d.id];
+  const stabText = stability ? `seen ${stability.seenHours}/${stability.totalHours} • flaps ${stability.flaps} • IPs ${stability.uniqueIps}` : '–';
+
+  return `<tr class="devRow" data-id="${esc(d.id)}" style="height:${DEV_ROW_H}px">
+    <td>
+      <div><b>${esc(labelDevice(d))}</b></div>
+      <div class="muted small">${esc(d.mac||d.id)} • ${esc(d.vendor||'')}</div>
+    </td>
+    <td><span class="badge">${esc(d.type||'unknown')}</span></td>
+    <td><code>${esc(d.ip||'')}</code></td>
+    <td class="small">
+      ${flags.length ? flags.slice(0,3).map(f=>`<span class="badge bad">${esc(f)}</span>`).join(' ') : '<span class="muted">–</span>'}
+    </td>
+    <td class="small">
+      <div class="muted">Stability: ${esc(stabText)}</div>
+      <div class="muted">mDNS: ${esc((d.mdns||[]).slice(0,2).join(', '))}</div>
+      <div class="muted">svc: ${esc(mdnsSvc || '–')}</div>
+      <div class="muted">SSDP: ${esc(ssdp || '–')}</div>
+    </td>
+  </tr>`;
+}
+
+function groupRow(t, count){
+  const open = !collapsedGroups.has(t);
+  return `<tr class="groupRow" data-toggle="${esc(t)}" style="height:${DEV_GROUP_H}px">
+    <td colspan="5">
+      <div class="group__hd">
+        <div class="group__title">${open ? '▾' : '▸'} ${esc(t)}</div>
+        <div class="group__count">${count} devices</div>
+      </div>
+    </td>
+  </tr>`;
+}
+
+function padRow(h){
+  return h > 0 ? `<tr class="vpad" style="height:${h}px"><td colspan="5"></td></tr>` : '';
+}
+
+function paintDevices(){
+  devFrame = 0;
+  const body = $('#devBody');
+  if(!body || !devList) return;
+  const scroller = $('#content');
+  const {items, offsets} = devList;
+
+  // Visible band in tbody coordinates.
+  const bodyTop = body.getBoundingClientRect().top - scroller.getBoundingClientRect().top + scroller.scrollTop;
+  const viewTop = Math.max(0, scroller.scrollTop - bodyTop);
+  const viewBottom = viewTop + scroller.clientHeight;
+
+  // Largest index whose offset is <= viewTop.
+  let lo = 0, hi = items.length;
+  while(lo < hi){
+    const mid = (lo + hi + 1) >> 1;
+    if(offsets[mid] <= viewTop) lo = mid; else hi = mid - 1;
+  }
+  let end = lo;
+  while(end < items.length && offsets[end] < viewBottom) end++;
+  const first = Math.max(0, lo - DEV_OVERSCAN);
+  const last = Math.min(items.length, end + DEV_OVERSCAN);
+
+  if(devList.range && devList.range[0] === first && devList.range[1] === last) return;
+  devList.range = [first, last];
+
+  const rows = [];
+  for(let i = first; i < last; i++){
+    const it = items[i];
+    rows.push(it.group ? groupRow(it.group, it.count) : deviceRow(it.d));
+  }
+  body.innerHTML = padRow(offsets[first]) + rows.join('') + padRow(offsets[items.length] - offsets[last]);
+}
+
+function scheduleDevicesPaint(){
+  if(!devFrame) devFrame = requestAnimationFrame(paintDevices);
+}
+
 function renderDevices(){
   const devs = filteredDevices().slice();
 
@@ -303,80 +471,54 @@ function renderDevices(){
     return ia - ib;
   });
 
-  function deviceRow(d){
-    const flags = (d.risk_flags||[]);
-    const mdnsSvc = (d.mdns_services||[]).slice(0,3).join(', ');
-    const ssdp = (d.ssdp||[]).slice(0,1).map(s=> (s.server||s.st||'')).join('');
-    const stability = deviceStats?.devices?.[d.id];
-    const stabText = stability ? `seen ${stability.seenHours}/${stability.totalHours} • flaps ${stability.flaps} • IPs ${stability.uniqueIps}` : '–';
-
-    return `<tr class="devRow" data-id="${esc(d.id)}">
-      <td>
-        <div><b>${esc(labelDevice(d))}</b></div>
-        <div class="muted small">${esc(d.mac||d.id)} • ${esc(d.vendor||'')}</div>
-      </td>
-      <td><span class="badge">${esc(d.type||'unknown')}</span></td>
-      <td><code>${esc(d.ip||'')}</code></td>
-      <td class="small">
-        ${flags.length ? flags.slice(0,3).map(f=>`<span class="badge bad">${esc(f)}</span>`).join(' ') : '<span class="muted">–</span>'}
-      </td>
-      <td class="small">
-        <div class="muted">Stability: ${esc(stabText)}</div>
-        <div class="muted">mDNS: ${esc((d.mdns||[]).slice(0,2).join(', '))}</div>
-        <div class="muted">svc: ${esc(mdnsSvc || '–')}</div>
-        <div class="muted">SSDP: ${esc(ssdp || '–')}</div>
-      </td>
-    </tr>`;
-  }
-
-  const sections = types.map(t => {
-    const list = groups[t];
-    const rows = list.map(deviceRow).join('');
-    return `
-      <div class="group" data-group="${esc(t)}">
-        <div class="group__hd" data-toggle="${esc(t)}">
-          <div class="group__title">${esc(t)}</div>
-          <div class="group__count">${list.length} devices</div>
-        </div>
-        <div class="group__bd" id="grp_${esc(t)}">
-          <div class="card" style="box-shadow:none">
-            <div class="card__bd">
-              <table class="table">
-                <thead><tr><th>Device</th><th>Type</th><th>IP</th><th>Risk</th><th>Signals</th></tr></thead>
-                <tbody>${rows}</tbody>
-              </table>
-            </div>
-          </div>
-        </div>
-      </div>
-    `;
-  }).join('');
+  // Flatten groups into one row list (header rows + device rows).
+  const items = [];
+  types.forEach(t => {
+    items.push({group: t, count: groups[t].length});
+    if(!collapsedGroups.has(t)) groups[t].forEach(d => items.push({d}));
+  });
+  const offsets = new Array(items.length + 1);
+  offsets[0] = 0;
+  items.forEach((it, i) => { offsets[i+1] = offsets[i] + (it.group ? DEV_GROUP_H : DEV_ROW_H); });
+  devList = {items, offsets, range: null};
 
   $('#content').innerHTML = `
     <div class="card">
       <div class="card__hd"><h2>Inventory</h2><div class="card__sub">Grouped by type → named identity. Click a device for details.</div></div>
       <div class="card__bd">
-        <div class="muted small">Tip: filter “Unknown only” to focus on classification.</div>
+        <div class="muted small">Tip: filter “Unknown only” to focus on classification. ${devs.length} devices shown.</div>
       </div>
     </div>
-    ${sections || '<div class="muted">No devices match.</div>'}
+    ${items.length ? `
+    <div class="card" style="box-shadow:none">
+      <div class="card__bd">
+        <table class="table vtable">
+          <thead><tr><th>Device</th><th style="width:110px">Type</th><th style="width:140px">IP</th><th>Risk</th><th>Signals</th></tr></thead>
+          <tbody id="devBody"></tbody>
+        </table>
+      </div>
+    </div>` : '<div class="muted">No devices match.</div>'}
   `;
 
-  // group collapse
-  $$('#content [data-toggle]').forEach(hd => {
-    hd.addEventListener('click', ()=>{
-      const t = hd.getAttribute('data-toggle');
-      const bd = document.getElementById('grp_'+t);
-      if(!bd) return;
-      const open = bd.style.display !== 'none';
-      bd.style.display = open ? 'none' : '';
+  const body = $('#devBody');
+  if(body){
+    paintDevices();
+    // One delegated listener instead of one per row; rows come and go on scroll.
+    body.addEventListener('click', (e)=>{
+      const hd = e.target.closest('[data-toggle]');
+      if(hd){
+        const t = hd.getAttribute('data-toggle');
+        if(collapsedGroups.has(t)) collapsedGroups.delete(t); else collapsedGroups.add(t);
+        const scrollTop = $('#content').scrollTop;
+        renderDevices();
+        $('#content').scrollTop = scrollTop;
+        scheduleDevicesPaint();
+        return;
+      }
+      const tr = e.target.closest('.devRow');
+      if(tr) openDrawer(tr.dataset.id);
     });
-  });
-
-  // row click -> drawer
-  $$('#content .devRow').forEach(tr => {
-    tr.addEventListener('click', ()=> openDrawer(tr.dataset.id));
-  });
+  }
 
   const focus = sessionStorage.getItem('focusDevice');
   if(focus){
@@ -385,15 +527,187 @@ function renderDevices(){
   }
 }
 
+// Per-device presence heatmap drawn on a canvas: one draw call per visible
+// row instead of one DOM node per device × snapshot cell.
+const HEAT_ROW_H = 16;
+const HEAT_LABEL_W = 220;
+let heatRows = [];
+let heatFrame = 0;
+
+function presenceRows(){
+  const stats = (deviceStats && deviceStats.devices) ? Object.values(deviceStats.devices) : [];
+  const q = ($('#search').value || '').toLowerCase().trim();
+  return stats
+    .filter(s => !q || [s.display, s.id, s.mac, s.vendor, s.hostname].join(' ').toLowerCase().includes(q))
+    .map(s => ({id: s.id, label: s.display || s.id, bits: presenceBits(s.id)}));
+}
+
+function drawHeatmap(){
+  heatFrame = 0;
+  const wrap = $('#heatWrap');
+  const canvas = $('#heatCanvas');
+  if(!wrap || !canvas) return;
+
+  const dpr = window.devicePixelRatio || 1;
+  const w = canvas.clientWidth, h = canvas.clientHeight;
+  if(canvas.width !== Math.round(w*dpr) || canvas.height !== Math.round(h*dpr)){
+    canvas.width = Math.round(w*dpr);
+    canvas.height = Math.round(h*dpr);
+  }
+  const ctx = canvas.getContext('2d');
+  ctx.setTransform(dpr, 0, 0, dpr, 0, 0);
+  ctx.clearRect(0, 0, w, h);
+
+  const cols = heatRows.reduce((m, r) => Math.max(m, r.bits.length), 0);
+  const cw = cols ? Math.max(2, Math.floor((w - HEAT_LABEL_W) / cols)) : 0;
+  canvas.dataset.cw = cw;
+
+  const top = wrap.scrollTop;
+  const first = Math.floor(top / HEAT_ROW_H);
+  const last = Math.min(heatRows.length, Math.ceil((top + h) / HEAT_ROW_H));
+
+  ctx.font = '12px ui-sans-serif, system-ui, sans-serif';
+  ctx.textBaseline = 'middle';
+  for(let i = first; i < last; i++){
+    const row = heatRows[i];
+    const y = i*HEAT_ROW_H - top;
+    ctx.fillStyle = 'rgba(232,237,255,.85)';
+    ctx.fillText(row.label.length > 30 ? row.label.slice(0,29) + '…' : row.label, 4, y + HEAT_ROW_H/2, HEAT_LABEL_W - 8);
+    ctx.fillStyle = 'rgba(255,255,255,.05)';
+    ctx.fillRect(HEAT_LABEL_W, y + 2, cols*cw, HEAT_ROW_H - 4);
+    ctx.fillStyle = 'rgba(122,162,255,.95)';
+    const bits = row.bits;
+    for(let j = 0; j < bits.length; j++){
+      if(bits[j]) ctx.fillRect(HEAT_LABEL_W + j*cw, y + 2, Math.max(1, cw - 1), HEAT_ROW_H - 4);
+    }
+  }
+}
+
+function scheduleHeatmapDraw(){
+  if(!heatFrame) heatFrame = requestAnimationFrame(drawHeatmap);
+}
+
+function mountHeatmap(t){
+  const wrap = $('#heatWrap');
+  const canvas = $('#heatCanvas');
+  if(!wrap || !canvas) return;
+  wrap.addEventListener('scroll', scheduleHeatmapDraw, {passive:true});
+  canvas.addEventListener('mousemove', (e)=>{
+    const row = heatRows[Math.floor((e.offsetY + wrap.scrollTop) / HEAT_ROW_H)];
+    const cw = Number(canvas.dataset.cw) || 0;
+    const col = cw ? Math.floor((e.offsetX - HEAT_LABEL_W) / cw) : -1;
+    if(!row || col < 0 || col >= row.bits.length){ canvas.title = row ? row.label : ''; return; }
+    const at = t[t.length - row.bits.length + col] || '';
+    canvas.title = `${row.label} @ ${at} — ${row.bits[col] ? 'seen' : 'not seen'}`;
+  });
+  canvas.addEventListener('click', (e)=>{
+    const row = heatRows[Math.floor((e.offsetY + wrap.scrollTop) / HEAT_ROW_H)];
+    if(row && (latest.devices||[]).some(d => d.id === row.id)) openDrawer(row.id);
+  });
+  drawHeatmap();
+}
+
+// Zoom levels for the timeline charts. "recent" is history.json (the render
+// window); longer ranges read the rollup that keeps the point count small.
+const TIMELINE_RANGES = [
+  ['recent', 'Recent snapshots', 0],
+  ['7d', 'Last 7 days', 7],
+  ['30d', 'Last 30 days', 30],
+  ['1y', 'Last year', 365],
+  ['all', 'Everything', Infinity],
+];
+const MAX_CHART_POINTS = 400;
+const RAW_MAX_DAYS = 7;
+const seriesCache = {};
+let timelineRange = localStorage.getItem('nw.timeline.range') || 'recent';
+
+// Short ranges try one point per snapshot (history/raw.json); timelineSeries
+// falls back to hourly when that range holds more than MAX_CHART_POINTS.
+function pickResolution(days){
+  if(days <= RAW_MAX_DAYS) return 'raw';
+  if(days*24 <= MAX_CHART_POINTS) return 'hourly';
+  if(days <= MAX_CHART_POINTS) return 'daily';
+  return 'weekly';
+}
+
+function loadSeries(res){
+  const series = seriesCache[res];
+  if(!series){
+    seriesCache[res] = 'loading';
+    fetch(`/history/${res}.json`, {cache:'no-store'})
+      .then(r => r.ok ? r.json() : null)
+      .catch(()=>null)
+      .then(obj => { seriesCache[res] = obj || {t:[]}; if(route() === 'timeline') renderTimeline(); });
+    return null;
+  }
+  return series === 'loading' ? null : series;
+}
+
+function rangeStart(ts, days){
+  let from = 0;
+  if(ts.length && isFinite(days)){
+    const cutoff = msToTs(tsToMs(ts[ts.length-1]) - days*864e5);
+    while(from < ts.length && ts[from] < cutoff) from++;
+  }
+  return from;
+}
+
+function tsToMs(ts){
+  return Date.UTC(+ts.slice(0,4), +ts.slice(4,6)-1, +ts.slice(6,8), +ts.slice(9,11), +ts.slice(11,13), +ts.slice(13,15));
+}
+
+function msToTs(ms){
+  return new Date(ms).toISOString().replace(/[-:]/g, '').slice(0, 15) + 'Z';
+}
+
+function timelineSeries(){
+  const range = TIMELINE_RANGES.find(r => r[0] === timelineRange) || TIMELINE_RANGES[0];
+  if(range[0] === 'recent'){
+    return {
+      label: `last ${(history?.t || []).length} snapshots`,
+      t: history?.t || [], devices: history?.devices || [],
+      openPorts: history?.openPorts || [], risks: history?.risks || [],
+    };
+  }
+  let res = pickResolution(range[2]);
+  let series = loadSeries(res);
+  if(!series) return null;
+  let ts = series.t || [];
+  let from = rangeStart(ts, range[2]);
+  if(res === 'raw' && ts.length - from > MAX_CHART_POINTS){
+    res = 'hourly';
+    series = loadSeries(res);
+    if(!series) return null;
+    ts = series.t || [];
+    from = rangeStart(ts, range[2]);
+  }
+  return {
+    label: `${range[1].toLowerCase()} • ${res === 'raw' ? 'per snapshot' : `${res} buckets (avg)`}`,
+    t: ts.slice(from).map(x => res === 'raw' ? x : x.slice(0,8) + (res === 'hourly' ? x.slice(9,11) : '')),
+    devices: (series.devices || []).slice(from),
+    openPorts: (series.openPorts || []).slice(from),
+    risks: (series.risks || []).slice(from),
+  };
+}
+
 function renderTimeline(){
-  const t = (history?.t || []).slice(-48);
-  const devices = (history?.devices || []).slice(-48);
-  const openPorts = (history?.openPorts || []).slice(-48);
-  const risks = (history?.risks || []).slice(-48);
+  const series = timelineSeries();
+  const t = series ? series.t : [];
+  const devices = series ? series.devices : [];
+  const openPorts = series ? series.openPorts : [];
+  const risks = series ? series.risks : [];
+
+  heatRows = presenceRows();
+  const viewH = Math.min(Math.round(window.innerHeight*0.6), Math.max(HEAT_ROW_H, heatRows.length*HEAT_ROW_H));
 
   $('#content').innerHTML = `
     <div class="card">
-      <div class="card__hd"><h2>Timeline</h2><div class="card__sub">Quick glance trends (last ~48 snapshots)</div></div>
+      <div class="card__hd"><h2>Timeline</h2>
+        <div class="card__sub">
+          <select id="timelineRange">${TIMELINE_RANGES.map(r => `<option value="${r[0]}" ${r[0]===timelineRange?'selected':''}>${esc(r[1])}</option>`).join('')}</select>
+          ${series ? esc(series.label) : 'loading…'}
+        </div>
+      </div>
       <div class="card__bd">
         <div class="kpis">
           <div class="kpi"><div class="label">Snapshots</div><div class="value">${t.length}</div></div>
@@ -406,15 +720,34 @@ function renderTimeline(){
           <div class="card__hd" style="border-bottom:0"><h2>Devices</h2><div class="card__sub">sparkline</div></div>
           <div class="card__bd"><div class="spark">${sparkline(devices)}</div></div>
         </div>
+        <div style="height:12px"></div>
+        <div class="card" style="border-radius:14px; box-shadow:none; background:rgba(0,0,0,.10)">
+          <div class="card__hd" style="border-bottom:0"><h2>Presence</h2><div class="card__sub">${heatRows.length} devices • blue = seen • click a row for details</div></div>
+          <div class="card__bd">
+            ${heatRows.length ? `<div class="heatWrap" id="heatWrap" style="height:${viewH}px">
+              <canvas class="heatCanvas" id="heatCanvas" style="height:${viewH}px"></canvas>
+              <div style="height:${Math.max(0, heatRows.length*HEAT_ROW_H - viewH)}px"></div>
+            </div>` : '<div class="muted small">(no stats yet)</div>'}
+          </div>
+        </div>
       </div>
     </div>
     <div class="muted small">For animated multi-series charts, use <a href="/fancy-timeline.html">Fancy timeline</a>.</div>
   `;
+
+  $('#timelineRange').addEventListener('change', (e)=>{
+    timelineRange = e.target.value;
+    localStorage.setItem('nw.timeline.range', timelineRange);
+    renderTimeline();
+  });
+  mountHeatmap(presence ? presence.t : (history?.t || []));
 }
 
 function suggestType(d){
   const svc = (d.mdns_services||[]).map(s=>String(s).toLowerCase());
   const ssdp = (d.ssdp||[]).map(x => ((x.server||'')+' '+(x.st||'')+' '+(x.location||'')).toLowerCase());
+  const upnp = d.upnp || {};
+  const upnpText = [upnp.deviceType, upnp.manufacturer, upnp.modelName, upnp.friendlyName].join(' ').toLowerCase();
   const host = ((d.hostname||'') + ' ' + (d.mdns||[]).join(' ')).toLowerCase();
   const ports = new Set((d.open_ports||[]).map(p=>String(p.port||'')));
 
@@ -427,6 +760,11 @@ function suggestType(d){
   if(hasSvc('_hap._tcp')) return {type:'iot', reason:'mDNS: HomeKit (_hap._tcp)'};
   if(hasSvc('_ipp._tcp') || hasSvc('_printer._tcp') || hasSvc('_pdl-datastream._tcp')) return {type:'printer', reason:'mDNS: printer service'};
 
+  // UPnP device description
+  if(upnpText.includes('internetgatewaydevice')) return {type:'gateway', reason:'UPnP: InternetGatewayDevice'};
+  if(upnpText.includes(':printer:')) return {type:'printer', reason:'UPnP: printer device'};
+  if(upnpText.includes('mediarenderer') && /\b(tv|bravia|webos|roku|vizio)\b/.test(upnpText)) return {type:'tv', reason:`UPnP: ${upnp.modelName||upnp.friendlyName||'TV renderer'}`};
+
   // SSDP strings
   if(hasSsdp('synology') || hasSsdp('diskstation') || hasSsdp('dsm')) return {type:'nas', reason:'SSDP: Synology/DSM'};
   if(hasSsdp('roku') || hasSsdp('chromecast') || hasSsdp('webos') || hasSsdp('dlna')) return {type:'tv', reason:'SSDP: media/TV signature'};
@@ -558,7 +896,7 @@ function renderSettings(){
           <ul class="small">
             <li><code>/home/prateek/.openclaw/workspace/network-watch/state/aliases.json</code> (MAC → friendly name)</li>
             <li><code>/home/prateek/.openclaw/workspace/network-watch/state/overrides.json</code> (MAC → forced type/name)</li>
-            <li><code>/home/prateek/.openclaw/workspace/network-watch/state/alerts.json</code> (alert mode + rate limits)</li>
+            <li><code>/home/prateek/.openclaw/workspace/network-watch/state/alerts.json</code> (alert rules, sinks + rate limits)</li>
           </ul>
         </div>
 
@@ -681,21 +1019,22 @@ function openDrawer(id){
 
   const st = deviceStats?.devices?.[id];
   const title = labelDevice(d);
-  const sub = `${d.type||'unknown'} • ${d.mac||id} • ${d.ip||''}`;
+  const sub = `${d.type||'unknown'} • ${d.mac||id} • ${d.ip||''}${d.sensor ? ` • sensor ${d.sensor}${d.sensor_offline ? ' (offline)' : ''}` : ''}`;
   $('#drawerTitle').textContent = title;
   $('#drawerSub').textContent = sub;
 
   const mdnsH = (d.mdns||[]).join(', ');
   const mdnsS = (d.mdns_services||[]).join(', ');
-  const ssdp = (d.ssdp||[]).slice(0,4).map(s => `${s.st||''} | ${s.server||''} | ${s.location||''}`.trim()).join('\n');
+  const ssdp = (d.upnp?.friendlyName ? upnpLabel(d.upnp) + '\n' : '') + (d.ssdp||[]).slice(0,4).map(s => `${s.st||''} | ${s.server||''} | ${s.location||''}`.trim()).join('\n');
 
   const ports = (d.open_ports||[]).map(p=>p.raw).join('\n');
   const web = (d.web||[]).slice(0,6).map(w => `${w.url||''} HTTP ${w.status||''} ${(w.title||'')}`.trim()).join('\n');
 
-  const stability = st ? `seen ${st.seenHours}/${st.totalHours}\nflaps ${st.flaps}\nunique IPs ${st.uniqueIps}` : '(no stats yet)';
+  const stability = st ? `seen ${st.seenHours}/${st.totalHours}${st.uptime !== undefined ? ` (${Math.round(st.uptime*100)}%)` : ''}\nflaps ${st.flaps}\nunique IPs ${st.uniqueIps}${st.lastSeen ? `\nfirst/last seen ${st.firstSeen} → ${st.lastSeen}` : ''}` : '(no stats yet)';
   const flags = (d.risk_flags||[]).join('\n') || '(none)';
+  const anomalies = (d.anomalies||[]).map(a => `${a.anomaly}: ${a.detail}`).join('\n');
 
-  // IP lane (from device_stats.json)
+  // IP lane (from presence.json)
   function ipColor(ip){
     if(!ip) return 'rgba(255,255,255,.05)';
     let h=0;
@@ -706,7 +1045,7 @@ function openDrawer(id){
     return `rgb(${r},${g},${b})`;
   }
 
-  const tail = (st && st.ipTail) ? st.ipTail : [];
+  const tail = presenceIps(id);
 
   // Legend: unique IPs (limit)
   const uniq = [];
@@ -757,6 +1096,8 @@ function openDrawer(id){
         <div class="k">Name</div><div>${esc(d.name||'')}</div>
         <div class="k">Hostname</div><div>${esc(d.hostname||'')}</div>
         <div class="k">Vendor</div><div>${esc(d.vendor||'')}</div>
+        ${d.vendor_class ? `<div class="k">DHCP class</div><div>${esc(d.vendor_class)}</div>` : ''}
+        ${d.seen_passive && !d.seen_arp ? `<div class="k">Seen</div><div class="muted">passively only (ARP/DHCP/mDNS traffic)</div>` : ''}
         <div class="k">mDNS hostnames</div><div>${esc(mdnsH||'–')}</div>
         <div class="k">mDNS services</div><div>${esc(mdnsS||'–')}</div>
       </div>
@@ -773,6 +1114,7 @@ function openDrawer(id){
     <div class="section">
       <div class="section__title">Exposure</div>
       <div class="kv">
+        ${d.details_stale ? `<div class="k">As of</div><div class="muted">${esc(d.details_ts ? `full scan ${d.details_ts}` : 'not port-scanned yet')} (discovery-only update)</div>` : ''}
         <div class="k">Open ports</div><div><pre class="snip"><code>${esc(ports||'(none)')}</code></pre></div>
         <div class="k">Web</div><div><pre class="snip"><code>${esc(web||'(none)')}</code></pre></div>
       </div>
@@ -788,6 +1130,11 @@ function openDrawer(id){
       <pre class="snip"><code>${esc(flags)}</code></pre>
     </div>
 
+    ${anomalies ? `<div class="section">
+      <div class="section__title">Anomalies (this scan)</div>
+      <pre class="snip"><code>${esc(anomalies)}</code></pre>
+    </div>` : ''}
+
     <div class="section">
       <div class="section__title">Override snippet (copy/paste into overrides.json)</div>
       <pre class="snip"><code>${esc(snippet)}</code></pre>
@@ -802,19 +1149,21 @@ function openDrawer(id){
 }
 
 async function load(){
-  const [a,b,c,d] = await Promise.all([
+  const [a,b,c,d,e] = await Promise.all([
     fetch('/latest.json', {cache:'no-store'}).catch(()=>null),
     fetch('/history.json', {cache:'no-store'}).catch(()=>null),
     fetch('/device_stats.json', {cache:'no-store'}).catch(()=>null),
     fetch('/app/learn/lessons.json', {cache:'no-store'}).catch(()=>null),
+    fetch('/presence.json', {cache:'no-store'}).catch(()=>null),
   ]);
 
   if(a){ latest = await a.json(); }
   if(b){ history = await b.json(); }
   if(c && c.ok){ deviceStats = await c.json(); }
   if(d && d.ok){ lessons = await d.json(); }
+  if(e && e.ok){ presence = decodePresence(await e.json()); }
 
-  $('#lastUpdated').innerHTML = latest ? `Updated <b>${esc(latest.timestamp_human||'')}</b><div class="muted small">Subnet: ${esc(latest.subnet||'')}</div>` : 'Failed to load latest';
+  $('#lastUpdated').innerHTML = latest ? `Updated <b>${esc(latest.timestamp_human||'')}</b>${latest.mode === 'discovery' ? ' <span class="muted small">(discovery)</span>' : ''}<div class="muted small">Subnet: ${esc(latest.subnet||'')}</div>` : 'Failed to load latest';
 
   // populate type filter
   const types = new Set((latest.devices||[]).map(d=>d.type||'unknown'));
@@ -845,15 +1194,22 @@ $$('.nav__item').forEach(btn => btn.addEventListener('click', ()=>{
   location.hash = '#'+btn.dataset.route;
 }));
 window.addEventListener('hashchange', ()=>{ closeNav(); closeDrawer(); render(); });
-$('#search').addEventListener('input', ()=>{
+$('#search').addEventListener('input', debounce(()=>{
   // If user is searching, jump to Devices view so results are obvious.
   const q = ($('#search').value || '').trim();
-  if(q && route() !== 'devices') {
+  if(q && route() !== 'devices' && route() !== 'timeline') {
     location.hash = '#devices';
     return;
   }
   closeDrawer();
   render();
+}, 150));
+$('#content').addEventListener('scroll', ()=>{
+  if(route() === 'devices') scheduleDevicesPaint();
+}, {passive:true});
+window.addEventListener('resize', ()=>{
+  if(route() === 'devices') scheduleDevicesPaint();
+  if(route() === 'timeline') scheduleHeatmapDraw();
 });
 $('#filterType').addEventListener('change', ()=>{
   // Filters are most meaningful on the inventory view.
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""Keyframe + delta encoding of state/<ts>.json snapshots.
+
+Consecutive scans are nearly identical, so most snapshots are stored as a
+delta against the previous one; every NW_SNAPSHOT_KEYFRAME_EVERY-th is a
+keyframe (a plain full snapshot, the historical format, so old files read as
+keyframes unchanged). A delta file keeps the small top-level fields
+(timestamp, subnet, diff, metrics, ...) in full and replaces "devices" with
+
+    "_delta": {"v": 1, "base": "<previous ts>",
+               "add":   {id: device},            new devices
+               "set":   {id: {field: value}},    changed fields
+               "unset": {id: [field, ...]},      dropped fields
+               "del":   [id, ...],               devices no longer present
+               "order": [id, ...]}               only when the order changed
+
+Readers go through load() / load_at() / iter_snapshots() / load_last(),
+which rebuild snapshots from the nearest keyframe. Reconstructed snapshots
+share unchanged device dicts with their predecessors: treat them as
+read-only. Deleting a keyframe orphans the deltas up to the next keyframe;
+retention must drop whole chains (oldest first).
+
+    python3 snapshot_store.py reencode --state state/   # convert existing full snapshots
+"""
+import argparse
+import glob
+import json
+import os
+import re
+
+from fsutil import atomic_write_json, read_json
+
+TS_FILE_RE = re.compile(r'^(\d{8}T\d{6}Z)\.json$')
+DELTA_KEY = '_delta'
+KEYFRAME_EVERY = 24
+
+
+def keyframe_every():
+    try:
+        return max(1, int(os.environ.get('NW_SNAPSHOT_KEYFRAME_EVERY', '') or KEYFRAME_EVERY))
+    except ValueError:
+        return KEYFRAME_EVERY
+
+
+def snapshot_path(state_dir, ts):
+    return os.path.join(state_dir, f'{ts}.json')
+
+
+def list_ts(state_dir):
+    """Timestamps of the stored snapshots, oldest first."""
+    try:
+        names = os.listdir(state_dir)
+    except OSError:
+        return []
+    return sorted(m.group(1) for m in map(TS_FILE_RE.match, names) if m)
+
+
+def encode_delta(prev, snap):
+    """Delta record turning snapshot prev into snap."""
+    old = {d['id']: d for d in prev.get('devices', []) or [] if d.get('id')}
+    new_order = [d['id'] for d in snap.get('devices', []) or [] if d.get('id')]
+    add, set_, unset = {}, {}, {}
+    for d in snap.get('devices', []) or []:
+        did = d.get('id')
+        if not did:
+            continue
+        o = old.get(did)
+        if o is None:
+            add[did] = d
+            continue
+        if o == d:
+            continue
+        changed = {k: v for k, v in d.items() if k not in o or o[k] != v}
+        gone = [k for k in o if k not in d]
+        if changed:
+            set_[did] = changed
+        if gone:
+            unset[did] = gone
+    delta = {'v': 1, 'base': prev.get('timestamp_utc', '')}
+    if add:
+        delta['add'] = add
+    if set_:
+        delta['set'] = set_
+    if unset:
+        delta['unset'] = unset
+    present = set(new_order)
+    removed = [did for did in old if did not in present]
+    if removed:
+        delta['del'] = removed
+    # order apply_delta() would produce on its own: survivors, then additions
+    if [did for did in old if did in present] + list(add) != new_order:
+        delta['order'] = new_order
+    return delta
+
+
+def apply_delta(prev, record):
+    """Snapshot from its predecessor and a delta file's content."""
+    delta = record[DELTA_KEY]
+    devices = {d['id']: d for d in prev.get('devices', []) or [] if d.get('id')}
+    order = [d['id'] for d in prev.get('devices', []) or [] if d.get('id')]
+    for did in delta.get('del', []):
+        devices.pop(did, None)
+    for did, fields in delta.get('set', {}).items():
+        if did in devices:
+            devices[did] = dict(devices[did], **fields)
+    for did, fields in delta.get('unset', {}).items():
+        if did in devices:
+            devices[did] = {k: v for k, v in devices[did].items() if k not in fields}
+    devices.update(delta.get('add', {}))
+    if 'order' in delta:
+        order = delta['order']
+    else:
+        order = [did for did in order if did in devices] + list(delta.get('add', {}))
+    snap = {k: v for k, v in record.items() if k != DELTA_KEY}
+    snap['devices'] = [devices[did] for did in order if did in devices]
+    return snap
+
+
+def is_delta(record):
+    return isinstance(record, dict) and isinstance(record.get(DELTA_KEY), dict)
+
+
+def load(state_dir, ts, _cache=None):
+    """Reconstructed snapshot for ts, or None if it (or its chain) is missing."""
+    chain = []
+    cur = ts
+    while True:
+        if _cache is not None and cur in _cache:
+            snap = _cache[cur]
+            break
+        record = read_json(snapshot_path(state_dir, cur))
+        if not isinstance(record, dict):
+            return None
+        if not is_delta(record):
+            snap = record
+            break
+        chain.append(record)
+        cur = record[DELTA_KEY].get('base', '')
+        if not cur or len(chain) > 10000:
+            return None
+    for record in reversed(chain):
+        snap = apply_delta(snap, record)
+    return snap
+
+
+def load_at(state_dir, when):
+    """Newest snapshot taken at or before ts `when`."""
+    tss = [t for t in list_ts(state_dir) if t <= when]
+    return load(state_dir, tss[-1]) if tss else None
+
+
+def iter_snapshots(state_dir, tss=None):
+    """Yield reconstructed snapshots for tss (default: all), oldest first,
+    applying deltas incrementally instead of rebuilding each from its keyframe."""
+    cache = {}
+    for ts in (list_ts(state_dir) if tss is None else tss):
+        snap = load(state_dir, ts, cache)
+        if snap is None:
+            continue
+        cache.clear()
+        cache[ts] = snap
+        yield snap
+
+
+def load_last(state_dir, n):
+    return list(iter_snapshots(state_dir, list_ts(state_dir)[-n:] if n > 0 else []))
+
+
+def write_snapshot(state_dir, snap, every=None):
+    """Store snap (a full snapshot dict) as a keyframe or as a delta against
+    the newest older snapshot. Returns 'keyframe' or 'delta'.
+
+    Replacing a stored ts (render.py re-run for it) re-encodes the newer
+    deltas up to the next keyframe, whose chains decode through it."""
+    every = every or keyframe_every()
+    ts = snap['timestamp_utc']
+    dependents = []
+    if os.path.exists(snapshot_path(state_dir, ts)):
+        chain = []
+        for t in (t for t in list_ts(state_dir) if t > ts):
+            if not is_delta(read_json(snapshot_path(state_dir, t))):
+                break
+            chain.append(t)
+        dependents = list(iter_snapshots(state_dir, chain))
+    kind = _store(state_dir, snap, every)
+    for newer in dependents:
+        _store(state_dir, newer, every)
+    return kind
+
+
+def _store(state_dir, snap, every):
+    ts = snap['timestamp_utc']
+    older = [t for t in list_ts(state_dir) if t < ts]
+    since_key = 0
+    prev = None
+    if older:
+        # distance to the last keyframe, from the delta chain
+        cur = older[-1]
+        while since_key < every:
+            record = read_json(snapshot_path(state_dir, cur))
+            if not is_delta(record):
+                break
+            since_key += 1
+            cur = record[DELTA_KEY].get('base', '')
+        prev = load(state_dir, older[-1]) if since_key + 1 < every else None
+    if prev is None:
+        atomic_write_json(snapshot_path(state_dir, ts), snap, separators=(',', ':'))
+        return 'keyframe'
+    record = {k: v for k, v in snap.items() if k != 'devices'}
+    record[DELTA_KEY] = encode_delta(prev, snap)
+    atomic_write_json(snapshot_path(state_dir, ts), record, separators=(',', ':'))
+    return 'delta'
+
+
+def reencode(state_dir, every=None):
+    """Rewrite all stored snapshots as keyframe + delta chains; returns (before, after) bytes."""
+    before = after = 0
+    snaps = list(iter_snapshots(state_dir))
+    for ts in list_ts(state_dir):
+        before += os.path.getsize(snapshot_path(state_dir, ts))
+    for ts in list_ts(state_dir):
+        os.replace(snapshot_path(state_dir, ts), snapshot_path(state_dir, ts) + '.bak')
+    try:
+        for snap in snaps:
+            write_snapshot(state_dir, snap, every)
+    except BaseException:
+        for bak in glob.glob(os.path.join(state_dir, '*.json.bak')):
+            os.replace(bak, bak[:-4])
+        raise
+    for bak in glob.glob(os.path.join(state_dir, '*.json.bak')):
+        os.unlink(bak)
+    for ts in list_ts(state_dir):
+        after += os.path.getsize(snapshot_path(state_dir, ts))
+    return before, after
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest='cmd', required=True)
+    r = sub.add_parser('reencode', help='convert existing snapshots to keyframes + deltas')
+    r.add_argument('--state', required=True)
+    args = ap.parse_args()
+    before, after = reencode(args.state)
+    print(json.dumps({'bytesBefore': before, 'bytesAfter': after}))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,34 @@
 #!/usr/bin/env python3
+"""SSDP discovery (M-SEARCH) for enrich.py.
+
+SsdpCollector sends staggered searches for several targets (ssdp:all, then
+upnp:rootdevice and DIAL, then ssdp:all again for devices that dropped the
+first packet), waits on a selector and stops once every search is out, the
+last one's MX window has passed (devices may delay their answer by up to MX
+seconds) and no new (st, usn) has arrived for `quiet` seconds, or at the
+deadline.
+Responses are de-duplicated per IP with a set, so chatty media servers
+answering dozens of times cost O(1) each.
+
+    by_ip = SsdpCollector().run(timeout=2.0)   # {ip: [{st, server, location, usn, bootid, configid}]}
+    python3 ssdp_probe.py --timeout 2            # same, as JSON on stdout
+"""
 import argparse
+import json
+import selectors
 import socket
 import time
-import re
 
 MCAST_GRP = '239.255.255.250'
 MCAST_PORT = 1900
+# (delay in seconds, search target)
+SEARCHES = (
+    (0.0, 'ssdp:all'),
+    (0.2, 'upnp:rootdevice'),
+    (0.4, 'urn:dial-multiscreen-org:service:dial:1'),
+    (0.8, 'ssdp:all'),
+)
+MAX_ROWS_PER_IP = 64
 
 
 def parse_headers(pkt: str):
@@ -17,69 +40,101 @@ def parse_headers(pkt: str):
     return hdrs
 
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument('--timeout', type=float, default=2.0)
-    ap.add_argument('--mx', type=int, default=1)
-    args = ap.parse_args()
-
-    msg = (
+def msearch(st, mx=1):
+    return (
         'M-SEARCH * HTTP/1.1\r\n'
         f'HOST: {MCAST_GRP}:{MCAST_PORT}\r\n'
         'MAN: "ssdp:discover"\r\n'
-        f'MX: {args.mx}\r\n'
-        'ST: ssdp:all\r\n'
+        f'MX: {mx}\r\n'
+        f'ST: {st}\r\n'
         '\r\n'
     ).encode('utf-8')
 
-    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
-    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-    s.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
-    s.settimeout(0.2)
-
-    try:
-        s.sendto(msg, (MCAST_GRP, MCAST_PORT))
-    except Exception:
-        pass
 
-    end = time.time() + args.timeout
-    by_ip = {}
+class SsdpCollector:
+    def __init__(self, searches=SEARCHES, mx=1, iface_ip=''):
+        self.searches = searches
+        self.mx = mx
+        self.iface_ip = iface_ip
+        self.by_ip = {}
+        self.seen = set()   # (ip, st, usn)
+        self.responses = 0
 
-    while time.time() < end:
-        try:
-            data, addr = s.recvfrom(65535)
-        except socket.timeout:
-            continue
-        except Exception:
-            break
-
-        ip = addr[0]
-        text = data.decode('utf-8', 'ignore')
-        hdrs = parse_headers(text)
+    def handle(self, data, ip):
+        """Record one response; True if it was new."""
+        self.responses += 1
+        hdrs = parse_headers(data.decode('utf-8', 'ignore'))
         st = hdrs.get('st') or hdrs.get('nt')
-        usn = hdrs.get('usn')
         server = hdrs.get('server')
         location = hdrs.get('location')
         if not st and not server and not location:
-            continue
-        # shrink
+            return False
         item = {
             'st': (st or '')[:160],
             'server': (server or '')[:200],
             'location': (location or '')[:240],
-            'usn': (usn or '')[:240],
+            'usn': (hdrs.get('usn') or '')[:240],
+            'bootid': hdrs.get('bootid.upnp.org', '')[:16],
+            'configid': hdrs.get('configid.upnp.org', '')[:16],
         }
-        by_ip.setdefault(ip, [])
-        # de-dup by st+usn
-        key = (item['st'], item['usn'])
-        seen = {(x.get('st'), x.get('usn')) for x in by_ip[ip]}
-        if key not in seen:
-            by_ip[ip].append(item)
-
-    # Print as a simple, parseable format (JSON-ish without importing json for speed)
-    # We'll rely on enrich.py calling this and parsing stdout as JSON.
-    import json
-    print(json.dumps({'ssdp': by_ip}, indent=2))
+        key = (ip, item['st'], item['usn'])
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+        rows = self.by_ip.setdefault(ip, [])
+        if len(rows) < MAX_ROWS_PER_IP:
+            rows.append(item)
+        return True
+
+    def run(self, timeout=2.0, quiet=0.8, dest=(MCAST_GRP, MCAST_PORT)):
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        s.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 2)
+        if self.iface_ip:
+            s.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(self.iface_ip))
+        s.setblocking(False)
+        sel = selectors.DefaultSelector()
+        sel.register(s, selectors.EVENT_READ)
+        start = time.monotonic()
+        deadline = start + timeout
+        pending = sorted(self.searches)
+        idle_since = last_sent = start
+        try:
+            while True:
+                now = time.monotonic()
+                while pending and now - start >= pending[0][0]:
+                    try:
+                        s.sendto(msearch(pending.pop(0)[1], self.mx), dest)
+                    except OSError:
+                        pass
+                    idle_since = last_sent = now
+                settled = max(idle_since + quiet, last_sent + self.mx)
+                if now >= deadline or (not pending and now >= settled):
+                    break
+                wake = min(deadline, start + pending[0][0] if pending else settled)
+                for _key, _ in sel.select(max(0.0, wake - now)):
+                    while True:
+                        try:
+                            data, addr = s.recvfrom(65535)
+                        except OSError:   # drained (EAGAIN) or socket error
+                            break
+                        if self.handle(data, addr[0]):
+                            idle_since = time.monotonic()
+        finally:
+            sel.close()
+            s.close()
+        return self.by_ip
+
+
+def collect(timeout=2.0, mx=1, iface_ip=''):
+    return SsdpCollector(mx=mx, iface_ip=iface_ip).run(timeout=timeout)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--timeout', type=float, default=2.0)
+    ap.add_argument('--mx', type=int, default=1)
+    args = ap.parse_args()
+    print(json.dumps({'ssdp': collect(args.timeout, args.mx)}, indent=2))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""Per-stage timing/resource metrics for scan.sh.
+
+    stage_metrics.py run --root R --ts TS --stage nmap_top [--out FILE]... \
+        [--count hosts=FILE[:REGEX]]... -- cmd args...
+
+runs one pipeline stage as a child (stdin/stdout/stderr inherited, exit code
+passed through) and appends a record to logs/<ts>_metrics.jsonl: wall and CPU
+seconds, peak RSS, exit code, bytes written to --out files, counters taken
+from output files (--count) and counters the stage reported itself via
+report() (targets processed, timeouts hit, ...). With NW_PROFILE set, Python
+stages run under profiling.py and the record gains a "profile" summary.
+
+    stage_metrics.py finalize --root R --ts TS [--cycle-start EPOCH]
+
+folds the cycle's records into the snapshot (state/<ts>.json, latest.json,
+site/latest.json under "metrics") and the rolling state/metrics.json, which
+is published as site/metrics.json and as Prometheus text by serve.py.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+from fsutil import atomic_write_text
+
+STATS_ENV = 'NW_STAGE_STATS'
+
+
+def report(**counters):
+    """Called by Python stages to attach counters to their metrics record.
+    Repeated calls merge (the profiler adds its summary next to the stage's own)."""
+    path = os.environ.get(STATS_ENV)
+    if not path:
+        return
+    merged = {}
+    try:
+        with open(path, 'r') as f:
+            merged = json.load(f)
+    except (OSError, ValueError):
+        pass
+    merged.update(counters)
+    try:
+        with open(path, 'w') as f:
+            json.dump(merged, f)
+    except OSError:
+        pass
+
+
+def metrics_log(root, ts):
+    return os.path.join(root, 'logs', f'{ts}_metrics.jsonl')
+
+
+def count_in(spec):
+    """'name=path[:regex]' -> (name, matching line count)."""
+    name, _, rest = spec.partition('=')
+    path, _, pattern = rest.partition(':')
+    rx = re.compile(pattern) if pattern else None
+    n = 0
+    try:
+        with open(path, 'r', errors='replace') as f:
+            for line in f:
+                if line.strip() and (rx is None or rx.search(line)):
+                    n += 1
+    except OSError:
+        pass
+    return name, n
+
+
+def profiled_command(cmd, root, ts, stage):
+    """With NW_PROFILE set, run Python script stages under profiling.py."""
+    from profiling import profile_mode
+    mode = profile_mode()
+    if not mode or len(cmd) < 2 or not os.path.basename(cmd[0]).startswith('python') or not cmd[1].endswith('.py'):
+        return cmd
+    here = os.path.dirname(os.path.abspath(__file__))
+    prefix = os.path.join(root, 'logs', f'{ts}_{stage}')
+    return [cmd[0], os.path.join(here, 'profiling.py'), '--mode', mode, '--out-prefix', prefix, '--'] + cmd[1:]
+
+
+def run_stage(args, cmd):
+    cmd = profiled_command(cmd, args.root, args.ts, args.stage)
+    fd, stats_path = tempfile.mkstemp(prefix='nw_stage_', suffix='.json')
+    os.close(fd)
+    env = dict(os.environ, **{STATS_ENV: stats_path})
+
+    t0 = time.time()
+    child = subprocess.Popen(cmd, env=env)
+    _, status, ru = os.wait4(child.pid, 0)
+    wall = time.time() - t0
+    child.returncode = rc = os.waitstatus_to_exitcode(status)
+
+    rec = {
+        'stage': args.stage,
+        'start': round(t0, 3),
+        'wallSeconds': round(wall, 3),
+        'cpuSeconds': round(ru.ru_utime + ru.ru_stime, 3),
+        'peakRssBytes': int(ru.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)),
+        'exitCode': rc,
+        'bytesWritten': sum(os.path.getsize(path) for path in (args.out or []) if os.path.isfile(path)),
+    }
+    for spec in args.count or []:
+        name, n = count_in(spec)
+        rec[name] = n
+    try:
+        with open(stats_path, 'r') as f:
+            reported = json.load(f)
+        if isinstance(reported, dict):
+            rec.update({k: v for k, v in reported.items() if k not in rec})
+    except (OSError, ValueError):
+        pass
+    finally:
+        os.unlink(stats_path)
+
+    os.makedirs(os.path.join(args.root, 'logs'), exist_ok=True)
+    with open(metrics_log(args.root, args.ts), 'a') as f:
+        f.write(json.dumps(rec) + '\n')
+    return rc
+
+
+def load_records(root, ts):
+    stages = {}
+    try:
+        with open(metrics_log(root, ts), 'r') as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                stages[rec.pop('stage', '?')] = rec
+    except OSError:
+        pass
+    return stages
+
+
+def load_rolling(state_dir):
+    try:
+        with open(os.path.join(state_dir, 'metrics.json'), 'r') as f:
+            obj = json.load(f)
+        if isinstance(obj, dict) and obj.get('version') == 1:
+            return obj
+    except Exception:
+        pass
+    return {'version': 1, 'latest': None, 'history': []}
+
+
+def add_to_json(path, key, value, **dump_kw):
+    try:
+        with open(path, 'r') as f:
+            obj = json.load(f)
+    except Exception:
+        return
+    if not isinstance(obj, dict):
+        return
+    obj[key] = value
+    atomic_write_text(path, json.dumps(obj, **(dump_kw or {'indent': 2})))
+
+
+def finalize(root, ts, cycle_start=None, keep=168):
+    state = os.path.join(root, 'state')
+    site = os.path.join(root, 'site')
+    stages = load_records(root, ts)
+    cycle = {
+        'ts': ts,
+        'cycleSeconds': round(time.time() - cycle_start, 3) if cycle_start else round(sum(s.get('wallSeconds', 0) for s in stages.values()), 3),
+        'stages': stages,
+    }
+
+    # state/<ts>.json keeps snapshot_store's compact encoding (the record may be a delta)
+    add_to_json(os.path.join(state, f'{ts}.json'), 'metrics', cycle, separators=(',', ':'))
+    for path in (os.path.join(state, 'latest.json'), os.path.join(site, 'latest.json')):
+        add_to_json(path, 'metrics', cycle)
+
+    rolling = load_rolling(state)
+    rolling['history'] = [h for h in rolling['history'] if h.get('ts') != ts]
+    rolling['history'].append({
+        'ts': ts,
+        'cycleSeconds': cycle['cycleSeconds'],
+        'stages': {k: v.get('wallSeconds', 0) for k, v in stages.items()},
+    })
+    del rolling['history'][:-keep]
+    rolling['latest'] = cycle
+    blob = json.dumps(rolling, separators=(',', ':'))
+    atomic_write_text(os.path.join(state, 'metrics.json'), blob)
+    atomic_write_text(os.path.join(site, 'metrics.json'), blob)
+    return rolling
+
+
+PROM_FIELDS = (
+    ('wallSeconds', 'nw_stage_wall_seconds', 'Wall-clock time of the stage in the last cycle'),
+    ('cpuSeconds', 'nw_stage_cpu_seconds', 'User+system CPU time of the stage in the last cycle'),
+    ('peakRssBytes', 'nw_stage_peak_rss_bytes', 'Peak resident set size of the stage process'),
+    ('exitCode', 'nw_stage_exit_code', 'Exit code of the stage'),
+    ('bytesWritten', 'nw_stage_bytes_written', 'Bytes written to the stage output files'),
+    ('hosts', 'nw_stage_hosts', 'Hosts processed by the stage'),
+    ('targets', 'nw_stage_targets', 'Targets processed by the stage'),
+    ('timeouts', 'nw_stage_timeouts', 'Timeouts hit by the stage'),
+)
+
+
+def prom_escape(v):
+    return str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text(rolling):
+    """Prometheus text exposition (version 0.0.4) of the latest cycle."""
+    latest = (rolling or {}).get('latest') or {}
+    stages = latest.get('stages') or {}
+    lines = [
+        '# HELP nw_cycle_seconds Duration of the last scan cycle',
+        '# TYPE nw_cycle_seconds gauge',
+        f"nw_cycle_seconds {latest.get('cycleSeconds', 0)}",
+    ]
+    for field, metric, help_text in PROM_FIELDS:
+        rows = [(name, rec[field]) for name, rec in sorted(stages.items()) if isinstance(rec.get(field), (int, float))]
+        if not rows:
+            continue
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} gauge')
+        for name, value in rows:
+            lines.append(f'{metric}{{stage="{prom_escape(name)}"}} {value}')
+
+    # NW_PROFILE runs: sampled self time of each stage's top functions
+    rows = [(name, r) for name, rec in sorted(stages.items()) for r in ((rec.get('profile') or {}).get('topSampled') or [])]
+    if rows:
+        lines.append('# HELP nw_profile_self_percent Share of profiler samples with the function on top of the stack')
+        lines.append('# TYPE nw_profile_self_percent gauge')
+        for name, r in rows:
+            lines.append(f'nw_profile_self_percent{{stage="{prom_escape(name)}",func="{prom_escape(r["func"])}"}} {r["selfPct"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest='cmd', required=True)
+    r = sub.add_parser('run')
+    r.add_argument('--root', required=True)
+    r.add_argument('--ts', required=True)
+    r.add_argument('--stage', required=True)
+    r.add_argument('--out', action='append', help='output file whose size counts as bytes written')
+    r.add_argument('--count', action='append', help='name=path[:regex] lines to count after the run')
+    r.add_argument('command', nargs=argparse.REMAINDER)
+    f = sub.add_parser('finalize')
+    f.add_argument('--root', required=True)
+    f.add_argument('--ts', required=True)
+    f.add_argument('--cycle-start', type=float)
+    args = ap.parse_args()
+
+    if args.cmd == 'run':
+        cmd = args.command[1:] if args.command[:1] == ['--'] else args.command
+        if not cmd:
+            ap.error('missing command after --')
+        sys.exit(run_stage(args, cmd))
+    keep = int(os.environ.get('NW_METRICS_HISTORY', '168') or 168)
+    finalize(args.root, args.ts, args.cycle_start, keep=keep)
+
+
+if __name__ == '__main__':
+    main()
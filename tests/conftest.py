@@ -0,0 +1,5 @@
+import pathlib
+import sys
+
+# The pipeline modules live at the repo root next to scan.sh.
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
@@ -0,0 +1,132 @@
+import json
+
+import alert_engine
+from alert_engine import enqueue_events, format_message, route_events, run_once
+from change_detect import detect_changes, empty_tracker, seed
+
+
+def dev(did, ports=()):
+    return {'id': did, 'mac': did, 'ip': '192.168.1.' + did[-1], 'name': '', 'vendor': 'Acme',
+            'open_ports': [{'port': p} for p in ports]}
+
+
+def scan(ts, devices, known=()):
+    """Change events for one scan, with `known` devices already tracked."""
+    tracker = empty_tracker()
+    seed(tracker, {'timestamp_utc': '0', 'devices': list(known)})
+    return detect_changes(tracker, ts, devices)
+
+
+def write_cfg(state, cfg):
+    (state / 'alerts.json').write_text(json.dumps(cfg))
+
+
+def test_rules_route_to_sinks():
+    cfg = {
+        'sinks': {'a': {'type': 'file'}, 'b': {'type': 'file'}},
+        'rules': [{'kinds': ['new'], 'sinks': ['a']},
+                  {'kinds': ['port_opened'], 'riskyOnly': True, 'sinks': ['b', 'missing']}],
+    }
+    evs = scan('2', [dev('aa:1', ['22/tcp', '8080/tcp']), dev('aa:2')], known=[dev('aa:1')])
+    routed = route_events(cfg, evs)
+    assert [e['kind'] for e in routed['a']] == ['new']
+    assert [e['port'] for e in routed['b']] == ['22/tcp']
+
+
+def test_batching_dedup_and_rate_limit(tmp_path):
+    state = tmp_path
+    write_cfg(state, {'rateLimitMinutes': 5, 'dedupMinutes': 60, 'sinks': {'log': {'type': 'file', 'path': 'out.log'}}})
+    new = scan('T1', [dev('aa:1')])
+
+    enqueue_events(str(state), new)
+    assert run_once(str(state), now=1000) == {'log': None}
+    lines = (state / 'out.log').read_text().splitlines()
+    assert len(lines) == 1 and 'New devices (1)' in json.loads(lines[0])['text']
+
+    # Within the rate limit: two scans' worth of events accumulate into one digest
+    enqueue_events(str(state), scan('T2', [dev('aa:2')]))
+    assert run_once(str(state), now=1060) == {}
+    enqueue_events(str(state), scan('T3', [dev('aa:3')]))
+    enqueue_events(str(state), new)  # repeat inside the dedup window is dropped
+    assert run_once(str(state), now=1400) == {'log': None}
+    lines = (state / 'out.log').read_text().splitlines()
+    assert len(lines) == 2
+    digest = json.loads(lines[1])
+    assert digest['events'] == 2 and '(2 scans)' in digest['text']
+
+
+def test_failed_sink_keeps_events_and_backs_off(tmp_path, monkeypatch):
+    monkeypatch.setattr(alert_engine.time, 'sleep', lambda s: None)
+    state = tmp_path
+    write_cfg(state, {'rateLimitMinutes': 0, 'sinks': {'bad': {'type': 'command', 'argv': ['false']}}})
+    enqueue_events(str(state), scan('T1', [dev('aa:1')]))
+
+    res = run_once(str(state), now=1000, log=lambda m: None)
+    assert res['bad'] is not None
+    pending = json.loads((state / 'alerts' / 'pending.json').read_text())['bad']
+    assert pending['attempts'] == 1 and len(pending['events']) == 1
+    assert pending['nextAttempt'] > 1000
+    # Not retried before nextAttempt
+    assert run_once(str(state), now=1000, log=lambda m: None) == {}
+
+
+def test_format_message_kinds():
+    known = [dev('aa:1', ['22/tcp']), dev('aa:2')]
+    moved = dict(dev('aa:2'), ip='192.168.1.50')
+    evs = scan('T1', [dev('aa:1', ['445/tcp']), moved, dev('aa:3')], known=known)
+    text = format_message(evs, dashboard_url='http://nw.lan/')
+    assert 'New devices (1):' in text
+    assert 'IP changes:\n- Acme (aa:2) @ 192.168.1.50 (was 192.168.1.2)' in text
+    assert "Risky port changes:\n- Acme (aa:1) @ 192.168.1.1 +['445/tcp'] -['22/tcp']" in text
+    assert text.endswith('Dashboard: http://nw.lan/')
+
+
+def test_two_anomalies_for_one_device_both_reach_the_digest(tmp_path):
+    state = tmp_path
+    write_cfg(state, {'rateLimitMinutes': 0, 'sinks': {'log': {'type': 'file', 'path': 'out.log'}}})
+    enqueue_events(str(state), [
+        {'kind': 'anomaly', 'ts': 'T1', 'id': 'aa:1', 'device': dev('aa:1'), 'port': None, 'risky': False,
+         'anomaly': what, 'score': 0.9, 'detail': ''}
+        for what in ('unusual_hour', 'ip_unstable')
+    ])
+    assert run_once(str(state), now=1000) == {'log': None}
+    assert json.loads((state / 'out.log').read_text().splitlines()[0])['events'] == 2
+
+
+def test_pending_slots_of_removed_sinks_are_dropped(tmp_path, monkeypatch):
+    monkeypatch.setattr(alert_engine.time, 'sleep', lambda s: None)
+    state = tmp_path
+    write_cfg(state, {'rateLimitMinutes': 0, 'sinks': {'gone': {'type': 'command', 'argv': ['false']},
+                                                       'log': {'type': 'file', 'path': 'out.log'}}})
+    enqueue_events(str(state), scan('T1', [dev('aa:1')]))
+    run_once(str(state), now=1000, log=lambda m: None)
+    assert json.loads((state / 'alerts' / 'pending.json').read_text())['gone']['events']
+
+    write_cfg(state, {'rateLimitMinutes': 0, 'sinks': {'log': {'type': 'file', 'path': 'out.log'}}})
+    run_once(str(state), now=2000)
+    assert set(json.loads((state / 'alerts' / 'pending.json').read_text())) == {'log'}
+
+
+def test_claimed_outbox_survives_a_crash_before_pending_is_saved(tmp_path, monkeypatch):
+    state = tmp_path
+    write_cfg(state, {'rateLimitMinutes': 0, 'sinks': {'log': {'type': 'file', 'path': 'out.log'}}})
+    enqueue_events(str(state), scan('T1', [dev('aa:1')]))
+
+    def crash(state_dir, pending):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(alert_engine, 'save_pending', crash)
+    try:
+        run_once(str(state), now=1000)
+    except OSError:
+        pass
+    assert list((state / 'alerts').glob('outbox.*.draining'))
+    monkeypatch.undo()
+
+    # a drain that died elsewhere (pid not running) is recovered too
+    (state / 'alerts' / 'outbox.999999999.1.draining').write_text(
+        json.dumps(scan('T2', [dev('aa:2')])[0]) + '\n')
+    assert run_once(str(state), now=1060) == {'log': None}
+    digest = json.loads((state / 'out.log').read_text().splitlines()[0])
+    assert digest['events'] == 2
+    assert not list((state / 'alerts').glob('outbox.*'))
@@ -0,0 +1,45 @@
+from alert_state import empty_state, observe, snooze
+
+
+def ev(kind='gone', did='aa:1', port=None):
+    return {'kind': kind, 'id': did, 'port': port}
+
+
+def test_cooldown_and_counts():
+    st = empty_state()
+    cfg = {'dedupMinutes': 60, 'cooldowns': {'port_opened': 5}}
+    assert observe(st, cfg, ev(), 0)
+    # flapping device: suppressed inside the cooldown, counted
+    assert not observe(st, cfg, ev(), 600)
+    assert not observe(st, cfg, ev(), 1200)
+    e = ev()
+    assert observe(st, cfg, e, 3600)
+    assert e['count'] == 3
+    rec = st['keys']['gone|aa:1|']
+    assert rec['first'] == 0 and rec['count'] == 4 and rec['notified'] == 3600
+
+    # per-kind cooldown and independent keys
+    assert observe(st, cfg, ev('port_opened', port='22/tcp'), 0)
+    assert observe(st, cfg, ev('port_opened', port='445/tcp'), 0)
+    assert observe(st, cfg, ev('port_opened', port='22/tcp'), 300)
+
+
+def test_snooze_device_and_key():
+    st = empty_state()
+    snooze(st, 'aa:1', 1000)
+    snooze(st, 'new|aa:2|', 1000)
+    assert not observe(st, {}, ev('new', 'aa:1'), 10)
+    assert not observe(st, {}, ev('new', 'aa:2'), 10)
+    assert observe(st, {}, ev('gone', 'aa:2'), 10)
+    assert observe(st, {}, ev('new', 'aa:1'), 1001)
+
+
+def test_anomaly_subtypes_have_their_own_keys():
+    st = empty_state()
+    hour = dict(ev('anomaly'), anomaly='unusual_hour')
+    ip = dict(ev('anomaly'), anomaly='ip_unstable')
+    assert observe(st, {}, hour, 0)
+    assert observe(st, {}, ip, 10)
+    assert not observe(st, {}, dict(hour), 20)
+    snooze(st, 'anomaly|aa:1||unusual_hour', 5000)
+    assert observe(st, {}, dict(ip), 4000) and not observe(st, {}, dict(hour), 4000)
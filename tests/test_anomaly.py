@@ -0,0 +1,39 @@
+from anomaly import WARMUP_SCANS, empty_model, update
+
+
+def dev(ip='10.0.0.5', ports=('631/tcp',)):
+    return {'id': 'aa:1', 'mac': 'aa:1', 'ip': ip, 'vendor': 'PrintCo', 'open_ports': [{'port': p} for p in ports]}
+
+
+def ts(i):
+    return f'202602{1 + i // 24:02d}T{i % 24:02d}0000Z'
+
+
+def what(flags):
+    return sorted((f['anomaly'], f['port']) for f in flags)
+
+
+def test_port_and_ip_baseline():
+    m = empty_model()
+    for i in range(WARMUP_SCANS):
+        assert update(m, ts(i), [dev()], hour=i % 24) == []
+    # a printer suddenly exposing SSH on a new address
+    flags = update(m, ts(WARMUP_SCANS), [dev('10.0.0.99', ('631/tcp', '22/tcp'))], hour=0)
+    assert what(flags) == [('ip_unstable', None), ('port_baseline', '22/tcp')]
+    assert flags[0]['kind'] == 'anomaly' and [f['risky'] for f in flags if f['port']] == [True]
+    # re-render of the same scan returns the same flags; the next scan has learned
+    assert update(m, ts(WARMUP_SCANS), [], hour=0) == flags
+    assert update(m, ts(WARMUP_SCANS + 1), [dev('10.0.0.99', ('631/tcp', '22/tcp'))], hour=1) == []
+
+
+def test_unusual_hour():
+    m = empty_model()
+    other = {'id': 'bb:1', 'ip': '10.0.0.7'}
+    # present during the day, offline at 03:00 for a week
+    for day in range(8):
+        for hour in (3, 12):
+            devices = [other] + ([dev()] if hour == 12 else [])
+            update(m, f'202602{day + 1:02d}T{hour:02d}0000Z', devices, hour=hour)
+    flags = update(m, '20260210T030000Z', [other, dev()], hour=3)
+    assert what(flags) == [('unusual_hour', None)]
+    assert flags[0]['id'] == 'aa:1'
@@ -0,0 +1,23 @@
+import bench
+
+
+def test_small_case_runs_every_stage(tmp_path):
+    case = bench.run_case(5, 3, workdir=str(tmp_path), log=lambda m: None)
+    assert case['status'] == 'ok', case
+    assert set(case['stages']) == set(bench.STAGES)
+    assert set(case['stages']['parse']['detail']) >= {'parse_arp_scan', 'parse_nmap_top'}
+    assert all(s['seconds'] > 0 and s['peakRssMb'] > 0 for s in case['stages'].values())
+    assert list(tmp_path.iterdir()) == []  # fixtures cleaned up
+
+
+def test_compare_flags_regressions():
+    def results(render_s, rss):
+        return {'cases': [{'devices': 10, 'snapshots': 48, 'status': 'ok',
+                           'stages': {'render': {'seconds': render_s, 'peakRssMb': rss}}}]}
+
+    assert bench.compare(results(1.2, 50), results(1.0, 40)) == []
+    assert bench.compare(results(0.04, 40), results(0.01, 40)) == []  # below the noise floor
+    assert bench.compare(results(2.0, 90), results(1.0, 40)) == [
+        ('10x48', 'render', 'seconds', 1.0, 2.0),
+        ('10x48', 'render', 'peakRssMb', 40, 90),
+    ]
@@ -0,0 +1,72 @@
+from change_detect import detect_changes, diff_from_events, empty_tracker, seed, seed_history
+
+
+def dev(did, ip, ports=None):
+    return {'id': did, 'mac': did, 'ip': ip, 'vendor': 'Acme',
+            'open_ports': [{'port': p, 'version': v} for p, v in (ports or {}).items()]}
+
+
+def kinds(events):
+    return sorted((e['kind'], e['id'], e['port']) for e in events)
+
+
+def test_lifecycle_with_debounced_gone():
+    t = empty_tracker()
+    a, b = dev('aa:1', '10.0.0.1'), dev('aa:2', '10.0.0.2')
+    assert kinds(detect_changes(t, 'T1', [a, b])) == [('new', 'aa:1', None), ('new', 'aa:2', None)]
+    # one miss is not enough, and coming back after one miss is silent
+    assert detect_changes(t, 'T2', [a]) == []
+    assert detect_changes(t, 'T3', [a, b]) == []
+    assert detect_changes(t, 'T4', [a]) == []
+    assert kinds(detect_changes(t, 'T5', [a])) == [('gone', 'aa:2', None)]
+    assert detect_changes(t, 'T6', [a]) == []
+    evs = detect_changes(t, 'T7', [a, b])
+    assert kinds(evs) == [('returned', 'aa:2', None)]
+    assert diff_from_events(evs)['new_ids'] == ['aa:2']
+    assert t['devices']['aa:2']['first'] == 'T1'
+
+
+def test_rerender_is_idempotent():
+    t = empty_tracker()
+    seed(t, {'timestamp_utc': 'T1', 'devices': [dev('aa:1', '10.0.0.1')]})
+    first = detect_changes(t, 'T2', [dev('aa:1', '10.0.0.9')])
+    assert kinds(first) == [('ip_change', 'aa:1', None)] and first[0]['oldIp'] == '10.0.0.1'
+    assert detect_changes(t, 'T2', [dev('aa:1', '10.0.0.1')]) == first
+
+
+def test_ports_versions_and_conflicts():
+    t = empty_tracker()
+    seed(t, {'timestamp_utc': 'T1', 'devices': [dev('aa:1', '10.0.0.1', {'22/tcp': 'OpenSSH 8.9', '80/tcp': ''})]})
+    now = [dev('aa:1', '10.0.0.1', {'22/tcp': 'OpenSSH 9.6', '445/tcp': ''}), dev('aa:1', '10.0.0.7')]
+    evs = detect_changes(t, 'T2', now, claims=[('10.0.0.5', 'bb:1'), ('10.0.0.5', 'bb:2')])
+    assert kinds(evs) == [
+        ('conflict', 'aa:1', None), ('conflict', 'ip:10.0.0.5', None),
+        ('port_closed', 'aa:1', '80/tcp'), ('port_opened', 'aa:1', '445/tcp'),
+        ('version_change', 'aa:1', '22/tcp'),
+    ]
+    by_kind = {(e['kind'], e['id']): e for e in evs}
+    assert by_kind[('port_opened', 'aa:1')]['risky']
+    assert by_kind[('conflict', 'ip:10.0.0.5')]['ids'] == ['bb:1', 'bb:2']
+    assert by_kind[('conflict', 'aa:1')]['ips'] == ['10.0.0.1', '10.0.0.7']
+
+
+def test_seed_from_history_counts_trailing_full_scan_misses():
+    a, phone, tv = dev('aa:1', '10.0.0.1'), dev('aa:9', '10.0.0.9'), dev('aa:7', '10.0.0.7')
+    history = [{'timestamp_utc': 'T1', 'devices': [a, phone, tv]},
+               {'timestamp_utc': 'T2', 'devices': [a, phone]},
+               {'timestamp_utc': 'T3', 'devices': [a, phone]},
+               # ARP-only sweep: the sleeping phone is not a miss
+               {'timestamp_utc': 'T4', 'mode': 'discovery', 'devices': [a]}]
+    t = empty_tracker()
+    seed_history(t, history, gone_after=2)
+    assert t['lastTs'] == 'T4'
+    assert (t['devices']['aa:9']['state'], t['devices']['aa:9']['miss']) == ('present', 0)
+    assert t['devices']['aa:7']['state'] == 'gone' and t['devices']['aa:7']['first'] == 'T1'
+    evs = detect_changes(t, 'T5', [a, phone, tv, dev('aa:5', '10.0.0.5')])
+    assert kinds(evs) == [('new', 'aa:5', None), ('returned', 'aa:7', None)]
+
+    # below the configured threshold the device is only missing: no event on return
+    t = empty_tracker()
+    seed_history(t, history, gone_after=3)
+    assert (t['devices']['aa:7']['state'], t['devices']['aa:7']['miss']) == ('missing', 2)
+    assert detect_changes(t, 'T5', [a, phone, tv]) == []
@@ -0,0 +1,43 @@
+import json
+import zipfile
+from datetime import datetime, timezone
+
+import compact
+
+NOW = datetime(2026, 3, 10, 12, tzinfo=timezone.utc).timestamp()
+
+
+def test_packs_old_days_keeps_recent_and_applies_retention(tmp_path):
+    data = tmp_path / 'data'
+    data.mkdir()
+    for ts in ('20260301T010000Z', '20260301T020000Z', '20260310T010000Z', '20251101T010000Z'):
+        (data / f'{ts}_top100.txt').write_text(f'Nmap scan report for {ts}\n' * 50)
+        (data / f'{ts}_smb_10.0.0.5.txt').write_text('smb')
+    (data / 'notes.txt').write_text('left alone')
+
+    stats = compact.compact_dir(str(data), NOW, after_days=2, retain_days=90)
+    assert stats['packedFiles'] == 4 and stats['deletedFiles'] == 2
+    assert sorted(p.name for p in data.iterdir()) == [
+        '20260310T010000Z_smb_10.0.0.5.txt', '20260310T010000Z_top100.txt', 'archive', 'notes.txt']
+
+    with zipfile.ZipFile(data / 'archive' / '20260301.zip') as z:
+        assert len(z.namelist()) == 4
+    index = json.loads((data / 'archive' / 'index.json').read_text())
+    assert index['days']['20260301']['files'] == 4
+    assert index['days']['20260301']['zipBytes'] < index['days']['20260301']['rawBytes']
+
+    # random access, raw or archived
+    assert compact.read_artifact(str(data), '20260301T020000Z_top100.txt').startswith(b'Nmap scan report for 20260301T020000Z')
+    assert compact.read_artifact(str(data), '20260310T010000Z_smb_10.0.0.5.txt') == b'smb'
+    assert compact.read_artifact(str(data), '20251101T010000Z_top100.txt') is None
+
+    # a late file for an archived day is merged into the existing archive
+    (data / '20260301T230000Z_alive.txt').write_text('10.0.0.5\n')
+    compact.compact_dir(str(data), NOW, after_days=2, retain_days=90)
+    assert compact.read_artifact(str(data), '20260301T230000Z_alive.txt') == b'10.0.0.5\n'
+    assert compact.read_artifact(str(data), '20260301T010000Z_smb_10.0.0.5.txt') == b'smb'
+
+    # retention removes whole archives
+    later = datetime(2026, 6, 15, tzinfo=timezone.utc).timestamp()
+    assert compact.compact_dir(str(data), later, after_days=2, retain_days=90)['deletedArchives'] == 1
+    assert '20260301' not in json.loads((data / 'archive' / 'index.json').read_text())['days']
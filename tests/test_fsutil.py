@@ -0,0 +1,26 @@
+import json
+import threading
+
+from fsutil import atomic_write_json, read_json
+
+
+def test_read_json_defaults_and_retries_torn_file(tmp_path):
+    path = tmp_path / 'latest.json'
+    assert read_json(str(path), {}) == {}
+
+    path.write_text('{"devices": [')
+    assert read_json(str(path), 'fallback', retries=1, delay=0) == 'fallback'
+
+    # a writer finishing the file while the reader retries
+    timer = threading.Timer(0.05, lambda: path.write_text('{"devices": []}'))
+    timer.start()
+    assert read_json(str(path), None, retries=20, delay=0.02) == {'devices': []}
+    timer.join()
+
+
+def test_atomic_write_json_replaces_without_temp_leftovers(tmp_path):
+    path = tmp_path / 'site.json'
+    atomic_write_json(str(path), {'a': 1})
+    atomic_write_json(str(path), {'a': 2}, indent=2)
+    assert json.loads(path.read_text()) == {'a': 2}
+    assert [p.name for p in tmp_path.iterdir()] == ['site.json']
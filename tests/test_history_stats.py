@@ -0,0 +1,47 @@
+import random
+
+import pytest
+
+import history_stats
+
+
+def _fixture(devices=40, cols=30, seed=7):
+    rnd = random.Random(seed)
+    t = [f"2026020{1 + i // 24}T{i % 24:02d}0000Z" for i in range(cols)]
+    presence = {}
+    ip_hist = {}
+    for n in range(devices):
+        did = f"dev{n}"
+        presence[did] = [rnd.random() < 0.7 for _ in range(cols)]
+        ip_hist[did] = [f"10.0.0.{rnd.choice([1, 2, 3])}" if on else '' for on in presence[did]]
+    presence['never'] = [False] * cols
+    ip_hist['never'] = [''] * cols
+    return t, presence, ip_hist
+
+
+def test_device_metrics_known_values(monkeypatch):
+    monkeypatch.setattr(history_stats, 'np', None)
+    t = ['a', 'b', 'c', 'd']
+    out = history_stats.device_metrics(
+        ['x'], {'x': [False, True, True, False]}, {'x': ['', '1.1.1.1', '1.1.1.2', '']}, t, window=2)
+    assert out['x'] == {
+        'flaps': 2, 'seen': 2, 'uptime': 0.5, 'availability': 0.5,
+        'uniqueIps': 2, 'firstSeen': 'b', 'lastSeen': 'c',
+    }
+
+
+def test_numpy_matches_python_fallback(monkeypatch):
+    pytest.importorskip('numpy')
+    t, presence, ip_hist = _fixture()
+    order = sorted(presence)
+    history = [
+        {'devices': [{'open_ports': [1] * (i % 3), 'risk_flags': [1] * (i % 2)} for i in range(n)]}
+        for n in (0, 3, 5, 0, 2)
+    ]
+
+    vec = history_stats.device_metrics(order, presence, ip_hist, t)
+    vec_totals = history_stats.snapshot_totals(history)
+    monkeypatch.setattr(history_stats, 'np', None)
+    assert vec == history_stats.device_metrics(order, presence, ip_hist, t)
+    assert vec_totals == history_stats.snapshot_totals(history)
+
@@ -0,0 +1,85 @@
+import socket
+import threading
+
+import dnswire
+import mdns
+
+PTR, SRV, TXT, A = dnswire.PTR, dnswire.SRV, dnswire.TXT, dnswire.A
+
+RECORDS = {
+    (mdns.SERVICES, PTR): [{'name': mdns.SERVICES, 'type': PTR, 'data': '_ipp._tcp.local'},
+                           {'name': mdns.SERVICES, 'type': PTR, 'data': '_http._tcp.local'}],
+    ('_ipp._tcp.local', PTR): [{'name': '_ipp._tcp.local', 'type': PTR, 'data': 'Office._ipp._tcp.local'}],
+    ('_http._tcp.local', PTR): [{'name': '_http._tcp.local', 'type': PTR, 'data': 'Cam._http._tcp.local'}],
+    ('Office._ipp._tcp.local', SRV): [{'name': 'Office._ipp._tcp.local', 'type': SRV,
+                                       'data': {'port': 631, 'target': 'printer.local'}}],
+    ('Office._ipp._tcp.local', TXT): [{'name': 'Office._ipp._tcp.local', 'type': TXT, 'data': ['ty=LaserJet', 'rp=ipp']}],
+    ('printer.local', A): [{'name': 'printer.local', 'type': A, 'data': '192.168.1.40'}],
+}
+# the camera answers everything up front in the additional section
+CAM_EXTRA = [{'name': 'Cam._http._tcp.local', 'type': SRV, 'data': {'port': 80, 'target': 'cam.local'}},
+             {'name': 'cam.local', 'type': A, 'data': '192.168.1.50'}]
+
+
+def responder(sock, log):
+    while True:
+        try:
+            packet, addr = sock.recvfrom(9000)
+        except OSError:
+            return
+        msg = dnswire.parse_message(packet)
+        known = {(r['name'], repr(r['data'])) for r in msg['answers']}
+        answers, extra = [], []
+        for q in msg['questions']:
+            log.append((q['name'], q['type'], len(msg['answers'])))
+            answers += [r for r in RECORDS.get((q['name'], q['type']), []) if (r['name'], repr(r['data'])) not in known]
+            if q['name'] == '_http._tcp.local':
+                extra += CAM_EXTRA
+        if answers:
+            sock.sendto(dnswire.build_message(answers=answers, additional=extra, flags=dnswire.FLAG_QR), addr)
+
+
+def test_browse_batches_queries_and_suppresses_known_answers():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    log = []
+    threading.Thread(target=responder, args=(sock, log), daemon=True).start()
+    try:
+        res = mdns.browse(timeout=5, quiet=0.2, dest=sock.getsockname(), listen_multicast=False)
+    finally:
+        sock.close()
+
+    assert res['rc'] == 0 and res['seconds'] < 3
+    assert res['services'] == {'192.168.1.40': ['_ipp._tcp'], '192.168.1.50': ['_http._tcp']}
+    assert res['hostnames'] == {'192.168.1.40': ['printer.local'], '192.168.1.50': ['cam.local']}
+    assert res['txt'] == {'192.168.1.40': {'Office._ipp._tcp.local': ['ty=LaserJet', 'rp=ipp']}}
+
+    # the repeated type enumeration carries both known types as known answers
+    assert [n for n, _, _ in log if n == mdns.SERVICES] == [mdns.SERVICES] * 2
+    assert [k for n, _, k in log if n == mdns.SERVICES][1] >= 2
+    # everything the camera volunteered is never asked for
+    assert not [n for n, t, _ in log if n in ('Cam._http._tcp.local', 'cam.local') and t != TXT]
+    assert res['packets'] <= res['rounds'] * 2
+
+
+def test_pack_queries_splits_at_packet_size():
+    qs = [(f'_svc{i:03d}._tcp.local', PTR, []) for i in range(200)]
+    packets = mdns.pack_queries(qs, max_bytes=512)
+    assert len(packets) > 1 and all(len(p) <= 512 for p in packets)
+    assert sum(len(dnswire.parse_message(p)['questions']) for p in packets) == 200
+
+
+def test_instance_names_with_dots_keep_their_labels():
+    # "Printer v2.1" is one label; the wire form must not grow extra labels
+    wire = dnswire.build_message(answers=[{'name': '_ipp._tcp.local', 'type': PTR,
+                                           'data': 'Printer v2\\.1._ipp._tcp.local'}], flags=dnswire.FLAG_QR)
+    assert b'\x0cPrinter v2.1\x04_ipp' in wire
+    b = mdns.Browser()
+    b.handle(wire, '192.168.1.40')
+    inst = next(iter(b.instances['_ipp._tcp.local']))
+    assert inst == 'Printer v2\\.1._ipp._tcp.local'
+    assert dnswire.split_name(inst) == ['Printer v2.1', '_ipp', '_tcp', 'local']
+
+    query = mdns.pack_queries([q for q in b.questions() if q[0] == inst])[0]
+    assert b'\x0cPrinter v2.1\x04_ipp' in query
+    assert {q['name'] for q in dnswire.parse_message(query)['questions']} == {inst}
@@ -0,0 +1,90 @@
+import json
+import socket
+import struct
+
+import dnswire
+import passive
+import render
+
+PHONE = bytes.fromhex('3c0630aabbcc')
+PRINTER = bytes.fromhex('b827eb112233')
+ROUTER = bytes.fromhex('001122334455')
+BCAST = b'\xff' * 6
+
+
+def eth(dst, src, ethertype, payload, vlan=None):
+    tag = struct.pack('!HH', 0x8100, vlan) if vlan is not None else b''
+    return dst + src + tag + struct.pack('!H', ethertype) + payload
+
+
+def arp(mac, ip, target_ip):
+    return struct.pack('!HHBBH', 1, 0x0800, 6, 4, 1) + mac + socket.inet_aton(ip) + b'\x00' * 6 + socket.inet_aton(target_ip)
+
+
+def udp_ip(src, dst, sport, dport, payload):
+    udp = struct.pack('!HHHH', sport, dport, 8 + len(payload), 0) + payload
+    return struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(udp), 0, 0, 64, 17, 0,
+                       socket.inet_aton(src), socket.inet_aton(dst)) + udp
+
+
+def dhcp(op, mac, options, yiaddr='0.0.0.0'):
+    opts = b''.join(bytes([code, len(v)]) + v for code, v in options) + b'\xff'
+    return (struct.pack('!BBBBIHH4s4s4s4s', op, 1, 6, 0, 0x1234, 0, 0, b'\x00' * 4, socket.inet_aton(yiaddr),
+                        b'\x00' * 4, b'\x00' * 4) + mac + b'\x00' * 10 + b'\x00' * 192 + passive.DHCP_MAGIC + opts)
+
+
+def write_pcap(path, frames, endian='<', start=1770000000):
+    with open(path, 'wb') as f:
+        f.write(struct.pack(endian + 'IHHiIII', 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1))
+        for i, frame in enumerate(frames):
+            f.write(struct.pack(endian + 'IIII', start + i, 0, len(frame), len(frame)) + frame)
+
+
+def capture():
+    mdns = dnswire.build_message(flags=dnswire.FLAG_QR | dnswire.FLAG_AA, answers=[
+        {'name': '_ipp._tcp.local', 'type': dnswire.PTR, 'data': 'Office Printer._ipp._tcp.local'},
+        {'name': '_services._dns-sd._udp.local', 'type': dnswire.PTR, 'data': '_ipp._tcp.local'},
+        {'name': 'officeprinter.local', 'type': dnswire.A, 'data': '192.168.1.40', 'cache_flush': True},
+        {'name': 'other.local', 'type': dnswire.A, 'data': '192.168.1.99'},
+    ])
+    return [
+        eth(BCAST, PHONE, 0x0800, udp_ip('0.0.0.0', '255.255.255.255', 68, 67, dhcp(1, PHONE, [
+            (53, b'\x03'), (50, socket.inet_aton('192.168.1.23')), (12, b'pixel-7'), (60, b'android-dhcp-14')]))),
+        eth(PHONE, ROUTER, 0x0800, udp_ip('192.168.1.1', '192.168.1.23', 67, 68, dhcp(2, PHONE, [(53, b'\x05')],
+                                                                                      yiaddr='192.168.1.23'))),
+        eth(BCAST, PRINTER, 0x0806, arp(PRINTER, '0.0.0.0', '192.168.1.40')),      # ARP probe
+        eth(bytes.fromhex('01005e0000fb'), PRINTER, 0x0800, udp_ip('192.168.1.40', '224.0.0.251', 5353, 5353, mdns)),
+        eth(BCAST, ROUTER, 0x0806, arp(ROUTER, '192.168.1.1', '192.168.1.23'), vlan=10),
+        eth(BCAST, BCAST, 0x0806, arp(BCAST, '192.168.1.9', '192.168.1.1')),       # bogus sender
+        eth(BCAST, ROUTER, 0x0800, udp_ip('192.168.1.1', '192.168.1.255', 137, 137, b'netbios')),
+    ]
+
+
+def test_pcap_replay_builds_last_seen_table(tmp_path):
+    pcap = tmp_path / 'cap.pcap'
+    write_pcap(pcap, capture(), endian='>')
+    stats = passive.replay(str(tmp_path), str(pcap))
+    assert stats == {'frames': 7, 'observations': 5, 'devices': 3}
+
+    table = json.loads((tmp_path / 'passive.json').read_text())['devices']
+    phone = table['3c:06:30:aa:bb:cc']
+    assert (phone['ip'], phone['hostname'], phone['vendorClass'], phone['sources']) == \
+        ('192.168.1.23', 'pixel-7', 'android-dhcp-14', ['dhcp'])
+    assert (phone['firstSeen'], phone['lastSeen']) == (1770000000, 1770000001)
+    printer = table['b8:27:eb:11:22:33']
+    assert printer['ip'] == '192.168.1.40' and printer['sources'] == ['arp', 'mdns']
+    assert printer['mdns'] == ['officeprinter.local'] and printer['services'] == ['_ipp._tcp']
+    assert table['00:11:22:33:44:55']['ip'] == '192.168.1.1'   # VLAN-tagged ARP
+
+    # replaying again keeps firstSeen, the renderer only takes recent entries
+    write_pcap(pcap, capture()[:1], start=1770000500)
+    passive.replay(str(tmp_path), str(pcap))
+    assert json.loads((tmp_path / 'passive.json').read_text())['devices']['3c:06:30:aa:bb:cc']['firstSeen'] == 1770000000
+    recent = render.load_passive(str(tmp_path), 1770000600, 300)
+    assert sorted(recent) == ['3c:06:30:aa:bb:cc'] and recent['3c:06:30:aa:bb:cc']['mac'] == '3c:06:30:aa:bb:cc'
+
+
+def test_truncated_frames_are_ignored():
+    for frame in capture():
+        for cut in (10, 20, 40, 200):
+            passive.parse_frame(frame[:cut])
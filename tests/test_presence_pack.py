@@ -0,0 +1,28 @@
+import json
+
+from presence_pack import decode_presence, encode_presence
+
+
+def test_presence_roundtrip():
+    t = [f"20260207T{h:02d}0000Z" for h in range(11)]
+    presence = {
+        'aa:aa:aa:aa:aa:aa': [True] * 11,
+        'bb:bb:bb:bb:bb:bb': [False, True, True, False] + [True] * 7,
+        'ip:192.168.1.9': [False] * 10 + [True],
+    }
+    ip_hist = {
+        'aa:aa:aa:aa:aa:aa': ['192.168.1.10'] * 5 + ['192.168.1.11'] * 6,
+        'bb:bb:bb:bb:bb:bb': ['', '192.168.1.20', '192.168.1.20', ''] + ['192.168.1.10'] * 7,
+        'ip:192.168.1.9': [''] * 10 + ['192.168.1.9'],
+    }
+    order = sorted(presence)
+
+    obj = json.loads(json.dumps(encode_presence(t, order, presence, ip_hist)))
+    assert obj['stride'] == 2
+    # IPs are dictionary-encoded once, not per cell
+    assert sorted(obj['ips']) == ['192.168.1.10', '192.168.1.11', '192.168.1.20', '192.168.1.9']
+
+    t2, pres2, ips2 = decode_presence(obj)
+    assert t2 == t
+    assert pres2 == presence
+    assert ips2 == ip_hist
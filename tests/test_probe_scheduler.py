@@ -0,0 +1,47 @@
+import threading
+import time
+
+from probe_scheduler import ProbeScheduler, interleave
+
+
+def test_per_host_and_global_in_flight_caps():
+    sched = ProbeScheduler(rate=1000, burst=1000, per_host=1, parallel=3)
+    lock = threading.Lock()
+    now = {}
+    peak = {'total': 0}
+
+    def probe(item):
+        host, _ = item
+        with sched.slot(host):
+            with lock:
+                now[host] = now.get(host, 0) + 1
+                assert now[host] == 1
+                peak['total'] = max(peak['total'], sum(now.values()))
+            time.sleep(0.02)
+            with lock:
+                now[host] -= 1
+        return item
+
+    items = [(h, i) for h in ('cam', 'nas', 'tv', 'plug') for i in range(4)]
+    out = sched.map(probe, interleave(items, host=lambda it: it[0]), workers=8)
+    assert sorted(out) == sorted(items)
+    assert peak['total'] == 3
+    assert sched.stats['probeSlots'] == 16 and sched.stats['probeWaits'] > 0
+
+
+def test_token_bucket_paces_one_host_but_not_others():
+    sched = ProbeScheduler(rate=20, burst=2, per_host=4, parallel=8)
+    t0 = time.monotonic()
+    for _ in range(6):        # 2 from the burst, then one every 50 ms
+        with sched.slot('cam'):
+            pass
+    assert 0.17 < time.monotonic() - t0 < 1.0
+    t1 = time.monotonic()
+    with sched.slot('nas'):
+        pass
+    assert time.monotonic() - t1 < 0.05
+
+
+def test_interleave_round_robins_hosts():
+    items = [('a', 1), ('a', 2), ('a', 3), ('b', 1), ('c', 1), ('c', 2)]
+    assert interleave(items, host=lambda it: it[0]) == [('a', 1), ('b', 1), ('c', 1), ('a', 2), ('c', 2), ('a', 3)]
@@ -0,0 +1,51 @@
+import json
+import os
+import pathlib
+import subprocess
+import sys
+
+from profiling import profile_mode
+
+REPO = pathlib.Path(__file__).resolve().parents[1]
+
+SCRIPT = """
+import sys
+
+def hot(n):
+    return sum(i * i for i in range(n))
+
+def main():
+    for _ in range(30):
+        hot(20000)
+    sys.exit(3)
+
+if __name__ == '__main__':
+    main()
+"""
+
+
+def test_profile_mode():
+    assert profile_mode('') == '' and profile_mode('off') == ''
+    assert profile_mode('1') == 'all' and profile_mode('Sample') == 'sample'
+
+
+def test_profiled_run_writes_dumps_and_summary(tmp_path):
+    script = tmp_path / 'work.py'
+    script.write_text(SCRIPT)
+    stats = tmp_path / 'stats.json'
+    prefix = tmp_path / 'logs' / 'T1_work'
+    env = dict(os.environ, NW_STAGE_STATS=str(stats), NW_PROFILE_INTERVAL_MS='1')
+    rc = subprocess.call([sys.executable, str(REPO / 'profiling.py'), '--mode', 'all', '--out-prefix', str(prefix),
+                          '--', str(script)], env=env)
+    assert rc == 3  # the script's exit code is passed through
+
+    for ext in ('.prof', '.txt', '.collapsed'):
+        assert (tmp_path / 'logs' / ('T1_work' + ext)).stat().st_size > 0
+    lines = (tmp_path / 'logs' / 'T1_work.collapsed').read_text().splitlines()
+    assert all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+    assert any(line.startswith('<module> (work.py:1);main (work.py:') for line in lines)
+
+    profile = json.loads(stats.read_text())['profile']
+    assert profile['mode'] == 'all' and profile['samples'] > 0
+    assert any(r['func'].startswith('<genexpr> (work.py') for r in profile['top'])
+    assert any('work.py' in r['func'] for r in profile['topSampled'])
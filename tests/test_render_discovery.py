@@ -0,0 +1,41 @@
+import json
+import pathlib
+import subprocess
+import sys
+
+REPO = pathlib.Path(__file__).resolve().parents[1]
+
+
+def render(root, ts, *extra):
+    subprocess.check_call([sys.executable, str(REPO / 'render.py'), '--root', str(root), '--timestamp-utc', ts,
+                           '--timestamp-human', ts, '--host-ip', '192.168.1.2', '--subnet', '192.168.1.0/24', *extra])
+
+
+def test_discovery_cycle_keeps_last_known_ports(tmp_path):
+    for d in ('state', 'site', 'data'):
+        (tmp_path / d).mkdir()
+    (tmp_path / 'state' / 'alerts.json').write_text('{"mode":"off"}')
+    data = tmp_path / 'data'
+    (data / '20260101T000000Z_arp_scan.txt').write_text('192.168.1.10\taa:bb:cc:00:00:01\tAcme\n')
+    (data / '20260101T000000Z_top100.txt').write_text(
+        'Nmap scan report for 192.168.1.10\n22/tcp open  ssh     OpenSSH 9.0\n\n')
+    render(tmp_path, '20260101T000000Z')
+
+    (data / '20260101T000100Z_arp_scan.txt').write_text(
+        '192.168.1.10\taa:bb:cc:00:00:01\tAcme\n192.168.1.12\taa:bb:cc:00:00:03\tNew\n')
+    render(tmp_path, '20260101T000100Z', '--discovery-only')
+
+    latest = json.loads((tmp_path / 'site' / 'latest.json').read_text())
+    assert latest['mode'] == 'discovery' and latest['timestamp_utc'] == '20260101T000100Z'
+    by_id = {d['id']: d for d in latest['devices']}
+    old, new = by_id['aa:bb:cc:00:00:01'], by_id['aa:bb:cc:00:00:03']
+    assert [p['port'] for p in old['open_ports']] == ['22/tcp'] and old['risk_flags']
+    assert old['details_ts'] == '20260101T000000Z' and old['details_stale']
+    assert new['open_ports'] == [] and new['details_ts'] == ''
+
+    # presence gets the sweep as its newest column; no snapshot file is kept for it
+    presence = json.loads((tmp_path / 'site' / 'presence.json').read_text())
+    assert presence['t'] == ['20260101T000000Z', '20260101T000100Z']
+    assert not (tmp_path / 'state' / '20260101T000100Z.json').exists()
+    tracker = json.loads((tmp_path / 'state' / 'tracker.json').read_text())
+    assert tracker['lastTs'] == '20260101T000000Z'
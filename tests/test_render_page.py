@@ -0,0 +1,25 @@
+import render
+
+
+def test_unchanged_page_is_not_rewritten_and_template_change_invalidates(tmp_path, monkeypatch):
+    cache = {}
+    builds = []
+
+    def build():
+        builds.append(1)
+        return f'<html>{len(builds)}</html>'
+
+    page = tmp_path / 'timeline.html'
+    assert render.render_page(str(tmp_path), cache, 'timeline.html', {'rows': [1, 2]}, build)
+    mtime = page.stat().st_mtime_ns
+
+    assert not render.render_page(str(tmp_path), cache, 'timeline.html', {'rows': [1, 2]}, build)
+    assert len(builds) == 1 and page.stat().st_mtime_ns == mtime and page.read_text() == '<html>1</html>'
+
+    # new inputs, a render.py (template) edit, or a deleted page each rebuild it
+    assert render.render_page(str(tmp_path), cache, 'timeline.html', {'rows': [1, 2, 3]}, build)
+    monkeypatch.setattr(render, '_SOURCE_DIGEST', 'edited-template')
+    assert render.render_page(str(tmp_path), cache, 'timeline.html', {'rows': [1, 2, 3]}, build)
+    page.unlink()
+    assert render.render_page(str(tmp_path), cache, 'timeline.html', {'rows': [1, 2, 3]}, build)
+    assert len(builds) == 4 and page.read_text() == '<html>4</html>'
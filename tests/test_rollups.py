@@ -0,0 +1,39 @@
+from rollups import add_sample, bucket_start, empty_rollups, export_series, retention
+
+
+def test_bucket_start():
+    assert bucket_start('20260207T134501Z', 'raw') == '20260207T134501Z'
+    assert bucket_start('20260207T134501Z', 'hourly') == '20260207T130000Z'
+    assert bucket_start('20260207T134501Z', 'daily') == '20260207T000000Z'
+    # 2026-02-07 is a Saturday; weeks start on Monday
+    assert bucket_start('20260207T134501Z', 'weekly') == '20260202T000000Z'
+
+
+def test_incremental_rollup_is_idempotent():
+    r = empty_rollups()
+    assert add_sample(r, '20260207T100000Z', {'devices': 10, 'openPorts': 4, 'risks': 1})
+    assert add_sample(r, '20260207T103000Z', {'devices': 12, 'openPorts': 2, 'risks': 1})
+    assert add_sample(r, '20260207T110000Z', {'devices': 8, 'openPorts': 0, 'risks': 0})
+    # re-rendering an already folded snapshot is a no-op
+    assert not add_sample(r, '20260207T103000Z', {'devices': 99, 'openPorts': 99, 'risks': 99})
+
+    hourly = export_series(r, 'hourly')
+    assert hourly['t'] == ['20260207T100000Z', '20260207T110000Z']
+    assert hourly['n'] == [2, 1]
+    assert hourly['devices'] == [11.0, 8.0]
+    assert hourly['devicesMin'] == [10, 8] and hourly['devicesMax'] == [12, 8]
+
+    daily = export_series(r, 'daily')
+    assert daily['n'] == [3] and daily['openPorts'] == [2.0]
+    assert len(export_series(r, 'raw')['t']) == 3
+
+
+def test_raw_retention_from_env(monkeypatch):
+    monkeypatch.setenv('NW_ROLLUP_RAW_POINTS', '2')
+    r = empty_rollups()
+    for ts in ('20260207T100000Z', '20260207T103000Z', '20260207T110000Z'):
+        add_sample(r, ts, {'devices': 1})
+    assert export_series(r, 'raw')['t'] == ['20260207T103000Z', '20260207T110000Z']
+    # a bad value falls back to the default instead of breaking the render
+    monkeypatch.setenv('NW_ROLLUP_RAW_POINTS', 'lots')
+    assert retention('raw') == 720
@@ -0,0 +1,52 @@
+import json
+
+import rtt_stats
+
+NMAP = """Nmap scan report for 192.168.1.10
+Host is up (0.00051s latency).
+PORT   STATE SERVICE
+22/tcp open  ssh
+Nmap scan report for 192.168.1.40
+Host is up (0.31s latency).
+Nmap scan report for 192.168.1.50
+Host is up.
+"""
+
+
+def test_fast_hosts_fail_fast_and_slow_hosts_get_room(monkeypatch):
+    monkeypatch.delenv('NW_RTT_MIN_TIMEOUT', raising=False)
+    monkeypatch.delenv('NW_RTT_MAX_TIMEOUT', raising=False)
+    hosts = {}
+    for rtt in (0.001, 0.002, 0.001):
+        rtt_stats.update(hosts, 'wired', rtt, now=100)
+    for rtt in (0.2, 0.6, 0.3, 0.9):
+        rtt_stats.update(hosts, 'wifi', rtt, now=100)
+    rtt_stats.update(hosts, 'wired', 0, now=100)       # refused connect: no sample
+
+    assert hosts['wired']['samples'] == 3
+    assert rtt_stats.timeouts(hosts, 'wired', 3, 3, 2.0) == (0.5, 2.5)
+    connect, total = rtt_stats.timeouts(hosts, 'wifi', 3, 3, 2.0)
+    assert 3 < connect <= 10 and total == 6           # capped at twice the default
+    assert rtt_stats.timeouts(hosts, 'unknown', 3, 3, 2.0) == (3, 3)
+
+    monkeypatch.setenv('NW_RTT_MAX_TIMEOUT', '2')
+    assert rtt_stats.timeouts(hosts, 'wifi', 3, 3, 2.0)[0] == 2
+
+
+def test_nmap_latencies_and_timing_args(tmp_path):
+    nmap = tmp_path / 'top100.txt'
+    nmap.write_text(NMAP)
+    assert rtt_stats.parse_nmap_latency(str(nmap)) == {'192.168.1.10': 0.00051, '192.168.1.40': 0.31}
+
+    hosts = {}
+    for ip, rtt in rtt_stats.parse_nmap_latency(str(nmap)).items():
+        rtt_stats.update(hosts, ip, rtt, now=1000)
+    assert rtt_stats.nmap_args(hosts, ['192.168.1.99'], 30) == ['--host-timeout', '30s']
+    assert rtt_stats.nmap_args(hosts, ['192.168.1.10'], 30) == ['--host-timeout', '30s', '--initial-rtt-timeout', '100ms']
+    args = rtt_stats.nmap_args(hosts, ['192.168.1.10', '192.168.1.40'], 30)
+    assert args[:2] == ['--host-timeout', '55s'] and '--max-rtt-timeout' in args
+
+    rtt_stats.save(str(tmp_path), dict(hosts, old={'srtt': 1, 'rttvar': 1, 'ts': 0}),
+                   now=rtt_stats.FORGET_AFTER_S + 500)
+    assert json.loads((tmp_path / 'rtt.json').read_text())['version'] == 1
+    assert rtt_stats.load(str(tmp_path)) == hosts
@@ -0,0 +1,79 @@
+import json
+
+import scheduler
+
+HOUR = 3600
+
+
+def write_full(root, devices):
+    (root / 'state').mkdir(exist_ok=True)
+    (root / 'state' / '20260101T000000Z.json').write_text(json.dumps({'devices': devices}))
+
+
+def test_decide_escalates_on_change_staleness_and_first_scan():
+    known = {'aa:aa:aa:aa:aa:01': '10.0.0.2', 'aa:aa:aa:aa:aa:02': '10.0.0.3'}
+    sched = {'lastFull': 1000}
+    same = dict(known)
+
+    assert scheduler.decide({'lastFull': 0}, known, same, 1000, HOUR, 600) == 'first scan'
+    assert scheduler.decide(sched, known, same, 1000 + 1800, HOUR, 600) == ''
+    assert scheduler.decide(sched, known, same, 1000 + HOUR, HOUR, 600) == 'stale'
+    # a device missing from one sweep is not a reason
+    assert scheduler.decide(sched, known, {'aa:aa:aa:aa:aa:01': '10.0.0.2'}, 1000 + 1800, HOUR, 600) == ''
+
+    moved = dict(known, **{'aa:aa:aa:aa:aa:02': '10.0.0.9'})
+    assert 'IP change' in scheduler.decide(sched, known, moved, 1000 + 1800, HOUR, 600)
+    new = dict(known, **{'aa:aa:aa:aa:aa:03': '10.0.0.4'})
+    assert scheduler.decide(sched, known, new, 1000 + 1800, HOUR, 600).startswith('1 new')
+    # change inside the minimum gap waits for a later sweep; failed sweep only checks staleness
+    assert scheduler.decide(sched, known, new, 1000 + 300, HOUR, 600) == ''
+    assert scheduler.decide(sched, known, None, 1000 + 1800, HOUR, 600) == ''
+
+
+def test_tick_runs_full_scan_only_when_needed(tmp_path):
+    write_full(tmp_path, [{'id': 'aa:aa:aa:aa:aa:01', 'ip': '10.0.0.2'}])
+    marker = tmp_path / 'scans'
+    scan_cmd = ['sh', '-c', f'echo x >> {marker}']
+    sweeps = [{'aa:aa:aa:aa:aa:01': '10.0.0.2'}, {'aa:aa:aa:aa:aa:01': '10.0.0.2', 'aa:aa:aa:aa:aa:05': '10.0.0.5'}]
+
+    def sweep(root):
+        return sweeps.pop(0)
+
+    t = 1_000_000
+    assert scheduler.tick(str(tmp_path), scan_cmd, HOUR, 600, now=t, sweep=sweep) == 'first scan'
+    assert scheduler.tick(str(tmp_path), scan_cmd, HOUR, 600, now=t + 900, sweep=sweep) == ''
+    assert scheduler.tick(str(tmp_path), scan_cmd, HOUR, 600, now=t + 1200, sweep=sweep).startswith('1 new')
+
+    assert marker.read_text().count('x') == 2
+    sched = scheduler.load_sched(str(tmp_path / 'state'))
+    assert sched['fullScans'] == 2 and sched['discoveries'] == 3 and sched['lastFull'] == t + 1200
+
+
+def test_skipped_or_failed_scan_is_retried(tmp_path):
+    write_full(tmp_path, [{'id': 'aa:aa:aa:aa:aa:01', 'ip': '10.0.0.2'}])
+    t = 1_000_000
+    state = tmp_path / 'state'
+    scheduler.save_sched(str(state), dict(scheduler.load_sched(str(state)), lastFull=t, fullScans=1))
+    new = {'aa:aa:aa:aa:aa:01': '10.0.0.2', 'aa:aa:aa:aa:aa:05': '10.0.0.5'}
+
+    for rc in (75, 1):
+        reason = scheduler.tick(str(tmp_path), ['sh', '-c', f'exit {rc}'], HOUR, 600, now=t + 900, sweep=lambda root: new)
+        assert reason.startswith('1 new')
+        sched = scheduler.load_sched(str(state))
+        assert sched['lastFull'] == t and sched['fullScans'] == 1
+
+    assert scheduler.tick(str(tmp_path), ['true'], HOUR, 600, now=t + 1200, sweep=lambda root: new).startswith('1 new')
+    assert scheduler.load_sched(str(state))['lastFull'] == t + 1200
+
+
+def test_known_devices_come_from_the_tracker(tmp_path):
+    # the phone slept through the last full scan but the tracker knows it
+    write_full(tmp_path, [{'id': 'aa:aa:aa:aa:aa:01', 'ip': '10.0.0.2'}])
+    tracker = {'version': 1, 'lastTs': '20260101T000000Z', 'lastEvents': [], 'devices': {
+        'aa:aa:aa:aa:aa:01': {'state': 'present', 'ip': '10.0.0.2'},
+        'aa:aa:aa:aa:aa:07': {'state': 'gone', 'ip': '10.0.0.7'},
+    }}
+    (tmp_path / 'state' / 'tracker.json').write_text(json.dumps(tracker))
+    known = scheduler.known_devices(str(tmp_path / 'state'))
+    awake = {'aa:aa:aa:aa:aa:01': '10.0.0.2', 'aa:aa:aa:aa:aa:07': '10.0.0.7'}
+    assert scheduler.decide({'lastFull': 1000}, known, awake, 1000 + 1800, HOUR, 600) == ''
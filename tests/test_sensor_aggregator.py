@@ -0,0 +1,109 @@
+import json
+import threading
+import time
+
+import aggregator
+import sensor
+
+
+def dev(mac, ip, ports=()):
+    return {'id': mac, 'mac': mac, 'ip': ip, 'vendor': 'Acme', 'type': 'unknown', 'name': '',
+            'open_ports': [{'port': p, 'service': '', 'version': '', 'raw': p} for p in ports]}
+
+
+def write_latest(root, ts, devices):
+    (root / 'state').mkdir(parents=True, exist_ok=True)
+    (root / 'state' / 'latest.json').write_text(json.dumps(
+        {'timestamp_utc': ts, 'subnet': '10.1.0.0/24', 'host_ip': '10.1.0.2', 'devices': devices}))
+
+
+def test_sensor_pushes_deltas_to_aggregator_on_localhost(tmp_path):
+    hq = tmp_path / 'hq'
+    httpd, agg = aggregator.make_server(str(hq), '127.0.0.1', 0, token='s3cret', render=False)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{httpd.server_address[1]}'
+    site_a = tmp_path / 'a'
+    state_a = str(site_a / 'state')
+    try:
+        a, b, c = 'aa:00:00:00:00:01', 'aa:00:00:00:00:02', 'aa:00:00:00:00:03'
+        write_latest(site_a, '20260101T000000Z', [dev(a, '10.1.0.10', ['22/tcp']), dev(b, '10.1.0.11')])
+        assert sensor.push(state_a, url, 'site-a', 'wrong')['status'] == 401
+        first = sensor.push(state_a, url, 'site-a', 's3cret')
+        assert first['sent'] and first['full'] and first['upserts'] == 2
+
+        # only the changed device and the removal travel
+        write_latest(site_a, '20260101T010000Z', [dev(a, '10.1.0.10', ['22/tcp']), dev(c, '10.1.0.12')])
+        second = sensor.push(state_a, url, 'site-a', 's3cret')
+        assert second['sent'] and not second['full'] and (second['upserts'], second['removes']) == (1, 1)
+        assert sensor.push(state_a, url, 'site-a', 's3cret')['reason'] == 'nothing new'
+
+        store = aggregator.load_sensor(agg.state, 'site-a')
+        assert store['ts'] == '20260101T010000Z' and set(store['devices']) == {a, c}
+
+        # aggregator lost its copy: 409, then the sensor resends everything
+        (hq / 'state' / 'sensors' / 'site-a.json').unlink()
+        write_latest(site_a, '20260101T020000Z', [dev(a, '10.1.0.10', ['22/tcp']), dev(c, '10.1.0.12')])
+        third = sensor.push(state_a, url, 'site-a', 's3cret')
+        assert third['sent'] and third['full'] and third['upserts'] == 2
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+    # a second sensor that went quiet keeps its devices, flagged offline
+    other = aggregator.load_sensor(agg.state, 'site-b')
+    aggregator.apply_delta(other, {'ts': '20260101T000000Z', 'full': True, 'upsert': [dev(a, '10.2.0.5')]}, now=0)
+    aggregator.save_sensor(agg.state, other)
+    now = aggregator.load_sensor(agg.state, 'site-a')['lastSeen']
+    devices, status = aggregator.merge(aggregator.load_sensors(agg.state), now, offline_after=3600, expire_after=10 ** 12)
+    ids = {d['id']: d for d in devices}
+    assert set(ids) == {f'site-a/{a}', f'site-a/{c}', f'site-b/{a}'}
+    assert ids[f'site-b/{a}']['sensor_offline'] and not ids[f'site-a/{a}']['sensor_offline']
+    assert status['site-b']['offline'] and not status['site-a']['offline']
+
+
+def test_aggregator_renders_merged_inventory(tmp_path):
+    agg = aggregator.Aggregator(str(tmp_path), offline_after=3600, expire_after=7200)
+    (tmp_path / 'state').mkdir()
+    (tmp_path / 'state' / 'alerts.json').write_text('{"mode":"off"}')
+    store = aggregator.load_sensor(agg.state, 'site-a')
+    aggregator.apply_delta(store, {'ts': 'T1', 'full': True, 'upsert': [dev('aa:00:00:00:00:01', '10.1.0.10', ['22/tcp'])],
+                                   'meta': {'subnet': '10.1.0.0/24'}}, now=1_800_000_000)
+    aggregator.save_sensor(agg.state, store)
+
+    ts = agg.render(now=1_800_000_100)
+    latest = json.loads((tmp_path / 'site' / 'latest.json').read_text())
+    assert latest['timestamp_utc'] == ts and latest['subnet'] == '10.1.0.0/24'
+    assert [d['id'] for d in latest['devices']] == ['site-a/aa:00:00:00:00:01']
+    assert latest['devices'][0]['sensor'] == 'site-a'
+    assert json.loads((tmp_path / 'site' / 'sensors.json').read_text())['sensors']['site-a']['devices'] == 1
+
+
+def test_discovery_push_does_not_drop_devices(tmp_path):
+    agg = aggregator.Aggregator(str(tmp_path), offline_after=3600, expire_after=7200)
+    (tmp_path / 'state').mkdir()
+    (tmp_path / 'state' / 'alerts.json').write_text('{"mode":"off"}')
+    a, phone = 'aa:00:00:00:00:01', 'aa:00:00:00:00:09'
+    meta = {'subnet': '10.1.0.0/24'}
+    assert agg.ingest({'version': sensor.VERSION, 'sensor': 'site-a', 'ts': '20260101T000000Z', 'full': True,
+                       'upsert': [dev(a, '10.1.0.10'), dev(phone, '10.1.0.19')], 'meta': meta})[0] == 200
+    t0 = time.time()
+    agg.render(now=t0)
+
+    # an older sensor pushing its ARP-only sweep, in which the phone slept
+    status, _ = agg.ingest({'version': sensor.VERSION, 'sensor': 'site-a', 'ts': '20260101T001000Z',
+                            'base': '20260101T000000Z', 'full': False, 'upsert': [], 'remove': [phone],
+                            'meta': dict(meta, mode='discovery')})
+    assert status == 200
+    assert set(aggregator.load_sensor(agg.state, 'site-a')['devices']) == {a, phone}
+    agg.render(now=t0 + 600)
+    latest = json.loads((tmp_path / 'state' / 'latest.json').read_text())
+    assert latest['mode'] == 'discovery' and len(latest['devices']) == 2
+    tracker = json.loads((tmp_path / 'state' / 'tracker.json').read_text())
+    assert tracker['devices'][f'site-a/{phone}']['miss'] == 0
+
+    # the sensor itself no longer pushes discovery snapshots
+    site = tmp_path / 'site-a'
+    write_latest(site, '20260101T002000Z', [dev(a, '10.1.0.10')])
+    snap = json.loads((site / 'state' / 'latest.json').read_text())
+    (site / 'state' / 'latest.json').write_text(json.dumps(dict(snap, mode='discovery')))
+    assert sensor.push(str(site / 'state'), 'http://127.0.0.1:9', 'site-a')['reason'] == 'discovery snapshot'
@@ -0,0 +1,94 @@
+import json
+import os
+import random
+
+import snapshot_store
+import stage_metrics
+
+
+def make_history(n, seed=1):
+    rng = random.Random(seed)
+    base = [{'id': f'aa:00:00:00:00:{i:02x}', 'ip': f'10.0.0.{i}', 'open_ports': [{'port': f'{i}/tcp'}], 'web': []}
+            for i in range(1, 30)]
+    out = []
+    for k in range(n):
+        devices = []
+        for d in base:
+            if rng.random() < 0.85:
+                d = dict(d)
+                if rng.random() < 0.1:
+                    d['ip'] = f'10.0.1.{rng.randint(1, 250)}'
+                if rng.random() < 0.05:
+                    d.pop('web')
+                devices.append(d)
+        if k % 9 == 0:
+            rng.shuffle(devices)
+        out.append({'timestamp_utc': f'202601{1 + k // 24:02d}T{k % 24:02d}0000Z', 'subnet': '10.0.0.0/24',
+                    'devices': devices, 'diff': {'new_ids': [], 'gone_ids': []}})
+    return out
+
+
+def test_keyframes_and_deltas_reconstruct_exactly(tmp_path):
+    state = str(tmp_path)
+    history = make_history(40)
+    kinds = [snapshot_store.write_snapshot(state, s, every=12) for s in history]
+    assert kinds.count('keyframe') == 4 and kinds[0] == kinds[12] == 'keyframe'
+
+    assert list(snapshot_store.iter_snapshots(state)) == history
+    assert snapshot_store.load(state, history[30]['timestamp_utc']) == history[30]
+    assert snapshot_store.load_last(state, 5) == history[-5:]
+    assert snapshot_store.load_at(state, history[17]['timestamp_utc'][:-3] + '59Z') == history[17]
+    assert snapshot_store.load_at(state, '20250101T000000Z') is None
+
+    # stage_metrics folds the cycle's metrics into a delta file like into a full one
+    ts = history[-1]['timestamp_utc']
+    stage_metrics.add_to_json(os.path.join(state, f'{ts}.json'), 'metrics', {'cycleSeconds': 1.5})
+    assert snapshot_store.load(state, ts) == dict(history[-1], metrics={'cycleSeconds': 1.5})
+
+
+def test_legacy_snapshots_read_as_keyframes_and_reencode(tmp_path):
+    state = str(tmp_path)
+    history = make_history(30, seed=3)
+    for s in history:
+        (tmp_path / f"{s['timestamp_utc']}.json").write_text(json.dumps(s, indent=2))
+    assert list(snapshot_store.iter_snapshots(state)) == history
+
+    before, after = snapshot_store.reencode(state, every=10)
+    assert after < before / 2
+    assert list(snapshot_store.iter_snapshots(state)) == history
+    assert not [p for p in tmp_path.iterdir() if p.suffix == '.bak']
+
+
+def test_missing_keyframe_orphans_only_its_chain(tmp_path):
+    state = str(tmp_path)
+    history = make_history(20, seed=5)
+    for s in history:
+        snapshot_store.write_snapshot(state, s, every=10)
+    (tmp_path / f"{history[0]['timestamp_utc']}.json").unlink()
+    assert list(snapshot_store.iter_snapshots(state)) == history[10:]
+
+
+def test_finalized_delta_snapshot_stays_compact(tmp_path):
+    state = tmp_path / 'state'
+    state.mkdir()
+    (tmp_path / 'site').mkdir()
+    history = make_history(3)
+    for s in history:
+        snapshot_store.write_snapshot(str(state), s, every=12)
+    ts = history[-1]['timestamp_utc']
+    stage_metrics.finalize(str(tmp_path), ts)
+
+    text = (state / f'{ts}.json').read_text()
+    assert '\n' not in text and ', ' not in text and '_delta' in text
+    assert snapshot_store.load(str(state), ts)['devices'] == history[-1]['devices']
+
+
+def test_rewriting_a_ts_reencodes_the_deltas_built_on_it(tmp_path):
+    state = str(tmp_path)
+    history = make_history(15, seed=7)
+    for s in history:
+        snapshot_store.write_snapshot(state, s, every=10)
+    # render.py re-run for an older ts with different content
+    changed = dict(history[4], devices=history[4]['devices'][:3])
+    assert snapshot_store.write_snapshot(state, changed, every=10) == 'delta'
+    assert list(snapshot_store.iter_snapshots(state)) == history[:4] + [changed] + history[5:]
@@ -0,0 +1,73 @@
+import socket
+import threading
+import time
+
+import ssdp_probe
+
+
+def reply(st, usn, location='http://127.0.0.1:49152/desc.xml'):
+    return (f'HTTP/1.1 200 OK\r\nST: {st}\r\nUSN: {usn}\r\nLOCATION: {location}\r\n'
+            f'SERVER: Linux UPnP/1.0 Test/1\r\nBOOTID.UPNP.ORG: 3\r\n\r\n').encode()
+
+
+def responder(sock, log):
+    while True:
+        try:
+            data, addr = sock.recvfrom(2048)
+        except OSError:
+            return
+        st = ssdp_probe.parse_headers(data.decode())['st']
+        log.append(st)
+        if st == 'ssdp:all':
+            # a media server answering once per service, several times over
+            for _ in range(20):
+                for svc in ('upnp:rootdevice', 'urn:schemas-upnp-org:service:ContentDirectory:1'):
+                    sock.sendto(reply(svc, f'uuid:media::{svc}'), addr)
+        elif st == 'upnp:rootdevice':
+            # only answers this target
+            sock.sendto(reply(st, 'uuid:shy::upnp:rootdevice'), addr)
+
+
+def test_collector_dedups_searches_several_targets_and_stops_when_quiet():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    log = []
+    threading.Thread(target=responder, args=(sock, log), daemon=True).start()
+    c = ssdp_probe.SsdpCollector()
+    t0 = time.monotonic()
+    try:
+        by_ip = c.run(timeout=5.0, quiet=0.3, dest=sock.getsockname())
+    finally:
+        sock.close()
+
+    assert time.monotonic() - t0 < 2.5
+    assert log == [st for _, st in ssdp_probe.SEARCHES]
+    rows = by_ip['127.0.0.1']
+    assert sorted(r['usn'] for r in rows) == ['uuid:media::upnp:rootdevice',
+                                              'uuid:media::urn:schemas-upnp-org:service:ContentDirectory:1',
+                                              'uuid:shy::upnp:rootdevice']
+    assert c.responses == 81 and all(r['bootid'] == '3' for r in rows)
+
+
+def test_collector_waits_out_the_mx_window_of_the_last_search():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+
+    def slow_responder():
+        try:
+            _, addr = sock.recvfrom(2048)
+            time.sleep(0.6)   # within MX: 1, well past quiet
+            sock.sendto(reply('upnp:rootdevice', 'uuid:sleepy::upnp:rootdevice'), addr)
+        except OSError:
+            pass
+
+    threading.Thread(target=slow_responder, daemon=True).start()
+    c = ssdp_probe.SsdpCollector(searches=((0.0, 'ssdp:all'),), mx=1)
+    t0 = time.monotonic()
+    try:
+        by_ip = c.run(timeout=5.0, quiet=0.2, dest=sock.getsockname())
+    finally:
+        sock.close()
+
+    assert 1.0 <= time.monotonic() - t0 < 2.5
+    assert [r['usn'] for r in by_ip['127.0.0.1']] == ['uuid:sleepy::upnp:rootdevice']
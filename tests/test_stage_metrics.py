@@ -0,0 +1,48 @@
+import json
+import pathlib
+import subprocess
+import sys
+
+import stage_metrics
+
+REPO = pathlib.Path(__file__).resolve().parents[1]
+
+
+def run_stage(root, stage, *cmd, extra=()):
+    return subprocess.call([sys.executable, str(REPO / 'stage_metrics.py'), 'run', '--root', str(root), '--ts', 'T1',
+                            '--stage', stage, *extra, '--', *cmd])
+
+
+def test_run_records_and_finalize(tmp_path):
+    (tmp_path / 'state').mkdir()
+    (tmp_path / 'site').mkdir()
+    (tmp_path / 'state' / 'T1.json').write_text('{"devices": []}')
+    out = tmp_path / 'out.txt'
+    out.write_text('Nmap scan report for a\nNmap scan report for b\nSkipping host c due to host timeout\n')
+
+    reporter = f"import sys; sys.path.insert(0, {str(REPO)!r}); import stage_metrics; stage_metrics.report(targets=7, timeouts=1)"
+    assert run_stage(tmp_path, 'web', sys.executable, '-c', reporter) == 0
+    assert run_stage(tmp_path, 'nmap', sys.executable, '-c', 'raise SystemExit(3)',
+                     extra=('--out', str(out), '--count', f'hosts={out}:^Nmap scan report', '--count', f'timeouts={out}:host timeout')) == 3
+
+    rolling = stage_metrics.finalize(str(tmp_path), 'T1')
+    stages = rolling['latest']['stages']
+    assert stages['web']['targets'] == 7 and stages['web']['timeouts'] == 1
+    assert stages['nmap']['exitCode'] == 3 and stages['nmap']['hosts'] == 2 and stages['nmap']['timeouts'] == 1
+    assert stages['nmap']['bytesWritten'] == out.stat().st_size
+    assert stages['web']['peakRssBytes'] > 0 and stages['web']['wallSeconds'] >= 0
+
+    snap = json.loads((tmp_path / 'state' / 'T1.json').read_text())
+    assert set(snap['metrics']['stages']) == {'web', 'nmap'}
+    assert json.loads((tmp_path / 'site' / 'metrics.json').read_text())['history'][0]['ts'] == 'T1'
+
+    text = stage_metrics.prometheus_text(rolling)
+    assert 'nw_stage_exit_code{stage="nmap"} 3' in text
+    assert 'nw_stage_targets{stage="web"} 7' in text
+    assert '# TYPE nw_stage_wall_seconds gauge' in text
+
+
+def test_prometheus_profile_summary():
+    rolling = {'latest': {'cycleSeconds': 1, 'stages': {'render': {
+        'wallSeconds': 1.0, 'profile': {'topSampled': [{'func': 'main (render.py:380)', 'selfPct': 41.5, 'totalPct': 90.0}]}}}}}
+    assert 'nw_profile_self_percent{stage="render",func="main (render.py:380)"} 41.5' in stage_metrics.prometheus_text(rolling)
@@ -0,0 +1,95 @@
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+import upnp_describe
+
+DESC = b"""<?xml version="1.0"?>
+<root xmlns="urn:schemas-upnp-org:device-1-0">
+  <specVersion><major>1</major><minor>0</minor></specVersion>
+  <device>
+    <deviceType>urn:schemas-upnp-org:device:MediaRenderer:1</deviceType>
+    <friendlyName>[TV] Living Room</friendlyName>
+    <manufacturer>Samsung Electronics</manufacturer>
+    <modelName>QE55Q80</modelName>
+    <iconList><icon><url>/icon.png</url></icon></iconList>
+    <deviceList><device><friendlyName>embedded</friendlyName></device></deviceList>
+  </device>
+</root>"""
+
+
+def chunked(blob, n):
+    for i in range(0, len(blob), n):
+        yield blob[i:i + n]
+
+
+def test_streaming_parse_takes_root_device_and_stops_early():
+    read = []
+
+    def chunks():
+        for c in chunked(DESC + b'<!--' + b'x' * 100000 + b'-->', 7):
+            read.append(len(c))
+            yield c
+
+    desc = upnp_describe.parse_description(chunks())
+    assert desc == {'deviceType': 'urn:schemas-upnp-org:device:MediaRenderer:1', 'friendlyName': '[TV] Living Room',
+                    'manufacturer': 'Samsung Electronics', 'modelName': 'QE55Q80'}
+    assert sum(read) < len(DESC)
+    with pytest.raises(ValueError):
+        upnp_describe.parse_description([b'<!DOCTYPE x [<!ENTITY a "a">]><root/>'])
+
+
+def test_cache_is_keyed_by_location_and_usn_and_honours_bootid(tmp_path):
+    loc = 'http://192.168.1.20:9197/dmr'
+    ssdp = {'192.168.1.20': [
+        {'st': 'upnp:rootdevice', 'location': loc, 'usn': 'uuid:tv::upnp:rootdevice', 'bootid': '7'},
+        {'st': 'urn:schemas-upnp-org:device:MediaRenderer:1', 'location': loc, 'usn': 'uuid:tv::urn:x', 'bootid': '7'}],
+        '192.168.1.30': [{'st': 'upnp:rootdevice', 'location': 'http://10.9.9.9/desc.xml', 'usn': 'uuid:evil'}],
+        '192.168.1.40': [{'st': 'upnp:rootdevice', 'location': 'http://192.168.1.40/d.xml', 'usn': 'uuid:dead'}]}
+    calls = []
+
+    def fetcher(url, timeout):
+        calls.append(url)
+        if '192.168.1.40' in url:
+            raise OSError('connection refused')
+        return {'friendlyName': f'tv #{len(calls)}'}
+
+    state = str(tmp_path)
+    by_ip, stats = upnp_describe.describe_all(ssdp, state, now=1000, fetcher=fetcher)
+    assert by_ip == {'192.168.1.20': {'friendlyName': 'tv #1', 'location': loc}}
+    assert sorted(calls) == [loc, 'http://192.168.1.40/d.xml']   # one fetch per LOCATION, never off-host
+    assert stats == {'upnpCached': 0, 'upnpFetched': 1, 'upnpFailed': 1}
+
+    calls.clear()
+    by_ip, stats = upnp_describe.describe_all(ssdp, state, now=2000, fetcher=fetcher)
+    assert calls == [] and by_ip['192.168.1.20']['friendlyName'] == 'tv #1' and stats['upnpCached'] == 2
+
+    for row in ssdp['192.168.1.20']:
+        row['bootid'] = '8'   # device rebooted
+    by_ip, _ = upnp_describe.describe_all(ssdp, state, now=3000 + upnp_describe.RETRY_FAILED_S, fetcher=fetcher)
+    assert sorted(calls) == [loc, 'http://192.168.1.40/d.xml'] and by_ip['192.168.1.20']['friendlyName'] == 'tv #1'
+
+
+def test_fetch_over_http_caps_the_body():
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = DESC if self.path == '/desc.xml' else b'<root>' + b'<x/>' * 200000
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    srv = HTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    try:
+        base = f'http://127.0.0.1:{srv.server_address[1]}'
+        assert upnp_describe.fetch(base + '/desc.xml')['modelName'] == 'QE55Q80'
+        with pytest.raises(ValueError):
+            upnp_describe.fetch(base + '/huge.xml', max_bytes=64 * 1024)
+    finally:
+        srv.shutdown()
+        srv.server_close()
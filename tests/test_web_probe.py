@@ -0,0 +1,70 @@
+import json
+
+import web_probe
+
+NMAP = """Nmap scan report for 192.168.1.10
+PORT     STATE SERVICE  VERSION
+22/tcp   open  ssh      OpenSSH 9.6
+80/tcp   open  http     nginx 1.24.0
+443/tcp  open  ssl/http nginx 1.24.0
+5000/tcp open  upnp     Platinum UPnP httpd 1.0.5
+8009/tcp open  ajp13?
+8443/tcp open  rtsp
+9000/tcp open  ssl/https-alt?
+Nmap scan report for 192.168.1.11
+PORT     STATE SERVICE
+8080/tcp open  unknown
+3000/tcp open  tcpwrapped
+8000/tcp filtered http-alt
+"""
+
+
+def test_targets_follow_nmap_service_detection_and_memory(tmp_path):
+    nmap = tmp_path / 'top100.txt'
+    nmap.write_text(NMAP)
+    items = web_probe.parse_nmap_open_web(str(nmap))
+    schemes = {'192.168.1.11:3000': {'scheme': '', 'ts': 1000}, '192.168.1.11:8080': {'scheme': 'https', 'ts': 1000}}
+    plan = web_probe.plan_targets(items, schemes, now=2000)
+    assert plan == [
+        ('192.168.1.10', 80, 'http', 'nmap'),
+        ('192.168.1.10', 443, 'https', 'nmap'),
+        ('192.168.1.10', 5000, 'http', 'nmap'),     # httpd behind a non-http service name
+        ('192.168.1.10', 9000, 'https', 'nmap'),    # off the port list, but nmap saw TLS HTTP
+        ('192.168.1.11', 8080, 'https', 'memory'),
+    ]
+    # ssh, ajp13 on 8009, rtsp on 8443 and the recently dead 3000 are not probed
+    assert web_probe.STATS['skipped'] >= 4
+    later = web_probe.plan_targets(items, schemes, now=1000 + web_probe.NO_WEB_RETRY_S + 1)
+    assert ('192.168.1.11', 3000, 'http', 'port') in later
+
+
+def test_probe_learns_the_scheme_that_answers(monkeypatch):
+    calls = []
+
+    def head(url, timeout=3, connect_timeout=None):
+        calls.append(url)
+        if url.startswith('https://'):
+            return {'rc': 0, 'status': 200, 'headers': {'server': 'lighttpd'}, 'err': ''}
+        return {'rc': 52, 'status': None, 'headers': {}, 'err': 'empty reply'}   # TLS-only port
+
+    monkeypatch.setattr(web_probe, 'curl_head', head)
+    monkeypatch.setattr(web_probe, 'curl_get_title', lambda url, timeout=3, connect_timeout=None: {'title': 'Router', 'bytes': 10, 'err': ''})
+    monkeypatch.setattr(web_probe, 'curl_get_text', lambda url, timeout=3, max_bytes=4096, connect_timeout=None: {'body': '', 'err': ''})
+    monkeypatch.setattr(web_probe, 'run', lambda cmd, timeout=3, host=None: (0, 'subject=CN=router', ''))
+    res = web_probe.probe_endpoint('192.168.1.1', 8080, 'http', 3, source='port')
+    assert (res['scheme'], res['status'], res['url']) == ('https', 200, 'https://192.168.1.1:8080/')
+    assert calls == ['http://192.168.1.1:8080/', 'https://192.168.1.1:8080/']
+
+    # refused: no second scheme, no GET/robots/security/TLS requests
+    monkeypatch.setattr(web_probe, 'curl_head', lambda url, timeout=3, connect_timeout=None: {'rc': 7, 'status': None, 'headers': {}, 'err': 'refused'})
+    monkeypatch.setattr(web_probe, 'curl_get_title', None)
+    res = web_probe.probe_endpoint('192.168.1.1', 80, 'http', 3)
+    assert res['scheme'] == '' and res['status'] is None
+
+
+def test_scheme_memory_round_trip(tmp_path):
+    web_probe.save_schemes(str(tmp_path), {'10.0.0.1:80': {'scheme': 'http', 'ts': 100},
+                                           '10.0.0.2:80': {'scheme': 'http', 'ts': 0}},
+                           now=web_probe.SCHEME_FORGET_S + 50)
+    assert web_probe.load_schemes(str(tmp_path)) == {'10.0.0.1:80': {'scheme': 'http', 'ts': 100}}
+    assert json.loads((tmp_path / 'web_schemes.json').read_text())['version'] == 1
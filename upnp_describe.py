@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""Fetch UPnP device descriptions for SSDP responders.
+
+ssdp_probe.py only records each responder's LOCATION; the description XML
+behind it names the device (friendlyName, manufacturer, modelName, ...),
+which render.py:type_guess() uses. Descriptions rarely change, so they are
+cached in state/upnp.json keyed by LOCATION + device UUID (from the USN) and
+refetched only when the responder's BOOTID.UPNP.ORG / CONFIGID.UPNP.ORG
+differ from the cached ones, or after NW_UPNP_CACHE_DAYS for devices that
+send neither. Failed fetches are retried after an hour.
+
+Fetches run concurrently (per-host limits from probe_scheduler.py), one per
+distinct LOCATION, only for URLs pointing at the responder itself. Bodies are read in chunks into a streaming
+XMLPullParser and dropped once the root device's fields are in (or at
+MAX_BYTES), so a media server's multi-megabyte service list is never
+downloaded whole. Documents with a DTD are refused.
+
+    describe_all(ssdp_by_ip, state_dir) -> ({ip: {friendlyName, manufacturer, ...}}, stats)
+"""
+import os
+import ssl
+import time
+import urllib.request
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from fsutil import atomic_write_json, read_json
+from probe_scheduler import shared as probe_scheduler
+
+VERSION = 1
+FIELDS = ('deviceType', 'friendlyName', 'manufacturer', 'modelName', 'modelNumber', 'modelDescription')
+MAX_BYTES = 256 * 1024
+CHUNK = 8192
+RETRY_FAILED_S = 3600
+FORGET_AFTER_S = 30 * 86400
+
+
+def local(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def parse_description(chunks, max_bytes=MAX_BYTES):
+    """Root device fields from an iterable of byte chunks (stops reading early)."""
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    stack, desc, size = [], {}, 0
+    for chunk in chunks:
+        if size == 0 and (b'<!DOCTYPE' in chunk[:1024] or b'<!ENTITY' in chunk[:1024]):
+            raise ValueError('DTD in device description')
+        size += len(chunk)
+        parser.feed(chunk)
+        for event, el in parser.read_events():
+            tag = local(el.tag)
+            if event == 'start':
+                stack.append(tag)
+                # root device's own fields come before its service/device lists
+                if tag in ('serviceList', 'deviceList', 'iconList') and stack.count('device') == 1 and desc:
+                    return desc
+                continue
+            stack.pop()
+            if stack and stack[-1] == 'device' and stack.count('device') == 1 and tag in FIELDS:
+                desc[tag] = (el.text or '').strip()[:200]
+            elif tag == 'device' and 'device' not in stack:
+                return desc
+            el.clear()
+        if size > max_bytes:
+            break
+    if not desc:
+        raise ValueError('no device description')
+    return desc
+
+
+def fetch(url, timeout=3.0, max_bytes=MAX_BYTES):
+    ctx = ssl._create_unverified_context() if url.startswith('https:') else None
+    with urllib.request.urlopen(url, timeout=timeout, context=ctx) as resp:
+        def chunks():
+            got = 0
+            while got <= max_bytes:
+                block = resp.read(CHUNK)
+                if not block:
+                    return
+                got += len(block)
+                yield block
+        return parse_description(chunks(), max_bytes)
+
+
+def targets(ssdp_by_ip):
+    """cache key -> (ip, location, bootid, configid) for fetchable SSDP rows."""
+    out = {}
+    for ip, rows in (ssdp_by_ip or {}).items():
+        for row in rows or []:
+            loc = row.get('location') or ''
+            u = urlparse(loc)
+            if u.scheme not in ('http', 'https') or u.hostname != ip:
+                continue
+            uuid = (row.get('usn') or '').split('::', 1)[0]
+            out.setdefault(f'{loc}|{uuid}', (ip, loc, row.get('bootid') or '', row.get('configid') or ''))
+    return out
+
+
+def is_fresh(entry, bootid, configid, now, max_age):
+    if not entry:
+        return False
+    if not entry.get('ok'):
+        return now - entry.get('fetched', 0) < RETRY_FAILED_S
+    if bootid or configid:
+        return (entry.get('bootid'), entry.get('configid')) == (bootid, configid)
+    return now - entry.get('fetched', 0) < max_age
+
+
+def load_cache(state_dir):
+    obj = read_json(os.path.join(state_dir, 'upnp.json'), {})
+    if isinstance(obj, dict) and obj.get('version') == VERSION and isinstance(obj.get('entries'), dict):
+        return obj['entries']
+    return {}
+
+
+def describe_all(ssdp_by_ip, state_dir, now=None, timeout=3.0, workers=8, max_age=None, fetcher=fetch):
+    now = time.time() if now is None else now
+    if max_age is None:
+        try:
+            max_age = float(os.environ.get('NW_UPNP_CACHE_DAYS', '') or 7) * 86400
+        except ValueError:
+            max_age = 7 * 86400
+    cache = load_cache(state_dir)
+    wanted = targets(ssdp_by_ip)
+    stale = {}
+    for key, (ip, loc, bootid, configid) in wanted.items():
+        if not is_fresh(cache.get(key), bootid, configid, now, max_age):
+            stale.setdefault(loc, []).append(key)
+
+    def get(loc):
+        try:
+            with probe_scheduler().slot(urlparse(loc).hostname):
+                return loc, fetcher(loc, timeout=timeout), ''
+        except Exception as e:
+            return loc, None, str(e)[:200]
+
+    stats = {'upnpCached': len(wanted) - sum(len(k) for k in stale.values()), 'upnpFetched': 0, 'upnpFailed': 0}
+    if stale:
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(stale)))) as pool:
+            for loc, desc, err in pool.map(get, sorted(stale)):
+                stats['upnpFetched' if desc else 'upnpFailed'] += 1
+                for key in stale[loc]:
+                    _ip, _loc, bootid, configid = wanted[key]
+                    cache[key] = {'location': loc, 'bootid': bootid, 'configid': configid, 'fetched': int(now),
+                                  'ok': bool(desc), 'desc': desc or {}, 'err': err}
+
+    forget = [k for k, e in cache.items() if k not in wanted and now - e.get('fetched', 0) > FORGET_AFTER_S]
+    for key in forget:
+        del cache[key]
+    if stale or forget:
+        atomic_write_json(os.path.join(state_dir, 'upnp.json'), {'version': VERSION, 'entries': cache},
+                          indent=2, sort_keys=True)
+
+    by_ip = {}
+    for key, (ip, loc, _b, _c) in sorted(wanted.items()):
+        entry = cache.get(key) or {}
+        if entry.get('ok') and ip not in by_ip:
+            by_ip[ip] = dict(entry['desc'], location=loc)
+    return by_ip, stats
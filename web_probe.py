@@ -1,26 +1,75 @@
 #!/usr/bin/env python3
 import argparse
-import json
 import os
 import re
 import subprocess
+import threading
+import time
 from urllib.parse import urlparse
 
+from fsutil import atomic_write_json, read_json
+import rtt_stats
+from probe_scheduler import interleave, shared as probe_scheduler
+from stage_metrics import report
+
+# Ports probed when nmap could not identify the service; identified services
+# are probed wherever nmap found them (service field contains "http").
 WEB_PORTS = {80, 443, 8080, 8443, 8000, 8008, 8009, 5000, 5001, 8833, 8765, 5357, 3000}
+TLS_PORTS = {443, 5001, 8443}
+# curl: couldn't connect / timed out -> the other scheme would not help
+CURL_UNREACHABLE = (7, 28, 999)
+SCHEMES_FILE = "web_schemes.json"
+NO_WEB_RETRY_S = 24 * 3600
+SCHEME_FORGET_S = 30 * 86400
+CONNECT_MARK = "__nw_time_connect="
+# minimum time a device gets to produce a response once connected
+READ_BASE_S = 2.0
+
+# Counters reported to stage_metrics.py
+STATS = {"requests": 0, "timeouts": 0, "skipped": 0, "schemeRetries": 0, "noWeb": 0, "learnedTimeouts": 0}
+STATS_LOCK = threading.Lock()
+# ip -> TCP connect times measured by curl, folded into rtt_stats at the end
+CONNECT_SAMPLES = {}
+
+
+def count(key):
+    with STATS_LOCK:
+        STATS[key] += 1
 
 
-def run(cmd, timeout=3):
+def run(cmd, timeout=3, host=None):
+    """Run one request; with host, it waits for that host's probe_scheduler slot."""
+    count("requests")
     try:
-        p = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        with probe_scheduler().slot(host):
+            p = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        if cmd[0] == "curl" and p.returncode == 28:  # curl: operation timed out
+            count("timeouts")
         return p.returncode, p.stdout, p.stderr
+    except subprocess.TimeoutExpired as e:
+        count("timeouts")
+        return 999, "", str(e)
     except Exception as e:
         return 999, "", str(e)
 
 
-def curl_head(url, timeout=3):
+def record_connect(host, seconds):
+    if host and seconds and seconds > 0:
+        with STATS_LOCK:
+            CONNECT_SAMPLES.setdefault(host, []).append(seconds)
+
+
+def curl_head(url, timeout=3, connect_timeout=None):
     # -k: allow self-signed (common on LAN); -I: HEAD; -L: follow limited redirects
-    cmd = ["curl", "-k", "-I", "-L", "--max-redirs", "2", "--max-time", str(timeout), "--connect-timeout", str(timeout), url]
-    rc, out, err = run(cmd, timeout=timeout + 1)
+    # -w: TCP connect time, an RTT sample for rtt_stats.py
+    cmd = ["curl", "-k", "-I", "-L", "--max-redirs", "2", "--max-time", str(timeout),
+           "--connect-timeout", str(connect_timeout or timeout), "-w", f"\\n{CONNECT_MARK}%{{time_connect}}\\n", url]
+    host = urlparse(url).hostname
+    rc, out, err = run(cmd, timeout=timeout + 1, host=host)
+    m = re.search(rf"\n?{CONNECT_MARK}([\d.]+)\s*$", out)
+    if m:
+        out = out[:m.start()]
+        record_connect(host, float(m.group(1)))
     headers = {}
     status = None
     # curl -I with redirects can output multiple header blocks; we keep last block.
@@ -38,14 +87,15 @@ def curl_head(url, timeout=3):
     return {"rc": rc, "status": status, "headers": headers, "err": err.strip()}
 
 
-def curl_get(url, timeout=3):
-    cmd = ["curl", "-k", "-L", "--max-redirs", "2", "--max-time", str(timeout), "--connect-timeout", str(timeout), url]
-    rc, out, err = run(cmd, timeout=timeout + 1)
+def curl_get(url, timeout=3, connect_timeout=None):
+    cmd = ["curl", "-k", "-L", "--max-redirs", "2", "--max-time", str(timeout),
+           "--connect-timeout", str(connect_timeout or timeout), url]
+    rc, out, err = run(cmd, timeout=timeout + 1, host=urlparse(url).hostname)
     return rc, out, err
 
 
-def curl_get_title(url, timeout=3):
-    rc, out, err = curl_get(url, timeout=timeout)
+def curl_get_title(url, timeout=3, connect_timeout=None):
+    rc, out, err = curl_get(url, timeout=timeout, connect_timeout=connect_timeout)
     title = None
     if out:
         m = re.search(r"<title[^>]*>(.*?)</title>", out, re.IGNORECASE | re.DOTALL)
@@ -54,8 +104,8 @@ def curl_get_title(url, timeout=3):
     return {"rc": rc, "title": title, "bytes": len(out.encode('utf-8', 'ignore')), "err": err.strip()}
 
 
-def curl_get_text(url, timeout=3, max_bytes=4096):
-    rc, out, err = curl_get(url, timeout=timeout)
+def curl_get_text(url, timeout=3, max_bytes=4096, connect_timeout=None):
+    rc, out, err = curl_get(url, timeout=timeout, connect_timeout=connect_timeout)
     if out:
         out_b = out.encode('utf-8', 'ignore')[:max_bytes]
         out = out_b.decode('utf-8', 'ignore')
@@ -63,76 +113,168 @@ def curl_get_text(url, timeout=3, max_bytes=4096):
 
 
 def parse_nmap_open_web(nmap_path):
-    # returns list of (ip, port)
+    # returns list of (ip, port, service, version)
     items = []
     current = None
     for line in open(nmap_path, 'r', errors='replace'):
         line = line.rstrip("\n")
         if line.startswith("Nmap scan report for "):
             current = line.split()[-1]
-        m = re.match(r"^(\d+)/tcp\s+open\s+", line)
-        if current and m:
-            port = int(m.group(1))
-            if port in WEB_PORTS:
-                items.append((current, port))
+        cols = line.split()
+        if current and len(cols) >= 2 and re.match(r"^\d+/tcp$", cols[0]) and cols[1] == "open":
+            service = cols[2] if len(cols) > 2 else ""
+            items.append((current, int(cols[0].split("/")[0]), service, " ".join(cols[3:])))
     return items
 
 
+def service_scheme(port, service, version=""):
+    """'http'/'https' when nmap identified a web service, '?' for unidentified
+    ports in WEB_PORTS (scheme from memory or port), None when nmap says the
+    port speaks something else."""
+    svc = service.rstrip("?").lower()
+    tls = svc.startswith("ssl/") or svc.startswith("https")
+    base = svc.split("/", 1)[-1]
+    if "http" in base or "httpd" in version.lower():
+        return "https" if tls else "http"
+    if base in ("", "unknown", "tcpwrapped"):
+        if port in WEB_PORTS:
+            return "https" if tls else "?"
+    return None
+
+
+def load_schemes(state_dir):
+    obj = read_json(os.path.join(state_dir, SCHEMES_FILE), {}) if state_dir else {}
+    if isinstance(obj, dict) and obj.get("version") == 1 and isinstance(obj.get("endpoints"), dict):
+        return obj["endpoints"]
+    return {}
+
+
+def save_schemes(state_dir, endpoints, now):
+    endpoints = {k: v for k, v in endpoints.items() if now - v.get("ts", 0) < SCHEME_FORGET_S}
+    atomic_write_json(os.path.join(state_dir, SCHEMES_FILE), {"version": 1, "endpoints": endpoints},
+                      indent=2, sort_keys=True)
+
+
+def plan_targets(items, schemes, now):
+    """[(ip, port, scheme, source)] to probe, one per endpoint."""
+    out, seen = [], set()
+    for ip, port, service, version in items:
+        if (ip, port) in seen:
+            continue
+        seen.add((ip, port))
+        kind = service_scheme(port, service, version)
+        if kind is None:
+            count("skipped")
+            continue
+        mem = schemes.get(f"{ip}:{port}") or {}
+        if mem.get("scheme"):
+            # what actually answered last time beats nmap's and the port's guess
+            out.append((ip, port, mem["scheme"], "memory"))
+        elif kind != "?":
+            out.append((ip, port, kind, "nmap"))
+        elif mem and now - mem.get("ts", 0) < NO_WEB_RETRY_S:
+            count("skipped")   # unidentified and neither scheme answered recently
+        else:
+            out.append((ip, port, "https" if port in TLS_PORTS else "http", "port"))
+    return out
+
+
+def probe_endpoint(ip, port, scheme, timeout, source="nmap", service="", connect_timeout=None):
+    url = f"{scheme}://{ip}:{port}/"
+    limits = {"timeout": timeout, "connect_timeout": connect_timeout}
+    head = curl_head(url, **limits)
+    if head.get("status") is None and head.get("rc") not in CURL_UNREACHABLE:
+        # answered, but not in this scheme (TLS on a plain port or vice versa)
+        count("schemeRetries")
+        other = "http" if scheme == "https" else "https"
+        retry = curl_head(f"{other}://{ip}:{port}/", **limits)
+        if retry.get("status") is not None:
+            scheme, url, head = other, f"{other}://{ip}:{port}/", retry
+    if head.get("status") is None:
+        # nothing speaks HTTP here: skip GET/robots/security/TLS, which would only time out too
+        return {"ip": ip, "port": port, "url": url, "scheme": "", "scheme_source": source, "service": service,
+                "status": None, "server": None, "x_powered_by": None, "title": None, "bytes": None,
+                "robots_txt": None, "security_txt": None, "tls": None, "errors": {"head": head.get("err")}}
+
+    get = curl_get_title(url, **limits)
+    robots = curl_get_text(url.rstrip('/') + '/robots.txt', **limits)
+    security = curl_get_text(url.rstrip('/') + '/.well-known/security.txt', **limits)
+
+    server = head.get("headers", {}).get("server")
+    powered = head.get("headers", {}).get("x-powered-by")
+
+    # TLS cert metadata (only for https)
+    tls = None
+    if scheme == 'https':
+        # Use openssl s_client to fetch leaf cert quickly
+        cmd = [
+            'bash', '-lc',
+            f"echo | openssl s_client -servername {ip} -connect {ip}:{port} -showcerts 2>/dev/null | openssl x509 -noout -subject -issuer -dates 2>/dev/null"
+        ]
+        rc, out, err = run(cmd, timeout=max(4, timeout + 1), host=ip)
+        tls = {"rc": rc, "summary": out.strip(), "err": err.strip()}
+
+    return {
+        "ip": ip,
+        "port": port,
+        "url": url,
+        "scheme": scheme,
+        "scheme_source": source,
+        "service": service,
+        "status": head.get("status"),
+        "server": server,
+        "x_powered_by": powered,
+        "title": get.get("title"),
+        "bytes": get.get("bytes"),
+        "robots_txt": robots.get('body'),
+        "security_txt": security.get('body'),
+        "tls": tls,
+        "errors": {"head": head.get("err"), "get": get.get("err"), "robots": robots.get('err'), "security": security.get('err')},
+    }
+
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--nmap", required=True)
     ap.add_argument("--out", required=True)
-    ap.add_argument("--timeout", type=int, default=3)
+    ap.add_argument("--timeout", type=float, default=3, help="connect/total seconds for hosts without RTT history")
+    ap.add_argument("--state", help="state dir for the learned per-endpoint scheme (web_schemes.json) and RTTs (rtt.json)")
     args = ap.parse_args()
 
-    targets = parse_nmap_open_web(args.nmap)
-    results = []
+    now = time.time()
+    items = parse_nmap_open_web(args.nmap)
+    services = {(ip, port): service for ip, port, service, _v in items}
+    schemes = load_schemes(args.state)
+    targets = plan_targets(items, schemes, now)
+    rtt = rtt_stats.load(args.state)
 
-    seen = set()
-    for ip, port in targets:
-        key = (ip, port)
-        if key in seen:
-            continue
-        seen.add(key)
-        scheme = "https" if port in (443, 5001, 8443) else "http"
-        url = f"{scheme}://{ip}:{port}/"
-        head = curl_head(url, timeout=args.timeout)
-        get = curl_get_title(url, timeout=args.timeout)
-        robots = curl_get_text(url.rstrip('/') + '/robots.txt', timeout=args.timeout)
-        security = curl_get_text(url.rstrip('/') + '/.well-known/security.txt', timeout=args.timeout)
-
-        server = head.get("headers", {}).get("server")
-        powered = head.get("headers", {}).get("x-powered-by")
-
-        # TLS cert metadata (only for https)
-        tls = None
-        if scheme == 'https':
-            # Use openssl s_client to fetch leaf cert quickly
-            cmd = [
-                'bash', '-lc',
-                f"echo | openssl s_client -servername {ip} -connect {ip}:{port} -showcerts 2>/dev/null | openssl x509 -noout -subject -issuer -dates 2>/dev/null"
-            ]
-            rc, out, err = run(cmd, timeout=max(4, args.timeout + 1))
-            tls = {"rc": rc, "summary": out.strip(), "err": err.strip()}
-
-        results.append({
-            "ip": ip,
-            "port": port,
-            "url": url,
-            "status": head.get("status"),
-            "server": server,
-            "x_powered_by": powered,
-            "title": get.get("title"),
-            "bytes": get.get("bytes"),
-            "robots_txt": robots.get('body'),
-            "security_txt": security.get('body'),
-            "tls": tls,
-            "errors": {"head": head.get("err"), "get": get.get("err"), "robots": robots.get('err'), "security": security.get('err')},
-        })
+    def probe(t):
+        connect, total = rtt_stats.timeouts(rtt, t[0], args.timeout, args.timeout, READ_BASE_S)
+        if t[0] in rtt:
+            count("learnedTimeouts")
+        return probe_endpoint(t[0], t[1], t[2], total, source=t[3], service=services.get((t[0], t[1]), ""),
+                              connect_timeout=connect)
+
+    # endpoints run concurrently; each request waits for its host's slot
+    sched = probe_scheduler()
+    results = sched.map(probe, interleave(targets, host=lambda t: t[0]))
+    order = {(t[0], t[1]): i for i, t in enumerate(targets)}
+    results.sort(key=lambda r: order[(r["ip"], r["port"])])
+    for res in results:
+        schemes[f"{res['ip']}:{res['port']}"] = {"scheme": res["scheme"], "ts": int(now)}
+        if res["status"] is None:
+            STATS["noWeb"] += 1
 
     os.makedirs(os.path.dirname(args.out), exist_ok=True)
-    with open(args.out, 'w') as f:
-        json.dump({"results": results}, f, indent=2)
+    atomic_write_json(args.out, {"results": results}, indent=2)
+    if args.state:
+        save_schemes(args.state, schemes, now)
+        for ip, samples in CONNECT_SAMPLES.items():
+            for seconds in samples:
+                rtt_stats.update(rtt, ip, seconds, now)
+        rtt_stats.save(args.state, rtt, now)
+
+    report(targets=len(targets), **STATS, **sched.stats)
 
 
 if __name__ == "__main__":